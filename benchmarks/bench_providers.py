@@ -0,0 +1,222 @@
+"""
+End-to-end benchmark of llmcli against local mock provider servers.
+
+Starts a `MockProviderServer`, points each provider SDK at it, and measures, for each adapter:
+
+- `raw`: reading the same response with a bare HTTP client, as a baseline.
+- `adapter`: streaming a completion through the adapter (SDK parsing and message conversion).
+- `cli`: `LlmCli.get_completion()`, rendered with the stream renderer (to /dev/null), as in
+  non-interactive mode.
+
+The per-token overhead is the difference between `cli` and `raw`, divided by the number of chunks.
+Peak Python memory use during a `cli` run and the CLI's startup time are reported too. Everything
+runs offline.
+
+Usage: python -m benchmarks.bench_providers [--chunks N] [--chunk-size N] [--turns N] [...]
+"""
+import argparse
+import http.client
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable
+from urllib.parse import urlparse
+
+from benchmarks.mock_servers import MockProviderServer
+from llmcli.messages.file_message import FileMessage
+from llmcli.messages.message import Message
+
+ADAPTERS = {
+    "openai": ("/v1/chat/completions", ["api_key=benchmark"]),
+    "anthropic": ("/v1/messages", ["api_key=benchmark"]),
+    "ollama": ("/api/chat", []),
+}
+
+
+def get_conversation(turns: int) -> list[Message]:
+    """
+    Build a conversation with a system prompt, a file, and a number of previous turns.
+    """
+    messages = [
+        Message(role="system", content="You are a benchmark."),
+        FileMessage(role="user", file_path="benchmark.txt", file_content="x = 1\n" * 2000),
+    ]
+
+    for i in range(turns):
+        messages.append(Message(role="user", content=f"Question {i}? " * 20))
+        messages.append(Message(role="assistant", content=f"Answer {i}. " * 200))
+
+    messages.append(Message(role="user", content="And the last question?"))
+    return messages
+
+
+def best_of(repeat: int, run: Callable[[], None]) -> float:
+    """
+    Run a function a number of times, and return the fastest time in seconds.
+    """
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def run_raw(server: MockProviderServer, path: str) -> None:
+    """
+    Read a response with a bare HTTP client.
+    """
+    url = urlparse(server.url)
+    connection = http.client.HTTPConnection(url.hostname, url.port)
+    connection.request("POST", path, body=json.dumps({"model": "benchmark"}))
+    response = connection.getresponse()
+
+    while response.read(65536):
+        pass
+
+    connection.close()
+
+
+def run_adapter(adapter, messages: list[Message]) -> None:
+    """
+    Stream a completion through an adapter.
+    """
+    stream, _ = adapter.get_completion(messages)
+
+    for _ in stream:
+        pass
+
+
+def run_cli(cli, output) -> None:
+    """
+    Get a completion through `LlmCli` and render it, as the non-interactive mode does.
+    """
+    # pylint: disable=import-outside-toplevel
+    from llmcli.render import render_stream
+
+    stream, _ = cli.get_completion()
+    render_stream(stream, output)
+
+
+def measure_startup(repeat: int) -> dict[str, float]:
+    """
+    Measure the time to import llmcli and to print the help message, in fresh interpreters.
+    """
+    commands = {
+        "import": "import llmcli.llmcli",
+        "help": "import sys; sys.argv = ['llmcli', '--help']; "
+            "from llmcli.llmcli import main; main()",
+    }
+
+    return {
+        name: best_of(
+            repeat,
+            lambda command=command: subprocess.run(
+                [sys.executable, "-c", command], check=True, stdout=subprocess.DEVNULL
+            ),
+        )
+        for name, command in commands.items()
+    }
+
+
+def benchmark_adapter(name: str, server: MockProviderServer, args: argparse.Namespace) -> dict:
+    """
+    Benchmark one adapter against the mock server.
+    """
+    # pylint: disable=import-outside-toplevel
+    from llmcli.adapters import get_api_adapter, parse_api_params
+    from llmcli.llmcli import LlmCli
+
+    path, options = ADAPTERS[name]
+    chunks = len(server.fragments)
+    messages = get_conversation(args.turns)
+    adapter = get_api_adapter(name, parse_api_params(options))
+
+    with open(os.devnull, "w", encoding="utf-8") as output:
+        cli = LlmCli(
+            interactive=False, intro=False, api_adapter_name=name, api_adapter_options=options
+        )
+        cli.messages = list(messages)
+
+        raw = best_of(args.repeat, lambda: run_raw(server, path))
+        adapter_time = best_of(args.repeat, lambda: run_adapter(adapter, messages))
+        cli_time = best_of(args.repeat, lambda: run_cli(cli, output))
+
+        tracemalloc.start()
+        run_cli(cli, output)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "adapter": name,
+        "chunks": chunks,
+        "raw_ms": raw * 1000,
+        "adapter_ms": adapter_time * 1000,
+        "cli_ms": cli_time * 1000,
+        "overhead_us_per_token": (cli_time - raw) / chunks * 1e6,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks per response")
+    parser.add_argument("--chunk-size", type=int, default=4, help="characters per chunk")
+    parser.add_argument("--rate", type=float, default=0, help="chunks per second (0: no limit)")
+    parser.add_argument("--turns", type=int, default=20, help="previous turns in the conversation")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    parser.add_argument("--adapters", default=",".join(ADAPTERS), help="comma-separated adapters")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {"startup_ms": {k: v * 1000 for k, v in measure_startup(args.repeat).items()}}
+    results["adapters"] = []
+
+    with MockProviderServer(args.chunks, args.chunk_size, args.rate) as server:
+        # the SDKs read these when their clients are created, so set them before loading adapters
+        os.environ.update(server.environ())
+
+        for name in args.adapters.split(","):
+            try:
+                results["adapters"].append(benchmark_adapter(name, server, args))
+            except Exception as ex: # pylint: disable=broad-exception-caught
+                results["adapters"].append({"adapter": name, "error": str(ex)})
+
+    results["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"startup: import {results['startup_ms']['import']:.0f} ms, "
+        f"--help {results['startup_ms']['help']:.0f} ms"
+    )
+    print(f"{'adapter':<10} {'raw ms':>8} {'adapter ms':>11} {'cli ms':>8} "
+          f"{'us/token':>9} {'peak KB':>8}")
+
+    for result in results["adapters"]:
+        if "error" in result:
+            print(f"{result['adapter']:<10} error: {result['error']}")
+            continue
+
+        print(
+            f"{result['adapter']:<10} {result['raw_ms']:>8.1f} {result['adapter_ms']:>11.1f} "
+            f"{result['cli_ms']:>8.1f} {result['overhead_us_per_token']:>9.1f} "
+            f"{result['peak_memory_kb']:>8.0f}"
+        )
+
+    print(f"max RSS: {results['max_rss_kb'] / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
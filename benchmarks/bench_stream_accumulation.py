@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for accumulating a streaming response into a message.
+
+Compares concatenating each fragment onto `Message.content` as it arrives with the buffered
+accumulation used by `BaseApiAdapter.output_stream()`, over a synthetic stream of small chunks.
+
+Usage: python -m benchmarks.bench_stream_accumulation [chunks] [chunk size]
+"""
+import sys
+import time
+
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.messages.message import Message
+
+
+class SyntheticAdapter(BaseApiAdapter):
+    """
+    An adapter whose stream chunks are the fragments themselves.
+    """
+    @staticmethod
+    def get_fragment(chunk):
+        return chunk
+
+
+def concatenate(chunks: list[str], message: Message):
+    """
+    The previous implementation: concatenate each fragment onto the message content.
+    """
+    for chunk in chunks:
+        message.content += chunk
+        yield chunk
+
+
+def run(name: str, stream_factory, chunks: list[str]) -> None:
+    """
+    Consume a stream and print how long it took.
+    """
+    message = Message(role="assistant", content="")
+    start = time.perf_counter()
+
+    for _ in stream_factory(chunks, message):
+        pass
+
+    elapsed = time.perf_counter() - start
+    assert len(message.content) == sum(len(chunk) for chunk in chunks)
+    print(f"{name:>12}: {elapsed * 1000:8.1f} ms")
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    chunks = [f"{i % 10}" * size for i in range(count)]
+
+    print(f"{count} chunks of {size} characters")
+    run("concatenate", concatenate, chunks)
+    run("buffered", SyntheticAdapter.output_stream, chunks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Local HTTP servers mimicking the streaming chat endpoints of the supported providers.
+
+A single `MockProviderServer` serves all three APIs:
+
+- OpenAI: `POST /v1/chat/completions`, as server-sent events.
+- Anthropic: `POST /v1/messages`, as server-sent events.
+- Ollama: `POST /api/chat`, as newline-delimited JSON.
+
+Responses are streamed with chunked transfer encoding over HTTP/1.1, so clients can keep their
+connections alive between requests. The number and size of chunks, and the rate at which they are
+sent, are configurable. `MockProviderServer.environ()` returns the environment variables that point
+each provider's SDK at the server.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PAYLOAD = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt "
+    "ut labore et dolore magna aliqua. ```python\ndef f(x):\n    return x * 2\n```\n"
+)
+
+
+def get_fragments(chunks: int, chunk_size: int, payload: str = DEFAULT_PAYLOAD) -> list[str]:
+    """
+    Split a repeated payload into fragments.
+
+    Parameters
+    ----------
+    chunks : int
+        The number of fragments.
+    chunk_size : int
+        The number of characters in each fragment.
+    payload : str
+        The text to repeat.
+
+    Returns
+    -------
+    list[str]
+        The fragments.
+    """
+    text = payload * (chunks * chunk_size // len(payload) + 1)
+    return [text[i * chunk_size:(i + 1) * chunk_size] for i in range(chunks)]
+
+
+def sse(data: dict, event: str | None = None) -> bytes:
+    """
+    Encode a server-sent event.
+    """
+    prefix = f"event: {event}\n" if event is not None else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def openai_events(fragments: list[str], model: str) -> list[bytes]:
+    """
+    Encode a response as OpenAI chat completion chunks.
+    """
+    def chunk(delta: dict, finish_reason: str | None = None) -> bytes:
+        return sse({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        })
+
+    return [
+        chunk({"role": "assistant", "content": ""}),
+        *(chunk({"content": fragment}) for fragment in fragments),
+        chunk({}, "stop"),
+        b"data: [DONE]\n\n",
+    ]
+
+
+def anthropic_events(fragments: list[str], model: str) -> list[bytes]:
+    """
+    Encode a response as Anthropic message stream events.
+    """
+    message = {
+        "id": "msg_mock",
+        "type": "message",
+        "role": "assistant",
+        "content": [],
+        "model": model,
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 1},
+    }
+
+    return [
+        sse({"type": "message_start", "message": message}, "message_start"),
+        sse(
+            {
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            },
+            "content_block_start",
+        ),
+        *(
+            sse(
+                {
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": fragment},
+                },
+                "content_block_delta",
+            )
+            for fragment in fragments
+        ),
+        sse({"type": "content_block_stop", "index": 0}, "content_block_stop"),
+        sse(
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": len(fragments)},
+            },
+            "message_delta",
+        ),
+        sse({"type": "message_stop"}, "message_stop"),
+    ]
+
+
+def ollama_events(fragments: list[str], model: str) -> list[bytes]:
+    """
+    Encode a response as Ollama chat stream lines.
+    """
+    def line(content: str, **extra) -> bytes:
+        return (json.dumps({
+            "model": model,
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            **extra,
+        }) + "\n").encode("utf-8")
+
+    return [
+        *(line(fragment, done=False) for fragment in fragments),
+        line("", done=True, done_reason="stop", eval_count=len(fragments)),
+    ]
+
+
+ENDPOINTS = {
+    "/v1/chat/completions": ("text/event-stream", openai_events),
+    "/chat/completions": ("text/event-stream", openai_events),
+    "/v1/messages": ("text/event-stream", anthropic_events),
+    "/api/chat": ("application/x-ndjson", ollama_events),
+}
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for `MockProviderServer`.
+    """
+    protocol_version = "HTTP/1.1"
+    server: "MockProviderHTTPServer"
+
+    def do_POST(self) -> None: # pylint: disable=invalid-name
+        """
+        Stream a mock response from one of the supported endpoints.
+        """
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        endpoint = ENDPOINTS.get(self.path.split("?")[0])
+
+        if endpoint is None:
+            self.send_error(404)
+            return
+
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            request = {}
+
+        self.server.record_request(self.path, request)
+        content_type, encode = endpoint
+        config = self.server.config
+        events = encode(config.fragments, request.get("model") or "mock")
+        interval = 1 / config.rate if config.rate else 0
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for event in events:
+            if interval:
+                time.sleep(interval)
+
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *_) -> None: # pylint: disable=arguments-differ
+        pass
+
+
+class MockProviderHTTPServer(ThreadingHTTPServer):
+    """
+    The HTTP server behind `MockProviderServer`.
+    """
+    daemon_threads = True
+
+    def __init__(self, config: "MockProviderServer") -> None:
+        super().__init__(("127.0.0.1", 0), MockProviderHandler)
+        self.config = config
+
+    def record_request(self, path: str, request: dict) -> None:
+        """
+        Record a request, for inspection by tests.
+        """
+        with self.config.lock:
+            self.config.requests.append((path, request))
+
+
+class MockProviderServer:
+    """
+    A local server streaming mock responses in each provider's format.
+
+    Parameters
+    ----------
+    chunks : int
+        The number of text chunks in each response.
+    chunk_size : int
+        The number of characters in each chunk.
+    rate : float
+        The number of chunks sent per second, or 0 to send them as fast as possible.
+    payload : str
+        The text the response is made of, repeated as needed.
+    """
+    def __init__(
+        self,
+        chunks: int = 1000,
+        chunk_size: int = 4,
+        rate: float = 0,
+        payload: str = DEFAULT_PAYLOAD,
+    ) -> None:
+        self.fragments = get_fragments(chunks, chunk_size, payload)
+        self.rate = rate
+        self.requests = []
+        self.lock = threading.Lock()
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def text(self) -> str:
+        """
+        The full text of each response.
+        """
+        return "".join(self.fragments)
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL of the server.
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environ(self) -> dict[str, str]:
+        """
+        Get the environment variables that point the provider SDKs at this server.
+        """
+        return {
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "ANTHROPIC_BASE_URL": self.url,
+            "OLLAMA_HOST": self.url,
+        }
+
+    def start(self) -> "MockProviderServer":
+        """
+        Start serving in a background thread.
+        """
+        self.httpd = MockProviderHTTPServer(self)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop the server.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def __enter__(self) -> "MockProviderServer":
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
@@ -1,12 +1,16 @@
 """
 Contains general functions related to API adapters.
+
+Adapter modules import their provider SDKs, which is slow, so they are not imported here. Adapters
+are listed from the specs in `llmcli.adapters.registry`, and an adapter module is only imported
+when an instance of that adapter is first requested.
 """
 import json
+from collections import OrderedDict
+from typing import Tuple
 
 from llmcli.adapters.base import BaseApiAdapter
-from llmcli.adapters.openai import OpenAiApiAdapter
-from llmcli.adapters.anthropic import AnthropicApiAdapter
-from llmcli.adapters.ollama import OllamaApiAdapter
+from llmcli.adapters.registry import ADAPTER_SPECS, AdapterSpec
 
 __all__ = [
     "BaseApiAdapter",
@@ -15,20 +19,26 @@ __all__ = [
     "OllamaApiAdapter",
 ]
 
-def get_adapter_list() -> list[BaseApiAdapter]:
+def __getattr__(name: str) -> type:
+    """
+    Lazily import adapter classes when they are accessed as attributes of this package.
+    """
+    for spec in ADAPTER_SPECS:
+        if name == spec.class_name:
+            return spec.load()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_adapter_list() -> list[AdapterSpec]:
     """
-    Get a list of available API adapters.
+    Get a list of available API adapters. Does not import the adapters themselves.
 
     Returns
     -------
-    list[BaseApiAdapter]
-        A list of available API adapters.
+    list[AdapterSpec]
+        A list of available API adapter specs.
     """
-    return [
-        OpenAiApiAdapter,
-        AnthropicApiAdapter,
-        OllamaApiAdapter,
-    ]
+    return list(ADAPTER_SPECS)
 
 def parse_api_params(params: list[str]) -> dict:
     """
@@ -57,12 +67,54 @@ def parse_api_params(params: list[str]) -> dict:
         ]
     }
 
-ADAPTER_INSTANCE_CACHE = {}
+def parse_adapter_spec(spec: str) -> Tuple[str, list[str]]:
+    """
+    Parse an adapter and its options from a single argument, in the format
+    `adapter[:key=value,key=value...]`.
+
+    Parameters
+    ----------
+    spec : str
+        The adapter and its options, e.g. `anthropic:model=claude-3-5-haiku-latest,temperature=0.2`.
+
+    Returns
+    -------
+    adapter_name : str
+        The identifier of the API adapter.
+    options : list[str]
+        The API options, in the format key=value.
+
+    Raises
+    ------
+    ValueError
+        If the adapter is unknown or an option isn't in the format key=value.
+    """
+    adapter_name, _, options = spec.partition(":")
+    adapter_names = [adapter.name for adapter in get_adapter_list()]
+
+    if adapter_name not in adapter_names:
+        raise ValueError(
+            f"Unknown API adapter '{adapter_name}' (choose from {', '.join(adapter_names)})"
+        )
+
+    options = [option.strip() for option in options.split(",") if option.strip() != ""]
+
+    for option in options:
+        if "=" not in option:
+            raise ValueError(f"Invalid API option '{option}' (expected key=value)")
+
+    return adapter_name, options
+
+# adapter instances by name and parameters, least recently used first; adapters share their HTTP
+# connection pools (see llmcli.adapters.pool), so evicting one doesn't close any connections
+ADAPTER_INSTANCE_CACHE = OrderedDict()
+ADAPTER_INSTANCE_CACHE_SIZE = 8
 
 def get_api_adapter(name: str, params: dict) -> BaseApiAdapter:
     """
     Get an API adapter instance by identifier, with the provided parameters. May return a cached
-    instance.
+    instance; up to `ADAPTER_INSTANCE_CACHE_SIZE` recently used instances are kept. The adapter
+    module is imported on first use.
 
     Parameters
     ----------
@@ -85,12 +137,17 @@ def get_api_adapter(name: str, params: dict) -> BaseApiAdapter:
     adapter_instance = ADAPTER_INSTANCE_CACHE.get((name, params_str))
 
     if adapter_instance is not None:
+        ADAPTER_INSTANCE_CACHE.move_to_end((name, params_str))
         return adapter_instance
 
-    for adapter in get_adapter_list():
-        if name in (adapter.NAME, adapter.HR_NAME):
-            adapter_instance = adapter(params)
+    for spec in get_adapter_list():
+        if name in (spec.name, spec.hr_name):
+            adapter_instance = spec.load()(params)
             ADAPTER_INSTANCE_CACHE[(name, params_str)] = adapter_instance
+
+            while len(ADAPTER_INSTANCE_CACHE) > ADAPTER_INSTANCE_CACHE_SIZE:
+                ADAPTER_INSTANCE_CACHE.popitem(last=False)
+
             return adapter_instance
 
     raise Exception("No valid adapter was selected.")
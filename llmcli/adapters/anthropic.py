@@ -6,16 +6,19 @@ The adapter supports configuration options such as model selection, API key, and
 parameters like max tokens, temperature, and top-p sampling.
 """
 
+import asyncio
 import os
-
-from typing import Iterable, Tuple
+from typing import AsyncIterable, Iterable, Tuple
 import anthropic
 from anthropic import NOT_GIVEN
 
-from llmcli.adapters.base import BaseApiAdapter, ApiAdapterOption
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.adapters.pool import get_limits, get_shared_async_client, get_shared_client
+from llmcli.adapters.registry import ANTHROPIC_ADAPTER_SPEC
 from llmcli.messages.message import Message
 from llmcli.messages.file_message import FileMessage
 from llmcli.messages.image_message import ImageMessage
+from llmcli.util import parse_bool
 
 
 class AnthropicApiAdapter(BaseApiAdapter):
@@ -40,83 +43,301 @@ class AnthropicApiAdapter(BaseApiAdapter):
     params : dict
         A dictionary of configuration parameters for the adapter.
     """
-    NAME = "anthropic"
-    HR_NAME = "Anthropic"
-    EXTRA_HELP = (
-        "By default, uses the Anthropic API key from the environment variable ANTHROPIC_API_KEY."
-    )
-    MASKED_OPTIONS = set("api_key")
-    OPTIONS = [
-        ApiAdapterOption(
-            name="model",
-            hr_name="Model",
-            description="Model ID used to generate the response.",
-            default="claude-3-7-sonnet-latest",
-        ),
-        ApiAdapterOption(
-            name="api_key",
-            hr_name="API Key",
-            description="Your Anthropic API key",
-            default=os.environ.get("ANTHROPIC_API_KEY"),
-            default_help_override="ANTHROPIC_API_KEY",
-        ),
-        ApiAdapterOption(
-            name="max_tokens",
-            hr_name="Max Tokens",
-            description="The maximum number of tokens that can be generated in the chat completion",
-            default=1000,
-        ),
-        ApiAdapterOption(
-            name="temperature",
-            hr_name="Temperature",
-            description="What sampling temperature to use, between 0 and 2.",
-        ),
-        ApiAdapterOption(
-            name="top_p",
-            hr_name="Top P",
-            description="An alternative to sampling with temperature, called nucleus sampling.",
-        ),
-    ]
+    NAME = ANTHROPIC_ADAPTER_SPEC.name
+    HR_NAME = ANTHROPIC_ADAPTER_SPEC.hr_name
+    EXTRA_HELP = ANTHROPIC_ADAPTER_SPEC.extra_help
+    MASKED_OPTIONS = ANTHROPIC_ADAPTER_SPEC.masked_options
+    OPTIONS = ANTHROPIC_ADAPTER_SPEC.options
+
+    DEFAULT_BASE_URL = "https://api.anthropic.com"
+    RETRY_ERROR_TYPES = {"overloaded_error", "rate_limit_error", "api_error"}
+    # larger images are scaled down to 1568 pixels on their long side
+    IMAGE_MAX_SIZE = (1568, 1568)
+    CACHE_CONTROL = {"type": "ephemeral"}
+    # the API allows at most 4 cache breakpoints per request; one goes on the system prompt and one
+    # on the end of the conversation, leaving the rest for file attachments
+    MAX_FILE_CACHE_BREAKPOINTS = 2
 
     def __init__(self, params):
         super().__init__(params)
-        self.client = anthropic.Anthropic(api_key=self.get_config('api_key'))
-        self.system = None
+        # retries are handled by BaseApiAdapter, which can also retry a failed stream
+        self.client = anthropic.Anthropic(
+            api_key=self.get_config('api_key'),
+            max_retries=0,
+            http_client=get_shared_client(
+                self.get_pool_key(),
+                lambda: anthropic.DefaultHttpxClient(limits=self.get_limits()),
+            ),
+        )
+        self._async_client = None
+        self._merge_state = None
+
+    @property
+    def async_client(self) -> anthropic.AsyncAnthropic:
+        """
+        The async Anthropic client, created on first use.
+        """
+        if self._async_client is None:
+            self._async_client = anthropic.AsyncAnthropic(
+                api_key=self.get_config('api_key'),
+                max_retries=0,
+                http_client=get_shared_async_client(
+                    self.get_pool_key(),
+                    asyncio.get_running_loop(),
+                    lambda: anthropic.DefaultAsyncHttpxClient(limits=self.get_limits()),
+                ),
+            )
+
+        return self._async_client
+
+    def get_base_url(self) -> str:
+        """
+        Get the base URL of the Anthropic API, which may be overridden by ANTHROPIC_BASE_URL.
+        """
+        return os.environ.get("ANTHROPIC_BASE_URL") or self.DEFAULT_BASE_URL
+
+    def get_limits(self):
+        """
+        Get the connection pool limits for the shared HTTP client.
+        """
+        return get_limits(
+            anthropic.DEFAULT_CONNECTION_LIMITS,
+            self.get_config('pool_connections', cast=int),
+            self.get_config('keepalive', cast=float),
+        )
 
     @staticmethod
-    def output_stream(
-        response_stream: anthropic.Stream,
+    def get_fragment(chunk: anthropic.types.RawMessageStreamEvent) -> str | None:
+        """
+        Extract the text fragment from an event of a streaming response from the Anthropic API.
+
+        Parameters
+        ----------
+        chunk : anthropic.types.RawMessageStreamEvent
+            An event of the streaming response.
+
+        Returns
+        -------
+        str | None
+            The text fragment, or None if the event doesn't contain any text.
+        """
+        if chunk.type != "content_block_delta" or chunk.delta.type != "text_delta":
+            return None
+
+        return chunk.delta.text
+
+    @staticmethod
+    def update_message(
+        chunk: anthropic.types.RawMessageStreamEvent,
         response_message: Message,
-    ) -> Iterable[str]:
+    ) -> None:
         """
-        Process the streaming response from the Anthropic API.
+        Record token usage, including prompt cache reads and writes, in `extra["usage"]` of the
+        response message.
 
         Parameters
         ----------
-        response_stream : anthropic.Stream
-            The streaming response object from the API.
+        chunk : anthropic.types.RawMessageStreamEvent
+            An event of the streaming response.
         response_message : Message
-            The message object to update with the response content.
+            The message object to update.
+        """
+        if chunk.type == "message_start":
+            usage = getattr(chunk.message, "usage", None)
+        elif chunk.type == "message_delta":
+            usage = getattr(chunk, "usage", None)
+        else:
+            return
+
+        values = {
+            key: getattr(usage, key, None)
+            for key in (
+                "input_tokens",
+                "output_tokens",
+                "cache_creation_input_tokens",
+                "cache_read_input_tokens",
+            )
+        }
+        values = {key: value for key, value in values.items() if isinstance(value, int)}
+
+        if values:
+            extra = response_message.extra or {}
+            response_message.extra = {**extra, "usage": {**extra.get("usage", {}), **values}}
+
+    def convert_message(self, message: Message) -> dict:
+        """
+        Convert a message to the Anthropic messages format.
+
+        Parameters
+        ----------
+        message : Message
+            The message to convert.
 
-        Yields
-        ------
-        str
-            Fragments of the response content as they are received.
+        Returns
+        -------
+        dict
+            The converted message.
+        """
+        if isinstance(message, FileMessage):
+            return {
+                "role": message.role,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"### FILE: {message.file_label}\n\n" + \
+                            f"```\n{message.file_content}\n```",
+                    }
+                ],
+            }
+
+        if isinstance(message, ImageMessage):
+            return {
+                "role": message.role,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"### IMAGE: {message.image_path}",
+                    },
+                    self.get_image_block(message),
+                ],
+            }
+
+        return {
+            "role": message.role,
+            "content": [{"type": "text", "text": message.content}],
+        }
+
+    def get_image_block(self, message: ImageMessage) -> dict:
+        """
+        Get the image content block of an image message.
+
+        Parameters
+        ----------
+        message : ImageMessage
+            The image message.
+
+        Returns
+        -------
+        dict
+            The image content block.
+        """
+        image_type, image_content = self.get_image(message)
+
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": image_type,
+                "data": image_content,
+            },
+        }
+
+    def merge_messages(self, input_messages: list[Message]) -> Tuple[list[dict], list[tuple]]:
+        """
+        Convert messages and merge consecutive messages of the same role, as required by the
+        Anthropic API. System messages are skipped.
+
+        The result is kept, and when the next call's input starts with the same messages (e.g. on
+        the next turn of a conversation), only the messages after that prefix are merged. Merged
+        messages are never modified after they are created, so results can be shared between
+        requests (and threads). Image blocks aren't kept: they are left empty in the kept result,
+        and filled in with freshly encoded images for each call, so images aren't held in memory
+        between requests.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to convert.
+
+        Returns
+        -------
+        merged : list[dict]
+            The converted and merged messages.
+        cacheable : list[tuple[int, int]]
+            The (message index, block index) positions in `merged` of file blocks large enough to
+            be worth caching.
         """
-        for chunk in response_stream:
-            if chunk.type != "content_block_delta" or chunk.delta.type != "text_delta":
-                continue
+        state = self._merge_state
+        prefix = 0
+
+        if state is not None:
+            inputs = state["inputs"]
+
+            while (
+                prefix < min(len(inputs), len(input_messages))
+                and inputs[prefix] is input_messages[prefix]
+            ):
+                prefix += 1
+
+        if prefix > 0:
+            merged_count, last_length = state["boundaries"][prefix - 1]
+            merged = state["merged"][:merged_count]
+
+            if merged and len(merged[-1]["content"]) != last_length:
+                merged[-1] = {**merged[-1], "content": merged[-1]["content"][:last_length]}
+
+            boundaries = state["boundaries"][:prefix]
+            cacheable = [item for item in state["cacheable"] if item[0] < prefix]
+            images = [item for item in state["images"] if item[0] < prefix]
+        else:
+            merged, boundaries, cacheable, images = [], [], [], []
+
+        cache_min_chars = self.get_config('prompt_cache_min_chars', cast=int, default=0)
+        image_blocks = {}
+
+        for index in range(prefix, len(input_messages)):
+            message = input_messages[index]
+
+            if message.role != "system":
+                out_message = self.get_converted_message(message)
+
+                if isinstance(message, ImageMessage):
+                    image_blocks[index] = out_message["content"][-1]
+                    out_message = {**out_message, "content": out_message["content"][:-1] + [None]}
+
+                # Merge consecutive messages of the same role (required by Anthropic API)
+                if merged and merged[-1]["role"] == out_message["role"]:
+                    merged[-1] = {
+                        **merged[-1],
+                        "content": merged[-1]["content"] + out_message["content"],
+                    }
+                else:
+                    merged.append(out_message)
+
+                if (
+                    isinstance(message, FileMessage)
+                    and len(out_message["content"][0]["text"]) >= cache_min_chars
+                ):
+                    cacheable.append((index, len(merged) - 1, len(merged[-1]["content"]) - 1))
+
+                if isinstance(message, ImageMessage):
+                    images.append((index, len(merged) - 1, len(merged[-1]["content"]) - 1))
+
+            boundaries.append((len(merged), len(merged[-1]["content"]) if merged else 0))
+
+        self._merge_state = {
+            "inputs": list(input_messages),
+            "merged": merged,
+            "boundaries": boundaries,
+            "cacheable": cacheable,
+            "images": images,
+        }
 
-            fragment = chunk.delta.text
-            response_message.content += fragment
-            yield fragment
+        if images:
+            merged = list(merged)
 
-    def get_completion(
-        self,
-        input_messages: list[Message],
-    ) -> Tuple[Iterable[str] | None, Message]:
+        # fill in the images on a copy, since the merged messages are shared
+        for index, message_index, block_index in images:
+            block = image_blocks.get(index) or self.get_image_block(input_messages[index])
+            content = list(merged[message_index]["content"])
+            content[block_index] = block
+            merged[message_index] = {**merged[message_index], "content": content}
+
+        return merged, [(message_index, block_index) for _, message_index, block_index in cacheable]
+
+    def get_request(self, input_messages: list[Message]) -> dict:
         """
-        Generate a completion using the Anthropic API.
+        Build the arguments for a messages request.
 
         Parameters
         ----------
@@ -125,81 +346,105 @@ class AnthropicApiAdapter(BaseApiAdapter):
 
         Returns
         -------
-        stream : Iterable[str] | None
-            Text output stream.
-        message : Message
-            The Message object with metadata. (See Notes for important information.)
+        dict
+            Keyword arguments for `messages.create()`.
 
         Notes
         -----
-        The `content` field of the returned Message object should not be to be considered fully
-        populated until the Iterable is fully consumed.
-        The Anthropic API requires consecutive messages of the same role to be merged.
+        If prompt caching is enabled, cache breakpoints are placed on the system prompt, the last
+        few large file attachments, and the end of the conversation. On the next turn, everything
+        up to the previous end of the conversation is read from the cache.
         """
-        messages = []
+        system = None
 
         for message in input_messages:
             if message.role == "system":
-                self.system = message.content
-                continue
-
-            if isinstance(message, FileMessage):
-                out_message = {
-                    "role": message.role,
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"### FILE: {message.file_path}\n\n" + \
-                                f"```\n{message.file_content}\n```",
-                        }
-                    ],
-                }
-            elif isinstance(message, ImageMessage):
-                out_message = {
-                    "role": message.role,
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"### IMAGE: {message.image_path}",
-                        },
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": message.image_type,
-                                "data": message.image_content,
-                            },
-                        },
-                    ],
-                }
-            else:
-                out_message = {
-                    "role": message.role,
-                    "content": [{"type": "text", "text": message.content}],
-                }
-
-            # Merge consecutive messages of the same role (required by Anthropic API)
-            if len(messages) > 0 and messages[-1].get("role") == out_message.get("role"):
-                messages[-1]["content"] += out_message.get("content")
-            else:
-                messages.append(out_message)
-
-        response_stream = self.client.messages.create(
-            max_tokens=self.get_config('max_tokens', cast=int),
-            model=self.get_config('model'),
-            messages=messages,
-            stream=True,
-            temperature=self.get_config('temperature', cast=float, default=NOT_GIVEN),
-            top_p=self.get_config('top_p', cast=float, default=NOT_GIVEN),
-            system=self.system or NOT_GIVEN,
-        )
+                system = message.content
 
-        response_message = Message(
-            role="assistant",
-            content="",
-            adapter=self.NAME,
-            adapter_options=self.get_masked_config(),
-            display_name=self.get_display_name(),
-        )
+        messages, cacheable = self.merge_messages(input_messages)
+
+        if self.get_config('prompt_caching', cast=parse_bool, default=False):
+            if system:
+                system = [{"type": "text", "text": system, "cache_control": self.CACHE_CONTROL}]
+
+            if messages:
+                cacheable = cacheable[-self.MAX_FILE_CACHE_BREAKPOINTS:]
+                cacheable.append((len(messages) - 1, len(messages[-1]["content"]) - 1))
+                messages = list(messages)
+
+            # copy anything that gets a breakpoint, since the merged messages are shared
+            for message_index, block_index in cacheable:
+                content = list(messages[message_index]["content"])
+                content[block_index] = {**content[block_index], "cache_control": self.CACHE_CONTROL}
+                messages[message_index] = {**messages[message_index], "content": content}
+
+        return {
+            "max_tokens": self.get_config('max_tokens', cast=int),
+            "model": self.get_config('model'),
+            "messages": messages,
+            "stream": True,
+            "temperature": self.get_config('temperature', cast=float, default=NOT_GIVEN),
+            "top_p": self.get_config('top_p', cast=float, default=NOT_GIVEN),
+            "system": system or NOT_GIVEN,
+        }
+
+    def is_retryable_error(self, error: Exception) -> bool:
+        """
+        Check whether a request that failed with an error may succeed if retried, including
+        connection errors and timeouts raised by the Anthropic SDK, and overloaded or rate limit
+        errors sent as events in an already started stream.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request.
 
-        return self.output_stream(response_stream, response_message), response_message
+        Returns
+        -------
+        bool
+            True if the request should be retried.
+        """
+        if isinstance(error, anthropic.APIConnectionError):
+            return True
+
+        body = getattr(error, "body", None)
+
+        if isinstance(body, dict) and isinstance(body.get("error"), dict):
+            if body["error"].get("type") in self.RETRY_ERROR_TYPES:
+                return True
+
+        return super().is_retryable_error(error)
+
+    def open_stream(self, input_messages: list[Message]) -> Iterable:
+        """
+        Send a streaming request to the Anthropic API.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to send to the API.
+
+        Returns
+        -------
+        Iterable
+            The streaming response.
+        """
+        return self.client.messages.create(**self.get_request(input_messages))
+
+    async def open_stream_async(self, input_messages: list[Message]) -> AsyncIterable:
+        """
+        Send a streaming request to the Anthropic API, using the async client.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to send to the API.
+
+        Returns
+        -------
+        AsyncIterable
+            The streaming response.
+        """
+        return await self.async_client.messages.create(
+            **self.get_request(input_messages)
+        )
@@ -5,8 +5,63 @@ It includes the `BaseApiAdapter` class, which serves as a foundation for impleme
 specific API adapters, and the `ApiAdapterOption` class, which represents configuration
 options for the adapters.
 """
-from typing import Any, Callable, Iterable, Tuple
+import asyncio
+import contextvars
+import random
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple
+)
+from llmcli.images import DEFAULT_IMAGE_QUALITY, prepare_image
+from llmcli.messages.image_message import ImageMessage
 from llmcli.messages.message import Message
+from llmcli.metrics import StreamMetrics
+from llmcli.tokens import estimate_tokens
+from llmcli.util import parse_bool
+
+# called with each provider stream opened in the current context, so that a request can be
+# abandoned by closing its stream from another thread or task (see `HedgedApiAdapter`)
+STREAM_OPENED = contextvars.ContextVar("stream_opened", default=None)
+
+
+def finalize_content(response_message: Message, fragments: list[str]) -> None:
+    """
+    Append buffered stream fragments to the content of a response message.
+
+    Parameters
+    ----------
+    response_message : Message
+        The message to update.
+    fragments : list[str]
+        The fragments received so far. Cleared once they have been appended, so calling this again
+        is a no-op.
+    """
+    if fragments:
+        response_message.content = (response_message.content or "") + "".join(fragments)
+        fragments.clear()
+
+
+def finalize_metrics(response_message: Message, metrics: StreamMetrics) -> None:
+    """
+    Store the metrics of a completed stream in the response message. Output tokens are taken from
+    the usage reported by the provider, if any, or estimated from the response content.
+
+    Parameters
+    ----------
+    response_message : Message
+        The message to update.
+    metrics : StreamMetrics
+        The metrics of the stream.
+    """
+    extra = response_message.extra or {}
+    output_tokens = (extra.get("usage") or {}).get("output_tokens")
+
+    if output_tokens is None:
+        output_tokens = estimate_tokens(response_message.content or "")
+
+    response_message.extra = {**extra, "metrics": metrics.to_dict(output_tokens)}
 
 
 class BaseApiAdapter:
@@ -23,9 +78,16 @@ class BaseApiAdapter:
     HR_NAME = "Base API Adapter"
     OPTIONS = []
     MASKED_OPTIONS = set()
+    DEFAULT_RESPONSE_TOKENS = 4096
+    RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 60.0
+    # the largest image the provider uses, as (long side, short side) in pixels, if known
+    IMAGE_MAX_SIZE = None
 
     def __init__(self, params: dict) -> None:
         self.config = {}
+        self._converted_messages = {}
 
         for option in self.OPTIONS:
             if option.name in params:
@@ -33,6 +95,66 @@ class BaseApiAdapter:
             elif option.default is not None:
                 self.config[option.name] = option.default
 
+    def convert_message(self, message: Message) -> Any:
+        """
+        Convert a message to the provider's request format.
+
+        Parameters
+        ----------
+        message : Message
+            The message to convert.
+
+        Returns
+        -------
+        Any
+            The converted message.
+        """
+        raise NotImplementedError("convert_message() must be implemented in a subclass")
+
+    def get_converted_message(self, message: Message) -> Any:
+        """
+        Convert a message to the provider's request format, reusing the result of a previous
+        conversion of the same message. This way, each turn only converts the messages that were
+        added since the last turn.
+
+        Messages are assumed not to change once they have been sent, apart from their `content`,
+        which is checked. The converted message is shared between requests, so it must not be
+        modified.
+
+        Image messages are converted again for each request instead, so their encoded images
+        aren't kept in memory between requests.
+
+        Parameters
+        ----------
+        message : Message
+            The message to convert.
+
+        Returns
+        -------
+        Any
+            The converted message.
+        """
+        if isinstance(message, ImageMessage):
+            return self.convert_message(message)
+
+        key = id(message)
+        entry = self._converted_messages.get(key)
+
+        if entry is not None and entry[0]() is message and entry[1] is message.content:
+            return entry[2]
+
+        converted = self.convert_message(message)
+        converted_messages = self._converted_messages
+
+        # drop the entry when the message is garbage collected, before its id can be reused
+        self._converted_messages[key] = (
+            weakref.ref(message, lambda _: converted_messages.pop(key, None)),
+            message.content,
+            converted,
+        )
+
+        return converted
+
     def get_completion(
         self,
         input_messages: list[Message],
@@ -56,8 +178,569 @@ class BaseApiAdapter:
         -----
         The `content` field of the returned Message object should not be to be considered fully
         populated until the Iterable is fully consumed.
+
+        Requests that fail with a transient error (see `get_retry_delay()`) are retried, as long as
+        no text has been received yet.
+        """
+        request_start = time.monotonic()
+        response_stream = self.open_stream_with_retries(lambda: self.open_stream(input_messages))
+        response_message = self.get_response_message()
+
+        return (
+            self.output_stream(response_stream, response_message, request_start),
+            response_message,
+        )
+
+    async def get_completion_async(
+        self,
+        input_messages: list[Message],
+    ) -> Tuple[AsyncIterator[str] | None, Message]:
+        """
+        Get a completion from the API, using the provider's async client.
+
+        Parameters
+        ----------
+        input_messages : (list[Message])
+            The messages to use as input.
+
+        Returns
+        -------
+        stream : AsyncIterator[str] | None
+            Text output stream.
+        message : Message
+            The Message object with metadata. (See Notes for important information.)
+
+        Notes
+        -----
+        The `content` field of the returned Message object should not be to be considered fully
+        populated until the AsyncIterator is fully consumed.
+
+        Requests are retried as in `get_completion()`.
+        """
+        request_start = time.monotonic()
+        response_stream = await self.open_stream_with_retries_async(
+            lambda: self.open_stream_async(input_messages)
+        )
+        response_message = self.get_response_message()
+
+        return (
+            self.output_stream_async(response_stream, response_message, request_start),
+            response_message,
+        )
+
+    def open_stream(self, input_messages: list[Message]) -> Iterable[Any]:
+        """
+        Send a streaming request to the API.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            The messages to use as input.
+
+        Returns
+        -------
+        Iterable[Any]
+            The provider's streaming response.
+        """
+        raise NotImplementedError("open_stream() must be implemented in a subclass")
+
+    async def open_stream_async(self, input_messages: list[Message]) -> AsyncIterable[Any]:
+        """
+        Send a streaming request to the API, using the provider's async client.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            The messages to use as input.
+
+        Returns
+        -------
+        AsyncIterable[Any]
+            The provider's streaming response.
+        """
+        raise NotImplementedError("open_stream_async() must be implemented in a subclass")
+
+    def is_retryable_error(self, error: Exception) -> bool:
+        """
+        Check whether a request that failed with an error may succeed if retried: rate limiting,
+        overloading, server errors, timeouts and dropped connections. Subclasses extend this with
+        their SDK's exceptions.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request.
+
+        Returns
+        -------
+        bool
+            True if the request should be retried.
+        """
+        status_code = getattr(error, "status_code", None)
+
+        if isinstance(status_code, int) and status_code in self.RETRY_STATUS_CODES:
+            return True
+
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+    @staticmethod
+    def get_retry_after(error: Exception) -> float | None:
+        """
+        Get the delay requested by the `Retry-After` (or `retry-after-ms`) header of an error
+        response.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request.
+
+        Returns
+        -------
+        float | None
+            The delay in seconds, or None if the response doesn't request one.
+        """
+        headers = getattr(getattr(error, "response", None), "headers", None)
+
+        if headers is None:
+            return None
+
+        try:
+            retry_after_ms = headers.get("retry-after-ms")
+            if retry_after_ms is not None:
+                return max(float(retry_after_ms) / 1000, 0)
+        except (TypeError, ValueError):
+            pass
+
+        retry_after = headers.get("retry-after")
+
+        if retry_after is None:
+            return None
+
+        try:
+            return max(float(retry_after), 0)
+        except (TypeError, ValueError):
+            pass
+
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def get_retry_delay(self, error: Exception, attempt: int) -> float | None:
+        """
+        Get the delay before retrying a failed request. The server's `Retry-After` is honored;
+        otherwise, the delay grows exponentially with each attempt, with random jitter so that
+        concurrent requests don't retry in lockstep.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request.
+        attempt : int
+            The number of retries made so far.
+
+        Returns
+        -------
+        float | None
+            The delay in seconds, or None if the request should not be retried.
+        """
+        if attempt >= self.get_config("max_retries", int, 0) or not self.is_retryable_error(error):
+            return None
+
+        retry_after = self.get_retry_after(error)
+
+        if retry_after is not None:
+            return min(retry_after, self.RETRY_MAX_DELAY)
+
+        delay = min(self.RETRY_BASE_DELAY * 2 ** attempt, self.RETRY_MAX_DELAY)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def close_stream(stream: Any) -> None:
+        """
+        Close a provider stream that is being abandoned, if it can be closed.
         """
-        raise NotImplementedError("get_completion() must be implemented in a subclass")
+        close = getattr(stream, "close", None)
+
+        if callable(close):
+            try:
+                close()
+            except Exception: # pylint: disable=broad-exception-caught
+                pass
+
+    @staticmethod
+    async def close_stream_async(stream: Any) -> None:
+        """
+        Close an async provider stream that is being abandoned, if it can be closed.
+        """
+        close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+
+        if callable(close):
+            try:
+                result = close()
+
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception: # pylint: disable=broad-exception-caught
+                pass
+
+    @staticmethod
+    def stream_opened(stream: Any) -> None:
+        """
+        Pass a newly opened provider stream to the `STREAM_OPENED` callback of the current context,
+        if there is one.
+        """
+        callback = STREAM_OPENED.get()
+
+        if callback is not None:
+            callback(stream)
+
+    def open_stream_with_retries(
+        self,
+        open_stream: Callable[[], Iterable[Any]],
+        attempt: int = 0,
+    ) -> Iterator[Any]:
+        """
+        Open a provider stream, retrying transient errors. The returned iterator also retries if
+        the stream fails before any text has been received; after that, errors are raised.
+
+        Parameters
+        ----------
+        open_stream : Callable[[], Iterable[Any]]
+            A function sending the request, and returning the provider stream.
+        attempt : int
+            The number of retries made so far.
+
+        Returns
+        -------
+        Iterator[Any]
+            The chunks of the provider stream.
+        """
+        while True:
+            try:
+                stream = open_stream()
+                self.stream_opened(stream)
+                break
+            except Exception as error: # pylint: disable=broad-exception-caught
+                delay = self.get_retry_delay(error, attempt)
+
+                if delay is None:
+                    raise
+
+                time.sleep(delay)
+                attempt += 1
+
+        return self.resume_stream(stream, open_stream, attempt)
+
+    def resume_stream(
+        self,
+        stream: Iterable[Any],
+        open_stream: Callable[[], Iterable[Any]],
+        attempt: int,
+    ) -> Iterator[Any]:
+        """
+        Iterate over a provider stream, reopening it if it fails before any text was received.
+        """
+        received_text = False
+
+        try:
+            for chunk in stream:
+                received_text = received_text or bool(self.get_fragment(chunk))
+                yield chunk
+
+            return
+        except Exception as error: # pylint: disable=broad-exception-caught
+            delay = None if received_text else self.get_retry_delay(error, attempt)
+
+            if delay is None:
+                raise
+
+            self.close_stream(stream)
+
+        time.sleep(delay)
+        yield from self.open_stream_with_retries(open_stream, attempt + 1)
+
+    async def open_stream_with_retries_async(
+        self,
+        open_stream: Callable[[], Awaitable[AsyncIterable[Any]]],
+        attempt: int = 0,
+    ) -> AsyncIterator[Any]:
+        """
+        Open a provider stream with the provider's async client, retrying transient errors, as in
+        `open_stream_with_retries()`.
+        """
+        while True:
+            try:
+                stream = await open_stream()
+                self.stream_opened(stream)
+                break
+            except Exception as error: # pylint: disable=broad-exception-caught
+                delay = self.get_retry_delay(error, attempt)
+
+                if delay is None:
+                    raise
+
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        return self.resume_stream_async(stream, open_stream, attempt)
+
+    async def resume_stream_async(
+        self,
+        stream: AsyncIterable[Any],
+        open_stream: Callable[[], Awaitable[AsyncIterable[Any]]],
+        attempt: int,
+    ) -> AsyncIterator[Any]:
+        """
+        Iterate over an async provider stream, reopening it if it fails before any text was
+        received.
+        """
+        received_text = False
+
+        try:
+            async for chunk in stream:
+                received_text = received_text or bool(self.get_fragment(chunk))
+                yield chunk
+
+            return
+        except Exception as error: # pylint: disable=broad-exception-caught
+            delay = None if received_text else self.get_retry_delay(error, attempt)
+
+            if delay is None:
+                raise
+
+            await self.close_stream_async(stream)
+
+        await asyncio.sleep(delay)
+
+        async for chunk in await self.open_stream_with_retries_async(open_stream, attempt + 1):
+            yield chunk
+
+    @staticmethod
+    def get_fragment(chunk: Any) -> str | None:
+        """
+        Extract the text fragment from a chunk of a streaming response.
+
+        Parameters
+        ----------
+        chunk : Any
+            A chunk of the provider's streaming response.
+
+        Returns
+        -------
+        str | None
+            The text fragment, or None if the chunk doesn't contain any text.
+        """
+        raise NotImplementedError("get_fragment() must be implemented in a subclass")
+
+    @staticmethod
+    def update_message(chunk: Any, response_message: Message) -> None:
+        """
+        Update the response message with metadata from a chunk of a streaming response, such as
+        token usage. Called for every chunk, before `get_fragment()`. Does nothing by default.
+
+        Parameters
+        ----------
+        chunk : Any
+            A chunk of the provider's streaming response.
+        response_message : Message
+            The message object to update.
+        """
+
+    @classmethod
+    def output_stream(
+        cls,
+        response_stream: Iterable[Any],
+        response_message: Message,
+        request_start: float | None = None,
+    ) -> Iterator[str]:
+        """
+        Process a streaming response from the API.
+
+        Parameters
+        ----------
+        response_stream : Iterable[Any]
+            The streaming response object from the API.
+        response_message : Message
+            The message object to update with the response content.
+        request_start : float | None
+            The `time.monotonic()` timestamp at which the request was sent, for metrics.
+
+        Yields
+        ------
+        str
+            Fragments of the response content as they are received.
+
+        Notes
+        -----
+        Fragments are collected in a buffer and joined into `response_message.content` once the
+        stream ends or is closed, rather than concatenated as they arrive, which would copy the
+        whole response for every fragment. Latency metrics are then stored in
+        `response_message.extra["metrics"]` (see `llmcli.metrics.StreamMetrics`).
+        """
+        fragments = []
+        metrics = StreamMetrics(request_start)
+
+        try:
+            for chunk in response_stream:
+                metrics.chunk_received()
+                cls.update_message(chunk, response_message)
+                fragment = cls.get_fragment(chunk)
+
+                if fragment is None:
+                    continue
+
+                fragments.append(fragment)
+                metrics.fragment_received(fragment)
+                yield fragment
+                metrics.consumer_resumed()
+        finally:
+            finalize_content(response_message, fragments)
+            finalize_metrics(response_message, metrics)
+
+    @classmethod
+    async def output_stream_async(
+        cls,
+        response_stream: AsyncIterable[Any],
+        response_message: Message,
+        request_start: float | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Process a streaming response from the API's async client.
+
+        Parameters
+        ----------
+        response_stream : AsyncIterable[Any]
+            The async streaming response object from the API.
+        response_message : Message
+            The message object to update with the response content.
+        request_start : float | None
+            The `time.monotonic()` timestamp at which the request was sent, for metrics.
+
+        Yields
+        ------
+        str
+            Fragments of the response content as they are received.
+
+        Notes
+        -----
+        As with `output_stream()`, `response_message.content` and metrics are set when the stream
+        ends or is closed.
+        """
+        fragments = []
+        metrics = StreamMetrics(request_start)
+
+        try:
+            async for chunk in response_stream:
+                metrics.chunk_received()
+                cls.update_message(chunk, response_message)
+                fragment = cls.get_fragment(chunk)
+
+                if fragment is None:
+                    continue
+
+                fragments.append(fragment)
+                metrics.fragment_received(fragment)
+                yield fragment
+                metrics.consumer_resumed()
+        finally:
+            finalize_content(response_message, fragments)
+            finalize_metrics(response_message, metrics)
+
+    def get_response_message(self) -> Message:
+        """
+        Create an empty response message, with metadata for the current configuration.
+
+        Returns
+        -------
+        Message
+            The response message.
+        """
+        return Message(
+            role="assistant",
+            content="",
+            adapter=self.NAME,
+            adapter_options=self.get_masked_config(),
+            display_name=self.get_display_name(),
+        )
+
+    def get_image(self, message: ImageMessage) -> Tuple[str, str]:
+        """
+        Get the image of an image message for upload. If the `image_resize` option is set, the
+        image is scaled down to the provider's maximum size (or `image_max_size`) and recompressed
+        (see `llmcli.images`).
+
+        Parameters
+        ----------
+        message : ImageMessage
+            The image message.
+
+        Returns
+        -------
+        image_type : str
+            The MIME type of the image.
+        image_content : str
+            The base64-encoded image.
+        """
+        max_size = self.IMAGE_MAX_SIZE
+        max_side = self.get_config("image_max_size", int)
+
+        if max_side is not None:
+            max_size = (max_side, max_side)
+
+        if not self.get_config("image_resize", parse_bool, False) or max_size is None:
+            return message.image_type, message.image_content
+
+        return prepare_image(
+            message, max_size, self.get_config("image_quality", int, DEFAULT_IMAGE_QUALITY)
+        )
+
+    def get_context_budget(self) -> int | None:
+        """
+        Get the number of tokens available for input messages: the context window, minus room for
+        the response.
+
+        Returns
+        -------
+        int | None
+            The token budget, or None if the context window is unknown.
+        """
+        context_window = self.get_config("context_window", int)
+
+        if context_window is None:
+            return None
+
+        return context_window - self.get_config(
+            "max_tokens", int, self.DEFAULT_RESPONSE_TOKENS
+        )
+
+    def get_base_url(self) -> str | None:
+        """
+        Get the base URL of the API, for adapters using HTTP APIs.
+
+        Returns
+        -------
+        str | None
+            The base URL, or None if unknown.
+        """
+        return None
+
+    def get_pool_key(self) -> tuple:
+        """
+        Get the key identifying the shared HTTP connection pool this adapter uses: the adapter, the
+        API host, and the pool configuration (see `llmcli.adapters.pool`).
+
+        Returns
+        -------
+        tuple
+            The pool key.
+        """
+        return (
+            self.NAME,
+            self.get_base_url(),
+            self.get_config("pool_connections", int),
+            self.get_config("keepalive", float),
+        )
 
     def get_display_name(self) -> str:
         """
@@ -128,7 +811,7 @@ class BaseApiAdapter:
         args = ', '.join(
             f'{k}={repr(v)}'
             for k, v in self.__dict__.items()
-            if v is not None
+            if v is not None and not k.startswith("_")
         )
         return f"{self.__class__.__name__}({args})"
 
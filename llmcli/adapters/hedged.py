@@ -0,0 +1,349 @@
+"""
+This module provides the HedgedApiAdapter class, which sends requests to a primary adapter and, if
+no text arrives within a delay, also to a backup adapter.
+
+Occasional provider stalls dominate the tail of the time to first token. Hedging cuts that tail
+without doubling normal traffic: most requests get their first token before the delay, and never
+reach the backup. When both requests are in flight, the first to produce text wins, and the other
+is cancelled: its provider stream is closed right away, even while a request is blocked reading it
+(see `STREAM_OPENED`).
+"""
+import asyncio
+import queue
+import threading
+import time
+from typing import AsyncIterator, Iterable, Iterator, Tuple
+
+from llmcli.adapters.base import STREAM_OPENED, BaseApiAdapter
+from llmcli.messages.message import Message
+
+
+class HedgedRequest:
+    """
+    A request to one of the adapters of a hedged completion, run in a background thread until its
+    first text arrives.
+
+    Parameters
+    ----------
+    role : str
+        "primary" or "backup".
+    adapter : BaseApiAdapter
+        The adapter to send the request with.
+    input_messages : list[Message]
+        The messages to use as input.
+    results : queue.Queue
+        Receives the request once it has text, has ended, or has failed.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        role: str,
+        adapter: BaseApiAdapter,
+        input_messages: list[Message],
+        results: queue.Queue,
+    ) -> None:
+        self.role = role
+        self.adapter = adapter
+        self.input_messages = input_messages
+        self.results = results
+        self.stream = None
+        self.provider_stream = None
+        self.message = None
+        self.prefix = []
+        self.error = None
+        self.done = False
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def start(self) -> "HedgedRequest":
+        """
+        Send the request in a background thread.
+        """
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self) -> None:
+        """
+        Send the request, and read the response until its first text.
+        """
+        STREAM_OPENED.set(self.provider_stream_opened)
+
+        try:
+            stream, self.message = self.adapter.get_completion(self.input_messages)
+            self.stream = iter(stream) if stream is not None else iter(())
+
+            for fragment in self.stream:
+                self.prefix.append(fragment)
+
+                if fragment:
+                    break
+        except Exception as ex: # pylint: disable=broad-exception-caught
+            self.error = ex
+
+        with self.lock:
+            self.done = True
+            cancelled = self.cancelled
+
+        if cancelled:
+            self.close()
+        else:
+            self.results.put(self)
+
+    def provider_stream_opened(self, stream) -> None:
+        """
+        Keep a handle to the provider stream of the request, to close it on cancellation.
+        """
+        with self.lock:
+            self.provider_stream = stream
+            cancelled = self.cancelled
+
+        if cancelled:
+            BaseApiAdapter.close_stream(stream)
+
+    def cancel(self) -> None:
+        """
+        Abandon the request. Its provider stream is closed right away, which makes a read blocked
+        on it fail, and the rest of the response is closed once the request returns.
+        """
+        with self.lock:
+            self.cancelled = True
+            done = self.done
+            provider_stream = self.provider_stream
+
+        if done:
+            self.close()
+        else:
+            BaseApiAdapter.close_stream(provider_stream)
+
+    def close(self) -> None:
+        """
+        Close the response stream, and the provider stream under it.
+        """
+        BaseApiAdapter.close_stream(self.stream)
+        BaseApiAdapter.close_stream(self.provider_stream)
+
+    def output_stream(self) -> Iterator[str]:
+        """
+        Yield the fragments of the response, including those read before it won.
+        """
+        yield from self.prefix
+        yield from self.stream
+
+
+class HedgedApiAdapter(BaseApiAdapter):
+    """
+    Adapter sending requests to a primary adapter, and to a backup adapter if the primary adapter
+    doesn't produce any text within a delay (or fails). The response that produces text first is
+    used.
+
+    The response message comes from the adapter that won, and its `extra["hedge"]` records which
+    one it was, and the time to first token from the start of the hedged request.
+
+    Parameters
+    ----------
+    primary : BaseApiAdapter
+        The adapter every request is sent to.
+    backup : BaseApiAdapter
+        The adapter requests are also sent to when the primary adapter stalls.
+    delay : float
+        The number of seconds to wait for text from the primary adapter before sending the request
+        to the backup adapter.
+    """
+    NAME = "hedged"
+    HR_NAME = "Hedged"
+
+    def __init__(self, primary: BaseApiAdapter, backup: BaseApiAdapter, delay: float) -> None:
+        super().__init__({})
+        self.primary = primary
+        self.backup = backup
+        self.delay = delay
+
+    def get_display_name(self) -> str:
+        """
+        Get the display name for the current model configuration.
+        """
+        return f"{self.primary.get_display_name()} (hedged with {self.backup.get_display_name()})"
+
+    def get_masked_config(self) -> dict:
+        """
+        Get the configuration of both adapters, with sensitive values masked.
+        """
+        return {
+            "primary": {"adapter": self.primary.NAME, **self.primary.get_masked_config()},
+            "backup": {"adapter": self.backup.NAME, **self.backup.get_masked_config()},
+            "delay": self.delay,
+        }
+
+    def get_context_budget(self) -> int | None:
+        """
+        Get the number of tokens available for input messages, which must fit both adapters.
+        """
+        budgets = [
+            budget for budget in (
+                self.primary.get_context_budget(), self.backup.get_context_budget()
+            )
+            if budget is not None
+        ]
+
+        return min(budgets) if budgets else None
+
+    @staticmethod
+    def record_hedge(winner_role: str, message: Message, start: float, hedged: bool) -> None:
+        """
+        Record which adapter won a hedged request in the response message.
+        """
+        message.extra = {
+            **(message.extra or {}),
+            "hedge": {
+                "winner": winner_role,
+                "hedged": hedged,
+                "ttft": time.monotonic() - start,
+            },
+        }
+
+    def get_completion(
+        self,
+        input_messages: list[Message],
+    ) -> Tuple[Iterable[str] | None, Message]:
+        """
+        Get a completion from the primary adapter, hedged with the backup adapter.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            The messages to use as input.
+
+        Returns
+        -------
+        stream : Iterable[str] | None
+            Text output stream.
+        message : Message
+            The Message object with metadata, from the adapter that won.
+
+        Raises
+        ------
+        Exception
+            The primary adapter's error, if both requests fail.
+        """
+        start = time.monotonic()
+        results = queue.Queue()
+        requests = [HedgedRequest("primary", self.primary, input_messages, results).start()]
+        failed = 0
+        winner = None
+
+        while winner is None:
+            hedged = len(requests) > 1
+
+            try:
+                request = results.get(timeout=None if hedged else self.delay)
+            except queue.Empty:
+                request = None
+
+            if request is not None and request.error is None:
+                winner = request
+                continue
+
+            failed += request is not None
+
+            if not hedged:
+                requests.append(
+                    HedgedRequest("backup", self.backup, input_messages, results).start()
+                )
+            elif failed == len(requests):
+                raise requests[0].error
+
+        for request in requests:
+            if request is not winner:
+                request.cancel()
+
+        self.record_hedge(winner.role, winner.message, start, len(requests) > 1)
+        return winner.output_stream(), winner.message
+
+    async def get_completion_async(
+        self,
+        input_messages: list[Message],
+    ) -> Tuple[AsyncIterator[str] | None, Message]:
+        """
+        Get a completion from the primary adapter, hedged with the backup adapter, using the
+        adapters' async clients. The losing request is cancelled.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            The messages to use as input.
+
+        Returns
+        -------
+        stream : AsyncIterator[str] | None
+            Text output stream.
+        message : Message
+            The Message object with metadata, from the adapter that won.
+        """
+        start = time.monotonic()
+        # the provider streams opened by each request
+        opened = {"primary": [], "backup": []}
+
+        async def send(adapter: BaseApiAdapter, role: str):
+            STREAM_OPENED.set(opened[role].append)
+            stream = None
+
+            try:
+                stream, message = await adapter.get_completion_async(input_messages)
+                prefix = []
+
+                async for fragment in stream:
+                    prefix.append(fragment)
+
+                    if fragment:
+                        break
+
+                return stream, message, prefix
+            except asyncio.CancelledError:
+                await self.close_stream_async(stream)
+
+                for provider_stream in opened[role]:
+                    await self.close_stream_async(provider_stream)
+
+                raise
+
+        tasks = {asyncio.create_task(send(self.primary, "primary")): "primary"}
+        done, _ = await asyncio.wait(tasks, timeout=self.delay)
+        winner = next((task for task in done if task.exception() is None), None)
+
+        if winner is None:
+            tasks[asyncio.create_task(send(self.backup, "backup"))] = "backup"
+            pending = {task for task in tasks if not task.done()}
+
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+
+        losers = [task for task in tasks if task is not winner]
+
+        for task in losers:
+            task.cancel()
+
+        # let the cancelled requests close their streams
+        await asyncio.gather(*losers, return_exceptions=True)
+
+        for task in losers:
+            if not task.cancelled() and task.exception() is None:
+                await self.close_stream_async(task.result()[0])
+
+                for provider_stream in opened[tasks[task]]:
+                    await self.close_stream_async(provider_stream)
+
+        if winner is None:
+            raise next(iter(tasks)).exception()
+
+        stream, message, prefix = winner.result()
+        self.record_hedge(tasks[winner], message, start, len(tasks) > 1)
+
+        async def output_stream():
+            for fragment in prefix:
+                yield fragment
+
+            async for fragment in stream:
+                yield fragment
+
+        return output_stream(), message
@@ -3,16 +3,44 @@ This module provides the OllamaApiAdapter class, which integrates with the Ollam
 to generate completions and handle streaming responses.
 
 The adapter supports configuration options such as model selection, sampling parameters,
-and context settings.
+and context settings. It can also keep the model loaded between requests, and preload it in the
+background when the adapter is created.
 """
 
-from typing import Iterable, Tuple
+import asyncio
+import os
+import threading
+from typing import AsyncIterable, Iterable
+import httpx
 import ollama
 
-from llmcli.adapters.base import BaseApiAdapter, ApiAdapterOption
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.adapters.pool import get_shared_async_client, get_shared_client
+from llmcli.adapters.registry import OLLAMA_ADAPTER_SPEC
 from llmcli.messages.message import Message
 from llmcli.messages.file_message import FileMessage
 from llmcli.messages.image_message import ImageMessage
+from llmcli.util import parse_bool
+
+
+def parse_keep_alive(value: str) -> float | str:
+    """
+    Parse a `keep_alive` option value: a number of seconds, or a duration such as "10m".
+
+    Parameters
+    ----------
+    value : str
+        The option value.
+
+    Returns
+    -------
+    float | str
+        The number of seconds, or the duration as-is.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return value
 
 
 class OllamaApiAdapter(BaseApiAdapter):
@@ -37,105 +65,148 @@ class OllamaApiAdapter(BaseApiAdapter):
     params : dict
         A dictionary of configuration parameters for the adapter.
     """
-    NAME = "ollama"
-    HR_NAME = "Ollama"
-    EXTRA_HELP = "By default, uses an Ollama instance running on localhost. For remote " + \
-        "instances, set the OLLAMA_HOST environment variable."
-    MASKED_OPTIONS = set()
-    OPTIONS = [
-        ApiAdapterOption(
-            name="model",
-            hr_name="Model",
-            description="Model ID used to generate the response.",
-            default="llama3.1:8b",
-        ),
-        ApiAdapterOption(
-            name="mirostat",
-            hr_name="Mirostat",
-            description="Enable Mirostat sampling for controlling perplexity.",
-        ),
-        ApiAdapterOption(
-            name="mirostat_eta",
-            hr_name="Mirostat Eta",
-            description=
-              "Influences how quickly the algorithm responds to feedback from the generated text.",
-        ),
-        ApiAdapterOption(
-            name="mirostat_tau",
-            hr_name="Mirostat Tau",
-            description="Controls the balance between coherence and diversity of the output.",
-        ),
-        ApiAdapterOption(
-            name="num_ctx",
-            hr_name="Context Size",
-            description="Sets the size of the context window used to generate the next token.",
-        ),
-        ApiAdapterOption(
-            name="repeat_last_n",
-            hr_name="Repeat Last N",
-            description="Sets how far back for the model to look back to prevent repetition.",
-        ),
-        ApiAdapterOption(
-            name="repeat_penalty",
-            hr_name="Repeat Penalty",
-            description="Sets how strongly to penalize repetitions.",
-        ),
-        ApiAdapterOption(
-            name="temperature",
-            hr_name="Temperature",
-            description="The temperature of the model; higher values increase creativity.",
-        ),
-        ApiAdapterOption(
-            name="seed",
-            hr_name="Seed",
-            description="Sets the random number seed to use for generation.",
-        ),
-        ApiAdapterOption(
-            name="num_predict",
-            hr_name="Max Tokens",
-            description="Maximum number of tokens to predict when generating text.",
-        ),
-        ApiAdapterOption(
-            name="top_k",
-            hr_name="Top-K",
-            description=
-              "Reduces the probability of generating nonsense by limiting token selection.",
-        ),
-        ApiAdapterOption(
-            name="top_p",
-            hr_name="Top-P",
-            description=
-              "Controls diversity via nucleus sampling; higher values yield more diverse text.",
-        ),
-    ]
+    NAME = OLLAMA_ADAPTER_SPEC.name
+    HR_NAME = OLLAMA_ADAPTER_SPEC.hr_name
+    EXTRA_HELP = OLLAMA_ADAPTER_SPEC.extra_help
+    MASKED_OPTIONS = OLLAMA_ADAPTER_SPEC.masked_options
+    OPTIONS = OLLAMA_ADAPTER_SPEC.options
+
+    DEFAULT_HOST = "http://localhost:11434"
+
+    def __init__(self, params):
+        """
+        Initialize the OllamaApiAdapter with the given parameters, and start preloading the model
+        if the `preload` option is set.
+
+        Parameters
+        ----------
+        params : dict
+            A dictionary of configuration parameters for the adapter.
+        """
+        super().__init__(params)
+        self.client = get_shared_client(
+            self.get_pool_key(), lambda: ollama.Client(host=self.get_base_url())
+        )
+        self._async_client = None
+        self.preload_thread = None
+
+        if self.get_config('preload', cast=parse_bool, default=False):
+            self.preload_thread = threading.Thread(target=self.preload, daemon=True)
+            self.preload_thread.start()
+
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        """
+        The async Ollama client, created on first use.
+        """
+        if self._async_client is None:
+            self._async_client = get_shared_async_client(
+                self.get_pool_key(),
+                asyncio.get_running_loop(),
+                lambda: ollama.AsyncClient(host=self.get_base_url()),
+            )
+
+        return self._async_client
+
+    def get_base_url(self) -> str:
+        """
+        Get the URL of the Ollama instance, from the `host` option or OLLAMA_HOST.
+        """
+        return self.get_config('host') or os.environ.get("OLLAMA_HOST") or self.DEFAULT_HOST
+
+    def get_keep_alive(self) -> float | str | None:
+        """
+        Get how long the model should stay loaded after a request, or None for Ollama's default.
+        """
+        return self.get_config('keep_alive', cast=parse_keep_alive)
+
+    def preload(self) -> None:
+        """
+        Load the model into memory, so the first request doesn't wait for it. A chat request without
+        messages loads the model without generating anything. Errors are ignored, since the first
+        real request will report them.
+        """
+        try:
+            self.client.chat(
+                model=self.get_config('model'), messages=[], keep_alive=self.get_keep_alive()
+            )
+        except Exception: # pylint: disable=broad-exception-caught
+            pass
 
     @staticmethod
-    def output_stream(response_stream: Iterable[dict], response_message: Message) -> Iterable[str]:
+    def get_fragment(chunk: dict) -> str | None:
+        """
+        Extract the text fragment from a chunk of a streaming response from the Ollama API.
+
+        Parameters
+        ----------
+        chunk : dict
+            A chunk of the streaming response.
+
+        Returns
+        -------
+        str | None
+            The text fragment.
+        """
+        return chunk["message"]["content"]
+
+    def convert_message(self, message: Message) -> dict:
         """
-        Process the streaming response from the Ollama API.
+        Convert a message to the Ollama chat format.
 
         Parameters
         ----------
-        response_stream : Iterable[dict]
-            The streaming response object from the API.
-        response_message : Message
-            The message object to update with the response content.
+        message : Message
+            The message to convert.
+
+        Returns
+        -------
+        dict
+            The converted message.
+        """
+        if isinstance(message, FileMessage):
+            return {
+                "role": message.role,
+                "content": f"### FILE: {message.file_label}\n\n" + \
+                    f"```\n{message.file_content}\n```",
+            }
 
-        Yields
-        ------
-        str
-            Fragments of the response content as they are received.
+        if isinstance(message, ImageMessage):
+            _, image_content = self.get_image(message)
+
+            return {
+                "role": message.role,
+                "content": f"### IMAGE: {message.image_path}",
+                "images": [image_content],
+            }
+
+        return {"role": message.role, "content": message.content}
+
+    def get_context_budget(self) -> int | None:
         """
-        for chunk in response_stream:
-            fragment = chunk["message"]["content"]
-            response_message.content += fragment
-            yield fragment
+        Get the number of tokens available for input messages. The context window defaults to
+        `num_ctx`, and `num_predict` tokens (or a quarter of the window) are left for the response.
+
+        Returns
+        -------
+        int | None
+            The token budget, or None if the context window is unknown.
+        """
+        context_window = self.get_config("context_window", int) or self.get_config("num_ctx", int)
+
+        if context_window is None:
+            return None
+
+        num_predict = self.get_config("num_predict", int, -1)
+
+        if num_predict < 0:
+            num_predict = context_window // 4
+
+        return context_window - num_predict
 
-    def get_completion(
-        self, input_messages: list[Message]
-    ) -> Tuple[Iterable[str] | None, Message]:
+    def get_request(self, input_messages: list[Message]) -> dict:
         """
-        Generate a completion using the Ollama API.
+        Build the arguments for a chat request.
 
         Parameters
         ----------
@@ -144,37 +215,10 @@ class OllamaApiAdapter(BaseApiAdapter):
 
         Returns
         -------
-        stream : Iterable[str] | None
-            Text output stream.
-        message : Message
-            The Message object with metadata. (See Notes for important information.)
-
-        Notes
-        -----
-        The `content` field of the returned Message object should not be considered fully
-        populated until the Iterable is fully consumed.
-        """
-        messages = []
-
-        for message in input_messages:
-            if isinstance(message, FileMessage):
-                messages.append(
-                    {
-                        "role": message.role,
-                        "content": f"### FILE: {message.file_path}\n\n" + \
-                            f"```\n{message.file_content}\n```",
-                    }
-                )
-            elif isinstance(message, ImageMessage):
-                messages.append(
-                    {
-                        "role": message.role,
-                        "content": f"### IMAGE: {message.image_path}",
-                        "images": [message.image_content],
-                    }
-                )
-            else:
-                messages.append({"role": message.role, "content": message.content})
+        dict
+            Keyword arguments for `chat()`.
+        """
+        messages = [self.get_converted_message(message) for message in input_messages]
 
         options = ollama.Options(
             mirostat=self.get_config('mirostat', cast=int),
@@ -190,19 +234,59 @@ class OllamaApiAdapter(BaseApiAdapter):
             top_p=self.get_config('top_p', cast=float),
         )
 
-        response_stream = ollama.chat(
-            model=self.get_config('model'),
-            messages=messages,
-            options=options,
-            stream=True,
-        )
+        return {
+            "model": self.get_config('model'),
+            "messages": messages,
+            "options": options,
+            "keep_alive": self.get_keep_alive(),
+            "stream": True,
+        }
 
-        response_message = Message(
-            role="assistant",
-            content="",
-            adapter=self.NAME,
-            adapter_options=self.get_masked_config(),
-            display_name=self.get_display_name(),
-        )
+    def is_retryable_error(self, error: Exception) -> bool:
+        """
+        Check whether a request that failed with an error may succeed if retried, including
+        transport errors (e.g. a dropped connection) raised while streaming.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request.
+
+        Returns
+        -------
+        bool
+            True if the request should be retried.
+        """
+        return isinstance(error, httpx.TransportError) or super().is_retryable_error(error)
+
+    def open_stream(self, input_messages: list[Message]) -> Iterable:
+        """
+        Send a streaming request to the Ollama API.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to send to the API.
+
+        Returns
+        -------
+        Iterable
+            The streaming response.
+        """
+        return self.client.chat(**self.get_request(input_messages))
+
+    async def open_stream_async(self, input_messages: list[Message]) -> AsyncIterable:
+        """
+        Send a streaming request to the Ollama API, using the async client.
 
-        return self.output_stream(response_stream, response_message), response_message
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to send to the API.
+
+        Returns
+        -------
+        AsyncIterable
+            The streaming response.
+        """
+        return await self.async_client.chat(**self.get_request(input_messages))
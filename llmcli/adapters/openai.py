@@ -6,14 +6,24 @@ The adapter supports configuration options such as model selection, API key, and
 parameters like max tokens, temperature, top-p sampling, and penalties for frequency and presence.
 """
 
+import asyncio
 import os
-from typing import Iterable, Tuple
+from typing import AsyncIterable, Iterable
 
-from openai import OpenAI, Stream
+from openai import (
+    DEFAULT_CONNECTION_LIMITS,
+    APIConnectionError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
 from openai.types.chat import ChatCompletionChunk
 from openai import NOT_GIVEN
 
-from llmcli.adapters.base import BaseApiAdapter, ApiAdapterOption
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.adapters.pool import get_limits, get_shared_async_client, get_shared_client
+from llmcli.adapters.registry import OPENAI_ADAPTER_SPEC
 from llmcli.messages.message import Message
 from llmcli.messages.file_message import FileMessage
 from llmcli.messages.image_message import ImageMessage
@@ -31,7 +41,7 @@ class OpenAiApiAdapter(BaseApiAdapter):
         The human-readable name for the adapter.
     EXTRA_HELP : str
         Additional help text for the adapter.
-    MASKED_OPTIONS : list
+    MASKED_OPTIONS : set
         Configuration options that should be masked in logs or outputs.
     OPTIONS : list[ApiAdapterOption]
         List of configuration options supported by the adapter.
@@ -41,56 +51,17 @@ class OpenAiApiAdapter(BaseApiAdapter):
     params : dict
         A dictionary of configuration parameters for the adapter.
     """
-    NAME = "openai"
-    HR_NAME = "OpenAI"
-    EXTRA_HELP = "By default, uses the OpenAI API key from the environment variable OPENAI_API_KEY."
-    MASKED_OPTIONS = ["api_key"]
-    OPTIONS = [
-        ApiAdapterOption(
-            name="model",
-            hr_name="Model",
-            description="Model ID used to generate the response.",
-            default="gpt-4o",
-        ),
-        ApiAdapterOption(
-            name="api_key",
-            hr_name="API Key",
-            description="Your OpenAI API key",
-            default=os.environ.get("OPENAI_API_KEY"),
-            default_help_override="OPENAI_API_KEY",
-        ),
-        ApiAdapterOption(
-            name="max_tokens",
-            hr_name="Max Tokens",
-            description="The maximum number of tokens that can be " + \
-                "generated in the chat completion.",
-        ),
-        ApiAdapterOption(
-            name="temperature",
-            hr_name="Temperature",
-            description="What sampling temperature to use, between 0 and 2.",
-        ),
-        ApiAdapterOption(
-            name="top_p",
-            hr_name="Top P",
-            description="An alternative to sampling with temperature, called nucleus sampling.",
-        ),
-        ApiAdapterOption(
-            name="frequency_penalty",
-            hr_name="Frequency Penalty",
-            description="Number between -2.0 and 2.0. Positive values penalize new tokens " + \
-                "based on their existing frequency in the text so far.",
-        ),
-        ApiAdapterOption(
-            name="presence_penalty",
-            hr_name="Presence Penalty",
-            description="Number between -2.0 and 2.0. Positive values penalize new tokens " + \
-                "based on whether they appear in the text so far.",
-        ),
-    ]
+    NAME = OPENAI_ADAPTER_SPEC.name
+    HR_NAME = OPENAI_ADAPTER_SPEC.hr_name
+    EXTRA_HELP = OPENAI_ADAPTER_SPEC.extra_help
+    MASKED_OPTIONS = OPENAI_ADAPTER_SPEC.masked_options
+    OPTIONS = OPENAI_ADAPTER_SPEC.options
 
     # used when an image message is submitted without a MAX_TOKENS setting
     SAFE_MAX_TOKENS = 1000
+    DEFAULT_BASE_URL = "https://api.openai.com/v1"
+    # high detail images are scaled to fit 2048x2048, then to 768 pixels on their short side
+    IMAGE_MAX_SIZE = (2048, 768)
 
     def __init__(self, params):
         """
@@ -102,41 +73,118 @@ class OpenAiApiAdapter(BaseApiAdapter):
             A dictionary of configuration parameters for the adapter.
         """
         super().__init__(params)
-        self.client = OpenAI(api_key=self.get_config('api_key'))
+        # retries are handled by BaseApiAdapter, which can also retry a failed stream
+        self.client = OpenAI(
+            api_key=self.get_config('api_key'),
+            max_retries=0,
+            http_client=get_shared_client(
+                self.get_pool_key(), lambda: DefaultHttpxClient(limits=self.get_limits())
+            ),
+        )
+        self._async_client = None
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        The async OpenAI client, created on first use.
+        """
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.get_config('api_key'),
+                max_retries=0,
+                http_client=get_shared_async_client(
+                    self.get_pool_key(),
+                    asyncio.get_running_loop(),
+                    lambda: DefaultAsyncHttpxClient(limits=self.get_limits()),
+                ),
+            )
+
+        return self._async_client
+
+    def get_base_url(self) -> str:
+        """
+        Get the base URL of the OpenAI API, which may be overridden by OPENAI_BASE_URL.
+        """
+        return os.environ.get("OPENAI_BASE_URL") or self.DEFAULT_BASE_URL
+
+    def get_limits(self):
+        """
+        Get the connection pool limits for the shared HTTP client.
+        """
+        return get_limits(
+            DEFAULT_CONNECTION_LIMITS,
+            self.get_config('pool_connections', cast=int),
+            self.get_config('keepalive', cast=float),
+        )
 
     @staticmethod
-    def output_stream(
-        response_stream: Stream[ChatCompletionChunk], response_message: Message
-    ) -> Iterable[str]:
+    def get_fragment(chunk: ChatCompletionChunk) -> str | None:
         """
-        Process the streaming response from the OpenAI API.
+        Extract the text fragment from a chunk of a streaming response from the OpenAI API.
 
         Parameters
         ----------
-        response_stream : Stream[ChatCompletionChunk]
-            The streaming response object from the API.
-        response_message : Message
-            The message object to update with the response content.
+        chunk : ChatCompletionChunk
+            A chunk of the streaming response.
 
-        Yields
-        ------
-        str
-            Fragments of the response content as they are received.
+        Returns
+        -------
+        str | None
+            The text fragment, or None if the chunk doesn't contain any text.
         """
-        for chunk in response_stream:
-            fragment = chunk.choices[0].delta.content
+        return chunk.choices[0].delta.content
 
-            if fragment is None:
-                continue
+    def convert_message(self, message: Message) -> dict:
+        """
+        Convert a message to the OpenAI chat completion format.
 
-            response_message.content += fragment
-            yield fragment
+        Parameters
+        ----------
+        message : Message
+            The message to convert.
+
+        Returns
+        -------
+        dict
+            The converted message.
+        """
+        if isinstance(message, FileMessage):
+            return {
+                "role": message.role,
+                "content": f"### FILE: {message.file_label}\n\n" + \
+                    f"```\n{message.file_content}\n```",
+            }
+
+        if isinstance(message, ImageMessage):
+            image_type, image_content = self.get_image(message)
+
+            return {
+                "role": message.role,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"### IMAGE: {message.image_path}",
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": "data:"
+                            + image_type
+                            + ";base64,"
+                            + image_content
+                        },
+                    },
+                ],
+            }
+
+        return {
+            "role": message.role,
+            "content": message.content,
+        }
 
-    def get_completion(
-        self, input_messages: list[Message]
-    ) -> Tuple[Iterable[str] | None, Message]:
+    def get_request(self, input_messages: list[Message]) -> dict:
         """
-        Generate a completion using the OpenAI API.
+        Build the arguments for a chat completion request.
 
         Parameters
         ----------
@@ -145,77 +193,77 @@ class OpenAiApiAdapter(BaseApiAdapter):
 
         Returns
         -------
-        stream : Iterable[str] | None
-            Text output stream.
-        message : Message
-            The Message object with metadata. (See Notes for important information.)
-
-        Notes
-        -----
-        The `content` field of the returned Message object should not be considered fully
-        populated until the Iterable is fully consumed.
+        dict
+            Keyword arguments for `chat.completions.create()`.
         """
-        messages = []
+        messages = [self.get_converted_message(message) for message in input_messages]
         max_tokens = self.get_config('max_tokens', cast=int)
 
-        for message in input_messages:
-            if isinstance(message, FileMessage):
-                messages.append(
-                    {
-                        "role": message.role,
-                        "content": f"### FILE: {message.file_path}\n\n" + \
-                            f"```\n{message.file_content}\n```",
-                    }
-                )
-            elif isinstance(message, ImageMessage):
-                if max_tokens is None:
-                    max_tokens = self.SAFE_MAX_TOKENS
-
-                messages.append(
-                    {
-                        "role": message.role,
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": f"### IMAGE: {message.image_path}",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": "data:"
-                                    + message.image_type
-                                    + ";base64,"
-                                    + message.image_content
-                                },
-                            },
-                        ],
-                    }
-                )
-            else:
-                messages.append(
-                    {
-                        "role": message.role,
-                        "content": message.content,
-                    }
-                )
-
-        response_stream = self.client.chat.completions.create(
-            messages=messages,
-            model=self.get_config('model'),
-            stream=True,
-            max_tokens=max_tokens or NOT_GIVEN,
-            temperature=self.get_config('temperature', cast=float, default=NOT_GIVEN),
-            top_p=self.get_config('top_p', cast=float, default=NOT_GIVEN),
-            frequency_penalty=self.get_config('frequency_penalty', cast=float, default=NOT_GIVEN),
-            presence_penalty=self.get_config('presence_penalty', cast=float, default=NOT_GIVEN),
-        )
+        if max_tokens is None and any(isinstance(m, ImageMessage) for m in input_messages):
+            max_tokens = self.SAFE_MAX_TOKENS
 
-        response_message = Message(
-            role="assistant",
-            content="",
-            adapter=self.NAME,
-            adapter_options=self.get_masked_config,
-            display_name=self.get_display_name(),
-        )
+        return {
+            "messages": messages,
+            "model": self.get_config('model'),
+            "stream": True,
+            "max_tokens": max_tokens or NOT_GIVEN,
+            "temperature": self.get_config('temperature', cast=float, default=NOT_GIVEN),
+            "top_p": self.get_config('top_p', cast=float, default=NOT_GIVEN),
+            "frequency_penalty": self.get_config(
+                'frequency_penalty', cast=float, default=NOT_GIVEN
+            ),
+            "presence_penalty": self.get_config(
+                'presence_penalty', cast=float, default=NOT_GIVEN
+            ),
+        }
+
+    def is_retryable_error(self, error: Exception) -> bool:
+        """
+        Check whether a request that failed with an error may succeed if retried, including
+        connection errors and timeouts raised by the OpenAI SDK.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request.
+
+        Returns
+        -------
+        bool
+            True if the request should be retried.
+        """
+        return isinstance(error, APIConnectionError) or super().is_retryable_error(error)
+
+    def open_stream(self, input_messages: list[Message]) -> Iterable:
+        """
+        Send a streaming request to the OpenAI API.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to send to the API.
+
+        Returns
+        -------
+        Iterable
+            The streaming response.
+        """
+        return self.client.chat.completions.create(**self.get_request(input_messages))
+
+    async def open_stream_async(self, input_messages: list[Message]) -> AsyncIterable:
+        """
+        Send a streaming request to the OpenAI API, using the async client.
+
+        Parameters
+        ----------
+        input_messages : list[Message]
+            A list of input messages to send to the API.
 
-        return self.output_stream(response_stream, response_message), response_message
+        Returns
+        -------
+        AsyncIterable
+            The streaming response.
+        """
+        return await self.async_client.chat.completions.create(
+            **self.get_request(input_messages)
+        )
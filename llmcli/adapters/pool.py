@@ -0,0 +1,106 @@
+"""
+Shared HTTP clients for API adapters.
+
+Each provider SDK client normally creates its own HTTP connection pool, so every new adapter
+instance (e.g. after changing an option in the menu) starts with cold connections and pays for a
+new TLS handshake. Instead, adapters get their HTTP clients from here: one per provider host and
+pool configuration, shared by every adapter instance using it.
+
+Async HTTP clients are bound to the event loop they are used in, so they are shared per event loop.
+"""
+import threading
+import weakref
+from typing import Any, Callable, Hashable
+
+SHARED_CLIENTS = {}
+SHARED_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+SHARED_CLIENTS_LOCK = threading.Lock()
+
+
+def get_shared_client(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """
+    Get the shared HTTP client for a key, creating it on first use.
+
+    Parameters
+    ----------
+    key : Hashable
+        Identifies the client, e.g. the provider, its host and the pool configuration.
+    factory : Callable[[], Any]
+        Creates the client.
+
+    Returns
+    -------
+    Any
+        The shared client.
+    """
+    with SHARED_CLIENTS_LOCK:
+        client = SHARED_CLIENTS.get(key)
+
+        if client is None:
+            client = SHARED_CLIENTS[key] = factory()
+
+        return client
+
+
+def get_shared_async_client(key: Hashable, loop: Any, factory: Callable[[], Any]) -> Any:
+    """
+    Get the shared async HTTP client for a key and an event loop, creating it on first use. Clients
+    are released along with their event loop.
+
+    Parameters
+    ----------
+    key : Hashable
+        Identifies the client, e.g. the provider, its host and the pool configuration.
+    loop : asyncio.AbstractEventLoop
+        The event loop the client is used in.
+    factory : Callable[[], Any]
+        Creates the client.
+
+    Returns
+    -------
+    Any
+        The shared client.
+    """
+    with SHARED_CLIENTS_LOCK:
+        clients = SHARED_ASYNC_CLIENTS.setdefault(loop, {})
+        client = clients.get(key)
+
+        if client is None:
+            client = clients[key] = factory()
+
+        return client
+
+
+def get_limits(default_limits: Any, max_connections: int | None, keepalive: float | None) -> Any:
+    """
+    Get connection pool limits, based on an SDK's default limits.
+
+    The limits are created with the class of `default_limits`, since an SDK's HTTP client only
+    accepts limits from the HTTP library it was built with.
+
+    Parameters
+    ----------
+    default_limits : httpx.Limits
+        The SDK's default limits.
+    max_connections : int | None
+        The maximum number of connections (and of idle connections kept alive), or None for the
+        SDK's default.
+    keepalive : float | None
+        The number of seconds to keep idle connections alive, or None for the SDK's default.
+
+    Returns
+    -------
+    httpx.Limits
+        The limits.
+    """
+    if max_connections is None:
+        max_connections = default_limits.max_connections
+        max_keepalive_connections = default_limits.max_keepalive_connections
+    else:
+        max_keepalive_connections = max_connections
+
+    return type(default_limits)(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive if keepalive is not None else default_limits.keepalive_expiry,
+    )
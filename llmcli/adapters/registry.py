@@ -0,0 +1,382 @@
+"""
+This module describes the available API adapters without importing them.
+
+Each adapter is described by an `AdapterSpec`, which holds everything needed to list the adapter,
+validate its name and print its help text. The adapter module itself (and the provider SDK it
+depends on) is only imported when `AdapterSpec.load()` is called.
+"""
+import importlib
+import os
+
+from llmcli.adapters.base import ApiAdapterOption
+
+
+class AdapterSpec:
+    """
+    A lightweight description of an API adapter.
+
+    Parameters
+    ----------
+    name : str
+        The identifier for the adapter.
+    hr_name : str
+        The human-readable name for the adapter.
+    module : str
+        The dotted path of the module containing the adapter class.
+    class_name : str
+        The name of the adapter class within `module`.
+    options : list[ApiAdapterOption]
+        List of configuration options supported by the adapter.
+    masked_options : set[str] | None
+        Configuration options that should be masked in logs or outputs.
+    extra_help : str | None
+        Additional help text for the adapter.
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        name: str,
+        hr_name: str,
+        module: str,
+        class_name: str,
+        options: list[ApiAdapterOption],
+        masked_options: set[str] | None = None,
+        extra_help: str | None = None,
+    ) -> None:
+        self.name = name
+        self.hr_name = hr_name
+        self.module = module
+        self.class_name = class_name
+        self.options = options
+        self.masked_options = masked_options or set()
+        self.extra_help = extra_help
+
+    def load(self) -> type:
+        """
+        Import the adapter module and return the adapter class.
+
+        Returns
+        -------
+        type[BaseApiAdapter]
+            The adapter class.
+        """
+        return getattr(importlib.import_module(self.module), self.class_name)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(name={repr(self.name)}, module={repr(self.module)})"
+
+
+def get_image_options(max_size_help: str) -> list[ApiAdapterOption]:
+    """
+    Get the options controlling image downscaling, shared by all adapters.
+
+    Parameters
+    ----------
+    max_size_help : str
+        The provider's maximum image size, for the help text.
+
+    Returns
+    -------
+    list[ApiAdapterOption]
+        The options.
+    """
+    return [
+        ApiAdapterOption(
+            name="image_resize",
+            hr_name="Resize Images",
+            description="Scale images down to the maximum size the model uses, and " + \
+                "recompress them, before uploading them. Requires Pillow.",
+            default="off",
+        ),
+        ApiAdapterOption(
+            name="image_max_size",
+            hr_name="Maximum Image Size",
+            description="Maximum width and height of images, in pixels, when resizing them.",
+            default_help_override=max_size_help,
+        ),
+        ApiAdapterOption(
+            name="image_quality",
+            hr_name="Image Quality",
+            description="JPEG quality of resized images, from 1 to 95.",
+            default_help_override="85",
+        ),
+    ]
+
+
+OPENAI_ADAPTER_SPEC = AdapterSpec(
+    name="openai",
+    hr_name="OpenAI",
+    module="llmcli.adapters.openai",
+    class_name="OpenAiApiAdapter",
+    extra_help="By default, uses the OpenAI API key from the environment variable OPENAI_API_KEY.",
+    masked_options={"api_key"},
+    options=[
+        ApiAdapterOption(
+            name="model",
+            hr_name="Model",
+            description="Model ID used to generate the response.",
+            default="gpt-4o",
+        ),
+        ApiAdapterOption(
+            name="api_key",
+            hr_name="API Key",
+            description="Your OpenAI API key",
+            default=os.environ.get("OPENAI_API_KEY"),
+            default_help_override="OPENAI_API_KEY",
+        ),
+        ApiAdapterOption(
+            name="max_tokens",
+            hr_name="Max Tokens",
+            description="The maximum number of tokens that can be " + \
+                "generated in the chat completion.",
+        ),
+        ApiAdapterOption(
+            name="context_window",
+            hr_name="Context Window",
+            description="The size of the model's context window, in tokens. Old messages are " + \
+                "dropped to keep requests within it.",
+            default=128000,
+        ),
+        ApiAdapterOption(
+            name="temperature",
+            hr_name="Temperature",
+            description="What sampling temperature to use, between 0 and 2.",
+        ),
+        ApiAdapterOption(
+            name="top_p",
+            hr_name="Top P",
+            description="An alternative to sampling with temperature, called nucleus sampling.",
+        ),
+        ApiAdapterOption(
+            name="frequency_penalty",
+            hr_name="Frequency Penalty",
+            description="Number between -2.0 and 2.0. Positive values penalize new tokens " + \
+                "based on their existing frequency in the text so far.",
+        ),
+        ApiAdapterOption(
+            name="presence_penalty",
+            hr_name="Presence Penalty",
+            description="Number between -2.0 and 2.0. Positive values penalize new tokens " + \
+                "based on whether they appear in the text so far.",
+        ),
+        ApiAdapterOption(
+            name="max_retries",
+            hr_name="Max Retries",
+            description="Maximum number of times to retry a request that failed with a " + \
+                "transient error, such as rate limiting or a dropped connection.",
+            default=3,
+        ),
+        ApiAdapterOption(
+            name="pool_connections",
+            hr_name="Pool Connections",
+            description="Maximum number of pooled HTTP connections to the API host, shared by " + \
+                "all adapter instances.",
+        ),
+        ApiAdapterOption(
+            name="keepalive",
+            hr_name="Keep-Alive",
+            description="Number of seconds to keep idle HTTP connections open for reuse.",
+            default=60,
+        ),
+        *get_image_options("2048x768"),
+    ],
+)
+
+ANTHROPIC_ADAPTER_SPEC = AdapterSpec(
+    name="anthropic",
+    hr_name="Anthropic",
+    module="llmcli.adapters.anthropic",
+    class_name="AnthropicApiAdapter",
+    extra_help=(
+        "By default, uses the Anthropic API key from the environment variable ANTHROPIC_API_KEY."
+    ),
+    masked_options={"api_key"},
+    options=[
+        ApiAdapterOption(
+            name="model",
+            hr_name="Model",
+            description="Model ID used to generate the response.",
+            default="claude-3-7-sonnet-latest",
+        ),
+        ApiAdapterOption(
+            name="api_key",
+            hr_name="API Key",
+            description="Your Anthropic API key",
+            default=os.environ.get("ANTHROPIC_API_KEY"),
+            default_help_override="ANTHROPIC_API_KEY",
+        ),
+        ApiAdapterOption(
+            name="max_tokens",
+            hr_name="Max Tokens",
+            description="The maximum number of tokens that can be generated in the chat completion",
+            default=1000,
+        ),
+        ApiAdapterOption(
+            name="context_window",
+            hr_name="Context Window",
+            description="The size of the model's context window, in tokens. Old messages are " + \
+                "dropped to keep requests within it.",
+            default=200000,
+        ),
+        ApiAdapterOption(
+            name="temperature",
+            hr_name="Temperature",
+            description="What sampling temperature to use, between 0 and 2.",
+        ),
+        ApiAdapterOption(
+            name="top_p",
+            hr_name="Top P",
+            description="An alternative to sampling with temperature, called nucleus sampling.",
+        ),
+        ApiAdapterOption(
+            name="prompt_caching",
+            hr_name="Prompt Caching",
+            description="Mark the system prompt, large files and the conversation so far " + \
+                "as cacheable, so they aren't reprocessed every turn.",
+            default="on",
+        ),
+        ApiAdapterOption(
+            name="prompt_cache_min_chars",
+            hr_name="Prompt Cache Minimum File Size",
+            description="Minimum size, in characters, of a file to mark as cacheable.",
+            default=4096,
+        ),
+        ApiAdapterOption(
+            name="max_retries",
+            hr_name="Max Retries",
+            description="Maximum number of times to retry a request that failed with a " + \
+                "transient error, such as rate limiting or a dropped connection.",
+            default=3,
+        ),
+        ApiAdapterOption(
+            name="pool_connections",
+            hr_name="Pool Connections",
+            description="Maximum number of pooled HTTP connections to the API host, shared by " + \
+                "all adapter instances.",
+        ),
+        ApiAdapterOption(
+            name="keepalive",
+            hr_name="Keep-Alive",
+            description="Number of seconds to keep idle HTTP connections open for reuse.",
+            default=60,
+        ),
+        *get_image_options("1568"),
+    ],
+)
+
+OLLAMA_ADAPTER_SPEC = AdapterSpec(
+    name="ollama",
+    hr_name="Ollama",
+    module="llmcli.adapters.ollama",
+    class_name="OllamaApiAdapter",
+    extra_help="By default, uses an Ollama instance running on localhost. For remote " + \
+        "instances, set the host option or the OLLAMA_HOST environment variable. The maximum " + \
+        "image size depends on the model, so image_resize also needs image_max_size.",
+    options=[
+        ApiAdapterOption(
+            name="model",
+            hr_name="Model",
+            description="Model ID used to generate the response.",
+            default="llama3.1:8b",
+        ),
+        ApiAdapterOption(
+            name="host",
+            hr_name="Host",
+            description="URL of the Ollama instance.",
+            default_help_override="OLLAMA_HOST",
+        ),
+        ApiAdapterOption(
+            name="keep_alive",
+            hr_name="Keep Alive",
+            description="How long the model stays loaded after a request, in seconds or as " + \
+                "a duration (e.g. 30m). A negative value keeps it loaded indefinitely.",
+            default_help_override="5m",
+        ),
+        ApiAdapterOption(
+            name="preload",
+            hr_name="Preload",
+            description="Load the model in the background when the adapter is created, so " + \
+                "the first prompt doesn't wait for it.",
+            default="off",
+        ),
+        ApiAdapterOption(
+            name="mirostat",
+            hr_name="Mirostat",
+            description="Enable Mirostat sampling for controlling perplexity.",
+        ),
+        ApiAdapterOption(
+            name="mirostat_eta",
+            hr_name="Mirostat Eta",
+            description=
+              "Influences how quickly the algorithm responds to feedback from the generated text.",
+        ),
+        ApiAdapterOption(
+            name="mirostat_tau",
+            hr_name="Mirostat Tau",
+            description="Controls the balance between coherence and diversity of the output.",
+        ),
+        ApiAdapterOption(
+            name="num_ctx",
+            hr_name="Context Size",
+            description="Sets the size of the context window used to generate the next token.",
+        ),
+        ApiAdapterOption(
+            name="context_window",
+            hr_name="Context Window",
+            description="The size of the model's context window, in tokens. Old messages are " + \
+                "dropped to keep requests within it.",
+            default_help_override="num_ctx",
+        ),
+        ApiAdapterOption(
+            name="repeat_last_n",
+            hr_name="Repeat Last N",
+            description="Sets how far back for the model to look back to prevent repetition.",
+        ),
+        ApiAdapterOption(
+            name="repeat_penalty",
+            hr_name="Repeat Penalty",
+            description="Sets how strongly to penalize repetitions.",
+        ),
+        ApiAdapterOption(
+            name="temperature",
+            hr_name="Temperature",
+            description="The temperature of the model; higher values increase creativity.",
+        ),
+        ApiAdapterOption(
+            name="seed",
+            hr_name="Seed",
+            description="Sets the random number seed to use for generation.",
+        ),
+        ApiAdapterOption(
+            name="num_predict",
+            hr_name="Max Tokens",
+            description="Maximum number of tokens to predict when generating text.",
+        ),
+        ApiAdapterOption(
+            name="top_k",
+            hr_name="Top-K",
+            description=
+              "Reduces the probability of generating nonsense by limiting token selection.",
+        ),
+        ApiAdapterOption(
+            name="top_p",
+            hr_name="Top-P",
+            description=
+              "Controls diversity via nucleus sampling; higher values yield more diverse text.",
+        ),
+        ApiAdapterOption(
+            name="max_retries",
+            hr_name="Max Retries",
+            description="Maximum number of times to retry a request that failed with a " + \
+                "transient error, such as rate limiting or a dropped connection.",
+            default=3,
+        ),
+        *get_image_options("none"),
+    ],
+)
+
+ADAPTER_SPECS = [
+    OPENAI_ADAPTER_SPEC,
+    ANTHROPIC_ADAPTER_SPEC,
+    OLLAMA_ADAPTER_SPEC,
+]
@@ -4,12 +4,20 @@ Contains the `get_args` function, which is used to parse command-line arguments.
 
 import argparse
 from llmcli.adapters import get_adapter_list
+from llmcli.blobs import get_default_blob_dir
+from llmcli.cache import get_default_response_cache_dir
+from llmcli.retrieval import DEFAULT_TOP_K, get_default_index_path
 
 
-def get_args() -> argparse.Namespace:
+def get_args(argv: list[str] | None = None) -> argparse.Namespace:
     """
     Parse command-line arguments.
 
+    Parameters
+    ----------
+    argv : list[str] | None
+        The arguments to parse. Defaults to `sys.argv[1:]`.
+
     Returns
     -------
     argparse.Namespace
@@ -26,20 +34,47 @@ def get_args() -> argparse.Namespace:
     parser.add_argument("-a", "--assistant", action="append")
     parser.add_argument("-u", "--user", action="append")
     parser.add_argument("-f", "--file", action="append")
+    parser.add_argument("--file-max-size", type=float, default=1024)
     parser.add_argument("-i", "--image", action="append")
     parser.add_argument("-c", "--conversation", action="append")
+    parser.add_argument("--conversation-turns", type=int)
+    parser.add_argument("--lazy-attachments", action="store_true")
     parser.add_argument("-d", "--no-system-prompt", action="store_true")
     parser.add_argument(
-        "-p", "--api", choices=[x.NAME for x in get_adapter_list()], default="openai"
+        "-p", "--api", choices=[x.name for x in get_adapter_list()], default="openai"
     )
     parser.add_argument("-o", "--api-options", action="append")
+    parser.add_argument("--compare", action="append")
+    parser.add_argument("--hedge")
+    parser.add_argument("--hedge-delay", type=float, default=2.0)
+
+    # Batch arguments
+    parser.add_argument("--batch")
+    parser.add_argument("--batch-output")
+    parser.add_argument("--batch-concurrency", type=int, default=4)
+    parser.add_argument("--batch-order", choices=["input", "completion"], default="input")
+
+    # Cache arguments
+    parser.add_argument("--cache", nargs="?", const=get_default_response_cache_dir())
+    parser.add_argument("--cache-ttl", type=float, default=7 * 24 * 60 * 60)
+    parser.add_argument("--cache-max-size", type=float, default=100)
+
+    # Retrieval arguments
+    parser.add_argument("--retrieve", action="append")
+    parser.add_argument("--retrieve-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--index-file", default=get_default_index_path())
+
+    # Metrics arguments
+    parser.add_argument("--metrics", action="store_true")
+    parser.add_argument("--metrics-file")
 
     # Other arguments
     parser.add_argument("-n", "--non-interactive", action="store_true")
     parser.add_argument("-j", "--log-file-json")
+    parser.add_argument("-b", "--blob-store", nargs="?", const=get_default_blob_dir())
     parser.add_argument("-g", "--immediate", action="store_true")
     parser.add_argument("-x", "--separator")
     parser.add_argument("-q", "--no-intro", action="store_true")
     parser.add_argument("-h", "--help", action="store_true")
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
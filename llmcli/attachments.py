@@ -0,0 +1,347 @@
+"""
+Expansion of directory and glob file arguments into file attachments.
+
+`-f src/` attaches every file under `src`, and `-f 'src/**/*.py'` every file matching the pattern.
+Files ignored by a `.gitignore` file (in their directory or any parent directory, up to the root of
+the git repository) are left out, as are binary files. Files named explicitly are always attached.
+
+Files are read concurrently. A file selected more than once is only attached once, and a file
+with the same content as an earlier one is attached as a short note referring to it.
+"""
+import fnmatch
+import glob
+import hashlib
+import os
+from concurrent.futures import Executor, Future
+from typing import Iterable
+
+from llmcli.messages.file_message import FileMessage, parse_file_spec
+from llmcli.messages.message import Message
+
+DEFAULT_READ_WORKERS = 8
+
+
+def is_glob(path: str) -> bool:
+    """
+    Check whether a file argument is a glob pattern.
+    """
+    return any(char in path for char in "*?[")
+
+
+class GitIgnore:
+    """
+    Matches paths against the `.gitignore` files of the directories containing them.
+
+    Supports the common subset of the `.gitignore` syntax: wildcards (including `**`), negation
+    (`!`), directory-only patterns (a trailing `/`) and patterns relative to the `.gitignore` file's
+    directory (containing a `/`). The `.git` directory is always ignored.
+    """
+    def __init__(self) -> None:
+        self.rules = {}
+        self.ignored_dirs = {}
+
+    @staticmethod
+    def read_rules(directory: str) -> list[tuple]:
+        """
+        Read the rules of the `.gitignore` file in a directory.
+
+        Parameters
+        ----------
+        directory : str
+            The absolute path of the directory.
+
+        Returns
+        -------
+        list[tuple]
+            The (directory, pattern, negated, directory only, anchored) rules, in file order.
+        """
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8") as file:
+                lines = file.read().splitlines()
+        except (OSError, ValueError):
+            return []
+
+        rules = []
+
+        for line in lines:
+            line = line.rstrip()
+
+            if not line or line.startswith("#"):
+                continue
+
+            negated = line.startswith("!")
+            line = line[1:] if negated else line
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            line = line.lstrip("/")
+
+            if line:
+                rules.append((directory, line, negated, dir_only, anchored))
+
+        return rules
+
+    def get_rules(self, directory: str) -> list[tuple]:
+        """
+        Get the rules that apply to the entries of a directory: those of its own `.gitignore`
+        file and of its parents', up to the root of the git repository.
+
+        Parameters
+        ----------
+        directory : str
+            The absolute path of the directory.
+
+        Returns
+        -------
+        list[tuple]
+            The rules, from the outermost `.gitignore` file to the innermost.
+        """
+        rules = self.rules.get(directory)
+
+        if rules is None:
+            parent = os.path.dirname(directory)
+
+            if parent == directory or os.path.exists(os.path.join(directory, ".git")):
+                rules = self.read_rules(directory)
+            else:
+                rules = self.get_rules(parent) + self.read_rules(directory)
+
+            self.rules[directory] = rules
+
+        return rules
+
+    def is_ignored(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Check whether a file or directory is ignored, either itself or through a parent directory.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file or directory.
+        is_dir : bool
+            Whether the path is a directory.
+
+        Returns
+        -------
+        bool
+            True if the path is ignored.
+        """
+        path = os.path.abspath(path)
+        parent = os.path.dirname(path)
+
+        if is_dir and path in self.ignored_dirs:
+            return self.ignored_dirs[path]
+
+        if os.path.basename(path) == ".git":
+            ignored = True
+        elif parent != path and self.is_ignored(parent, is_dir=True):
+            ignored = True
+        else:
+            ignored = False
+
+            for base, pattern, negated, dir_only, anchored in self.get_rules(parent):
+                if dir_only and not is_dir:
+                    continue
+
+                if anchored:
+                    target = os.path.relpath(path, base).replace(os.sep, "/")
+                else:
+                    target = os.path.basename(path)
+
+                if fnmatch.fnmatchcase(target, pattern) or (
+                    pattern.startswith("**/") and fnmatch.fnmatchcase(target, pattern[3:])
+                ):
+                    ignored = not negated
+
+        if is_dir:
+            self.ignored_dirs[path] = ignored
+
+        return ignored
+
+
+def expand_path(path: str, gitignore: GitIgnore | None = None) -> list[str]:
+    """
+    Expand a directory or glob pattern into the files it contains or matches, leaving out ignored
+    files. Other paths are returned as they are.
+
+    Parameters
+    ----------
+    path : str
+        The path, directory or glob pattern.
+    gitignore : GitIgnore | None
+        The `.gitignore` rules to use, or None to create them.
+
+    Returns
+    -------
+    list[str]
+        The file paths, in sorted order.
+
+    Raises
+    ------
+    ValueError
+        If a glob pattern doesn't match any files.
+    """
+    gitignore = gitignore or GitIgnore()
+
+    if os.path.isdir(path):
+        paths = []
+
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(
+                name for name in dirnames
+                if not gitignore.is_ignored(os.path.join(directory, name), is_dir=True)
+            )
+            paths += [
+                os.path.join(directory, name) for name in sorted(filenames)
+                if not gitignore.is_ignored(os.path.join(directory, name))
+            ]
+
+        return paths
+
+    # an existing file is never a pattern, even if its name contains wildcard characters
+    if not is_glob(path) or os.path.exists(path):
+        return [path]
+
+    paths = [
+        match for match in sorted(glob.glob(os.path.expanduser(path), recursive=True))
+        if os.path.isfile(match) and not gitignore.is_ignored(match)
+    ]
+
+    if not paths:
+        raise ValueError(f"No files match {path}")
+
+    return paths
+
+
+def load_file_message(
+    path: str,
+    file_range: str | None,
+    max_size: int | None,
+    skip_binary: bool = False,
+) -> FileMessage | None:
+    """
+    Create a message containing a file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+    file_range : str | None
+        The part of the file to attach (see `parse_file_spec`), or None for the whole file.
+    max_size : int | None
+        The maximum number of bytes of the file to attach, or None for no limit.
+    skip_binary : bool
+        Whether to return None for a binary file, instead of raising an error.
+
+    Returns
+    -------
+    FileMessage | None
+        The message, or None if the file is skipped.
+    """
+    try:
+        return FileMessage(role="user", file_path=path, file_range=file_range, max_size=max_size)
+    except ValueError:
+        if skip_binary:
+            return None
+
+        raise
+
+
+def submit_file_messages(
+    executor: Executor,
+    spec: str,
+    max_size: int | None,
+    gitignore: GitIgnore | None = None,
+) -> list[Future]:
+    """
+    Start reading the files selected by a file argument on a thread pool.
+
+    Parameters
+    ----------
+    executor : Executor
+        The thread pool.
+    spec : str
+        The file argument: a path, directory or glob pattern, optionally followed by a range (see
+        `parse_file_spec`), which applies to each file.
+    max_size : int | None
+        The maximum number of bytes of each file to attach, or None for no limit.
+    gitignore : GitIgnore | None
+        The `.gitignore` rules to use, or None to create them.
+
+    Returns
+    -------
+    list[Future]
+        The futures of the file messages (see `load_file_message`), in sorted path order.
+    """
+    path, file_range = parse_file_spec(spec)
+    paths = expand_path(path, gitignore)
+    # binary files are only skipped if they weren't named explicitly
+    expanded = paths != [path]
+
+    return [
+        executor.submit(load_file_message, file_path, file_range, max_size, expanded)
+        for file_path in paths
+    ]
+
+
+def get_path_key(message: FileMessage) -> tuple:
+    """
+    Get a key identifying the part of a file attached by a file message: its resolved path and
+    range.
+    """
+    return os.path.realpath(message.file_path), message.file_range
+
+
+def get_content_key(message: FileMessage) -> str:
+    """
+    Get a key identifying the content of a file message: its blob digest, or the hash of its
+    content.
+    """
+    if message.file_blob is not None:
+        return message.file_blob
+
+    return hashlib.sha256((message.file_content or "").encode("utf-8")).hexdigest()
+
+
+def resolve_file_messages(items: Iterable) -> list:
+    """
+    Wait for the file messages started by `submit_file_messages`, in order. Skipped files, and
+    files that were already attached, are left out. Files with the same (non-empty) content as an
+    earlier one are replaced with a note naming it. Other messages are kept as they are.
+
+    Parameters
+    ----------
+    items : Iterable[Message | Future]
+        Messages, and futures of file messages.
+
+    Returns
+    -------
+    list[Message]
+        The messages.
+    """
+    seen_paths = set()
+    seen_contents = {}
+    messages = []
+
+    for item in items:
+        if isinstance(item, Future):
+            item = item.result()
+
+            if item is None or get_path_key(item) in seen_paths:
+                continue
+
+            seen_paths.add(get_path_key(item))
+
+            if item.file_content:
+                original = seen_contents.setdefault(get_content_key(item), item)
+
+                if original is not item:
+                    item = Message(
+                        role="user",
+                        content=f"### FILE: {item.file_label} (same content as "
+                        f"{original.file_label})",
+                    )
+
+        messages.append(item)
+
+    return messages
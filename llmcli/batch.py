@@ -0,0 +1,175 @@
+"""
+Functions for running many completions concurrently in batch mode.
+
+Batch input is JSONL, one conversation per line. Each line is one of:
+
+- `{"prompt": "..."}`: a single user message.
+- `{"messages": [...]}`: a list of messages, in the same format as a JSON log.
+- `[...]`: a list of messages, without a wrapping object.
+
+Objects may also contain an `id`, which is copied to the corresponding output record.
+"""
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Tuple
+
+from llmcli.messages import message_from_dict
+from llmcli.messages.message import Message
+
+CompletionFunction = Callable[[list[Message]], Tuple[Iterable[str] | None, Message]]
+
+
+def get_batch_metadata(line: str) -> dict:
+    """
+    Get the fields of a line of batch input to copy to its output record, even if the line isn't a
+    valid batch item.
+    """
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return {}
+
+    return {"id": item["id"]} if isinstance(item, dict) and "id" in item else {}
+
+
+def parse_batch_line(line: str) -> Tuple[list[Message], dict]:
+    """
+    Parse a line of batch input.
+
+    Parameters
+    ----------
+    line : str
+        A line of batch input.
+
+    Returns
+    -------
+    messages : list[Message]
+        The conversation to complete.
+    metadata : dict
+        Fields to copy to the output record.
+
+    Raises
+    ------
+    ValueError
+        If the line is not a valid batch item.
+    """
+    item = json.loads(line)
+
+    if isinstance(item, list):
+        return [message_from_dict(message) for message in item], {}
+
+    if not isinstance(item, dict):
+        raise ValueError("Batch items must be JSON objects or arrays")
+
+    metadata = {"id": item["id"]} if "id" in item else {}
+
+    if "messages" in item:
+        return [message_from_dict(message) for message in item["messages"]], metadata
+
+    if "prompt" in item:
+        return [Message(role="user", content=item["prompt"])], metadata
+
+    raise ValueError("Batch items must contain 'messages' or 'prompt'")
+
+
+def complete(get_completion: CompletionFunction, messages: list[Message]) -> Message:
+    """
+    Get a completion and consume its stream.
+
+    Parameters
+    ----------
+    get_completion : CompletionFunction
+        The function used to get the completion, e.g. `BaseApiAdapter.get_completion`.
+    messages : list[Message]
+        The conversation to complete.
+
+    Returns
+    -------
+    Message
+        The fully populated response message.
+    """
+    stream, message = get_completion(messages)
+
+    if stream is not None:
+        for _ in stream:
+            pass
+
+    return message
+
+
+def run_batch(
+    get_completion: CompletionFunction,
+    items: Iterable[Tuple[list[Message] | Exception, dict]],
+    concurrency: int = 4,
+    ordered: bool = True,
+) -> Iterator[dict]:
+    """
+    Run completions for a batch of conversations on a thread pool.
+
+    At most `concurrency` completions run at once, and at most twice that many items are read
+    ahead of the output, so arbitrarily large batches can be streamed.
+
+    Parameters
+    ----------
+    get_completion : CompletionFunction
+        The function used to get each completion. Must be safe to call from multiple threads.
+    items : Iterable[Tuple[list[Message] | Exception, dict]]
+        Conversations and output metadata, as returned by `parse_batch_line`. An exception in
+        place of a conversation produces an error record.
+    concurrency : int
+        The maximum number of concurrent completions.
+    ordered : bool
+        If True, output records are yielded in input order; otherwise in completion order.
+
+    Yields
+    ------
+    dict
+        An output record for each item, containing its `index`, any metadata, and either the
+        response `message` or an `error`.
+    """
+    window = max(1, concurrency) * 2
+    items_iter = enumerate(items)
+    pending = {}
+    finished = {}
+    next_index = 0
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        while True:
+            while not exhausted and len(pending) + len(finished) < window:
+                index, (messages, metadata) = next(items_iter, (None, (None, None)))
+
+                if index is None:
+                    exhausted = True
+                elif isinstance(messages, Exception):
+                    finished[index] = {"index": index, **metadata, "error": str(messages)}
+                else:
+                    future = executor.submit(complete, get_completion, messages)
+                    pending[future] = (index, metadata)
+
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            else:
+                done = []
+
+            for future in done:
+                index, metadata = pending.pop(future)
+                record = {"index": index, **metadata}
+
+                try:
+                    record["message"] = future.result().to_dict()
+                except Exception as ex: # pylint: disable=broad-exception-caught
+                    record["error"] = str(ex)
+
+                finished[index] = record
+
+            if ordered:
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+            else:
+                for index in sorted(finished):
+                    yield finished.pop(index)
+
+            if exhausted and not pending:
+                break
@@ -0,0 +1,149 @@
+"""
+A content-addressed store for attachment data.
+
+When a blob store is enabled, image and file attachments are written to it once, keyed by the
+SHA-256 hash of their contents. Messages (and therefore logs) then only hold the hash, and load the
+data from the store when it is needed.
+"""
+import hashlib
+import os
+
+from llmcli.util import get_cache_dir, write_file_atomic
+
+
+def get_default_blob_dir() -> str:
+    """
+    Get the default blob store directory.
+
+    Returns
+    -------
+    str
+        The `blobs` directory in the llmcli cache directory.
+    """
+    return get_cache_dir("blobs")
+
+
+class BlobStore:
+    """
+    A directory of blobs, each stored in a file named after the SHA-256 hash of its contents.
+
+    Parameters
+    ----------
+    root : str
+        The directory containing the blobs. Created on first write.
+    """
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        """
+        Get the path of the file containing a blob.
+
+        Parameters
+        ----------
+        digest : str
+            The SHA-256 hex digest of the blob.
+
+        Returns
+        -------
+        str
+            The path of the blob file.
+        """
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, data: bytes) -> str:
+        """
+        Add a blob to the store. Storing data that is already present is a no-op.
+
+        Parameters
+        ----------
+        data : bytes
+            The blob contents.
+
+        Returns
+        -------
+        str
+            The SHA-256 hex digest of the blob.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+
+        if os.path.exists(path):
+            return digest
+
+        write_file_atomic(path, data)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """
+        Read a blob from the store.
+
+        Parameters
+        ----------
+        digest : str
+            The SHA-256 hex digest of the blob.
+
+        Returns
+        -------
+        bytes
+            The blob contents.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the blob is not in the store.
+        """
+        with open(self.path(digest), "rb") as file:
+            return file.read()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(root={repr(self.root)})"
+
+
+BLOB_STORE = None
+
+
+def get_blob_store() -> BlobStore | None:
+    """
+    Get the blob store new attachments are written to.
+
+    Returns
+    -------
+    BlobStore | None
+        The enabled blob store, or None if attachments should be kept inline.
+    """
+    return BLOB_STORE
+
+
+def set_blob_store(store: BlobStore | None) -> None:
+    """
+    Enable or disable the blob store for new attachments.
+
+    Parameters
+    ----------
+    store : BlobStore | None
+        The blob store to use, or None to keep attachments inline.
+    """
+    global BLOB_STORE # pylint: disable=global-statement
+    BLOB_STORE = store
+
+
+def read_blob(digest: str) -> bytes:
+    """
+    Read a blob from the enabled blob store, falling back to the default blob store directory. This
+    allows logs referencing blobs to be loaded without enabling the blob store.
+
+    Parameters
+    ----------
+    digest : str
+        The SHA-256 hex digest of the blob.
+
+    Returns
+    -------
+    bytes
+        The blob contents.
+    """
+    return (BLOB_STORE or BlobStore(get_default_blob_dir())).get(digest)
@@ -0,0 +1,280 @@
+"""
+An on-disk cache of API responses.
+
+Responses are keyed by a fingerprint of the request: the adapter name, its masked configuration
+(see `BaseApiAdapter.get_masked_config()`), and the role, content and attachments of the input
+messages. On a hit, the stored response is replayed as a stream, without calling the API.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Iterable, Iterator, Tuple
+
+from llmcli.adapters.base import BaseApiAdapter, finalize_content
+from llmcli.messages import message_from_dict
+from llmcli.messages.message import Message
+from llmcli.util import get_cache_dir, write_file_atomic
+
+# message metadata that isn't sent to the API, and changes between runs (e.g. response metrics)
+VOLATILE_MESSAGE_KEYS = ("display_name", "adapter", "adapter_options", "extra", "pinned")
+
+
+def get_default_response_cache_dir() -> str:
+    """
+    Get the default response cache directory.
+
+    Returns
+    -------
+    str
+        The `responses` directory in the llmcli cache directory.
+    """
+    return get_cache_dir("responses")
+
+
+class ResponseCache:
+    """
+    A directory of cached responses, one JSON file per request fingerprint.
+
+    Parameters
+    ----------
+    directory : str
+        The cache directory. Created on first write.
+    ttl : float | None
+        Number of seconds after which an entry expires, or None for no expiry.
+    max_size : int | None
+        Maximum total size of the cache in bytes, or None for no limit. When exceeded, the least
+        recently used entries are evicted.
+    """
+    def __init__(
+        self,
+        directory: str,
+        ttl: float | None = None,
+        max_size: int | None = None,
+    ) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @staticmethod
+    def get_key(adapter: BaseApiAdapter, input_messages: list[Message]) -> str:
+        """
+        Get the fingerprint of a request.
+
+        Parameters
+        ----------
+        adapter : BaseApiAdapter
+            The adapter the request is sent with.
+        input_messages : list[Message]
+            The messages sent in the request.
+
+        Returns
+        -------
+        str
+            The SHA-256 hex digest of the request.
+        """
+        request = json.dumps(
+            {
+                "adapter": adapter.NAME,
+                "config": adapter.get_masked_config(),
+                "messages": [
+                    {
+                        key: value for key, value in message.to_dict().items()
+                        if key not in VOLATILE_MESSAGE_KEYS
+                    }
+                    for message in input_messages
+                ],
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        """
+        Get the path of a cache entry.
+        """
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> dict | None:
+        """
+        Load a cache entry, if it exists and hasn't expired. Marks the entry as recently used.
+
+        Parameters
+        ----------
+        key : str
+            The request fingerprint.
+
+        Returns
+        -------
+        dict | None
+            The cache entry, or None on a miss.
+        """
+        path = self.path(key)
+
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+            self.remove(path)
+            return None
+
+        # the modification time tracks last use, for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return entry
+
+    def store(self, key: str, fragments: list[str], message: Message) -> None:
+        """
+        Store a response, then evict entries to keep the cache within its limits.
+
+        Parameters
+        ----------
+        key : str
+            The request fingerprint.
+        fragments : list[str]
+            The response stream fragments.
+        message : Message
+            The complete response message.
+        """
+        entry = {"created": time.time(), "fragments": fragments, "message": message.to_dict()}
+        write_file_atomic(self.path(key), json.dumps(entry).encode("utf-8"))
+        self.evict()
+
+    @staticmethod
+    def remove(path: str) -> None:
+        """
+        Remove a cache entry, ignoring entries that were already removed.
+        """
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> None:
+        """
+        Remove expired entries, then remove least recently used entries until the cache is within
+        its size limit.
+        """
+        try:
+            entries = [
+                entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(".json")
+            ]
+        except FileNotFoundError:
+            return
+
+        stats = []
+
+        for entry in entries:
+            try:
+                stats.append((entry.path, entry.stat()))
+            except FileNotFoundError:
+                continue
+
+        if self.ttl is not None:
+            # the modification time is the time of last use, which is never before creation, so
+            # this only catches some expired entries; load() checks the creation time
+            now = time.time()
+            expired = [(path, stat) for path, stat in stats if now - stat.st_mtime > self.ttl]
+
+            for path, _ in expired:
+                self.remove(path)
+
+            stats = [item for item in stats if item not in expired]
+
+        if self.max_size is None:
+            return
+
+        total = sum(stat.st_size for _, stat in stats)
+
+        for path, stat in sorted(stats, key=lambda item: item[1].st_mtime):
+            if total <= self.max_size:
+                break
+
+            self.remove(path)
+            total -= stat.st_size
+
+    @staticmethod
+    def replay(fragments: list[str], response_message: Message) -> Iterator[str]:
+        """
+        Replay a cached response stream.
+        """
+        replayed = []
+
+        try:
+            for fragment in fragments:
+                replayed.append(fragment)
+                yield fragment
+        finally:
+            finalize_content(response_message, replayed)
+
+    def record(
+        self,
+        key: str,
+        response_stream: Iterable[str],
+        response_message: Message,
+    ) -> Iterator[str]:
+        """
+        Pass a response stream through, and store it once it has been fully consumed.
+        """
+        fragments = []
+
+        for fragment in response_stream:
+            fragments.append(fragment)
+            yield fragment
+
+        self.store(key, fragments, response_message)
+
+    def get_completion(
+        self,
+        adapter: BaseApiAdapter,
+        input_messages: list[Message],
+    ) -> Tuple[Iterable[str] | None, Message]:
+        """
+        Get a completion from the cache, or from the adapter on a miss.
+
+        Parameters
+        ----------
+        adapter : BaseApiAdapter
+            The adapter to use on a miss.
+        input_messages : list[Message]
+            The messages to use as input.
+
+        Returns
+        -------
+        stream : Iterable[str] | None
+            Text output stream.
+        message : Message
+            The Message object with metadata. Cached responses have `extra["cache_hit"]` set.
+
+        Notes
+        -----
+        The `content` field of the returned Message object should not be considered fully
+        populated until the Iterable is fully consumed.
+        """
+        key = self.get_key(adapter, input_messages)
+        entry = self.load(key)
+
+        if entry is not None:
+            response_message = message_from_dict({**entry["message"], "content": ""})
+            # the metrics of the original request don't apply to a replay
+            response_message.extra = {
+                **{k: v for k, v in (response_message.extra or {}).items() if k != "metrics"},
+                "cache_hit": True,
+            }
+            return self.replay(entry["fragments"], response_message), response_message
+
+        response_stream, response_message = adapter.get_completion(input_messages)
+
+        if response_stream is None:
+            return response_stream, response_message
+
+        return self.record(key, response_stream, response_message), response_message
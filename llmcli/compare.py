@@ -0,0 +1,162 @@
+"""
+Functions for sending the same conversation to several adapters at once, and showing each response
+in its own labeled section.
+
+Each response is streamed in a background thread, so the wall time of a comparison is that of the
+slowest model rather than the sum of all of them. Responses are shown one section at a time, so
+they don't interleave: while one section is being shown, the others are buffered, and the next
+section shown is the first response to finish (or, if none has, the next one in order).
+"""
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, TextIO, Tuple
+
+from llmcli.messages.message import Message
+from llmcli.metrics import format_metrics
+from llmcli.render import render_stream
+
+CompletionFunction = Callable[[], Tuple[Iterable[str] | None, Message]]
+
+_DONE = object()
+
+
+class ComparisonStream:
+    """
+    A response stream consumed in a background thread, with its fragments buffered until they are
+    shown.
+
+    Parameters
+    ----------
+    label : str
+        The label of the section the response is shown in.
+    get_completion : CompletionFunction
+        Starts the completion, returning the response stream and message.
+    """
+    def __init__(self, label: str, get_completion: CompletionFunction) -> None:
+        self.label = label
+        self.get_completion = get_completion
+        self.message = None
+        self.error = None
+        self.finished_at = None
+        self.fragments = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        """
+        Start the completion in a background thread.
+        """
+        self.thread.start()
+
+    def run(self) -> None:
+        """
+        Get the completion, and buffer its fragments.
+        """
+        try:
+            stream, self.message = self.get_completion()
+
+            if stream is None:
+                self.fragments.put(self.message.content or "")
+            else:
+                for fragment in stream:
+                    self.fragments.put(fragment)
+        except Exception as ex: # pylint: disable=broad-exception-caught
+            self.error = ex
+        finally:
+            self.finished_at = time.monotonic()
+            self.fragments.put(_DONE)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Yield the fragments of the response as they arrive, until it is complete.
+        """
+        while True:
+            fragment = self.fragments.get()
+
+            if fragment is _DONE:
+                return
+
+            yield fragment
+
+
+def get_next_stream(streams: list[ComparisonStream]) -> ComparisonStream:
+    """
+    Choose the next response to show: the first one to finish, or the first one in order if none
+    has finished yet.
+    """
+    finished = [stream for stream in streams if stream.finished_at is not None]
+
+    if finished:
+        return min(finished, key=lambda stream: stream.finished_at)
+
+    return streams[0]
+
+
+def render_comparison(
+    streams: list[ComparisonStream],
+    output: TextIO | None = None,
+    separator: str = "\n",
+) -> None:
+    """
+    Run the completions concurrently, and show each response in its own labeled section as it
+    arrives.
+
+    Parameters
+    ----------
+    streams : list[ComparisonStream]
+        The completions to compare.
+    output : TextIO | None
+        The stream to write to. Defaults to `sys.stdout`.
+    separator : str
+        Written after each section.
+    """
+    output = output or sys.stdout
+    pending = list(streams)
+
+    for stream in streams:
+        stream.start()
+
+    while pending:
+        stream = get_next_stream(pending)
+        pending.remove(stream)
+
+        output.write(f"{stream.label}:\n\n")
+        output.flush()
+        render_stream(stream, output)
+        stream.thread.join()
+
+        if stream.error is not None:
+            output.write(f"\nUnable to get completion: {stream.error}\n")
+
+        output.write("\n" + separator + "\n")
+        output.flush()
+
+
+def format_comparison(streams: list[ComparisonStream]) -> str:
+    """
+    Format the latency and token metrics of each response, one line per response.
+
+    Parameters
+    ----------
+    streams : list[ComparisonStream]
+        The completed comparison.
+
+    Returns
+    -------
+    str
+        The summary.
+    """
+    width = max(len(stream.label) for stream in streams)
+    lines = []
+
+    for stream in streams:
+        if stream.error is not None:
+            summary = f"error: {stream.error}"
+        else:
+            metrics = ((stream.message and stream.message.extra) or {}).get("metrics")
+            summary = format_metrics(metrics) if metrics is not None else "no metrics"
+
+        lines.append(f"{stream.label: <{width}}  {summary}")
+
+    return "\n".join(lines)
@@ -0,0 +1,549 @@
+"""
+Functions and classes for reading and writing conversation logs.
+
+Two log formats are supported:
+
+- JSON: the whole conversation as a single JSON array, rewritten after every turn.
+- JSONL: one record per line, appended as the conversation grows. Each record is either a complete
+  message, or a streaming checkpoint record (`stream_start` or `stream_delta`) written while an
+  assistant response is being streamed. Checkpoint records are superseded by the next complete
+  message, so they only matter if the process exits before the response finishes; in that case the
+  partial response is recovered when the log is loaded.
+
+Log files are parsed as a stream, so loading only the last turns of a long conversation doesn't
+hold the rest of it in memory. The attachments of a JSONL log can also be left in the log, and read
+from it when they are needed.
+"""
+import codecs
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from typing import IO, Iterable, Iterator, Tuple
+
+from llmcli.messages import message_from_dict
+from llmcli.messages.message import Message
+
+STREAM_START = "stream_start"
+STREAM_DELTA = "stream_delta"
+READ_CHUNK_SIZE = 64 * 1024
+# attachment payloads that can be left in a JSONL log, and the message arguments loading them
+PAYLOAD_LOADERS = {"file_content": "file_loader", "image_content": "image_loader"}
+
+
+def is_jsonl_path(path: str | None) -> bool:
+    """
+    Check whether a log file path should use the append-only JSONL format.
+
+    Parameters
+    ----------
+    path : str | None
+        The path to the log file.
+
+    Returns
+    -------
+    bool
+        True if the path has a `.jsonl` extension.
+    """
+    return path is not None and path.lower().endswith(".jsonl")
+
+
+class LogFile:
+    """
+    A log file kept open, so records can be read from it later, even after the log is replaced by
+    a rewrite.
+
+    Parameters
+    ----------
+    path : str
+        The path to the log file.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "rb") # pylint: disable=consider-using-with
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Read part of the log file.
+        """
+        return os.pread(self.file.fileno(), length, offset)
+
+    def close(self) -> None:
+        """
+        Close the log file.
+        """
+        self.file.close()
+
+
+class LogPayload:
+    """
+    Loads an attachment payload from a record of a JSONL log when it is needed.
+
+    Parameters
+    ----------
+    log_file : LogFile
+        The log file.
+    offset : int
+        The offset of the record.
+    length : int
+        The length of the record.
+    key : str
+        The key of the payload in the record.
+    """
+    def __init__(self, log_file: LogFile, offset: int, length: int, key: str) -> None:
+        self.log_file = log_file
+        self.offset = offset
+        self.length = length
+        self.key = key
+
+    def __call__(self) -> str:
+        return json.loads(self.log_file.read(self.offset, self.length))[self.key]
+
+
+class PreservedRecords:
+    """
+    The records of a JSONL log that weren't loaded, because only its last turns were. They are
+    written back first whenever the log is rewritten, so no history is lost.
+
+    The system records before the loaded turns are preserved too, so they stay in their place in
+    the log; the messages loaded from them are copies, which aren't written again.
+
+    Parameters
+    ----------
+    log_file : LogFile
+        The log file.
+    spans : list[Tuple[int, int]]
+        The (offset, length) of each record, in log order.
+    copies : list[Message] | None
+        The loaded messages that are copies of preserved records.
+    """
+    def __init__(
+        self,
+        log_file: LogFile,
+        spans: list[Tuple[int, int]],
+        copies: list[Message] | None = None,
+    ) -> None:
+        self.log_file = log_file
+        self.spans = spans
+        self.copies = copies or []
+
+    def read(self) -> Iterator[bytes]:
+        """
+        Read the records.
+        """
+        for offset, length in self.spans:
+            yield self.log_file.read(offset, length)
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse the elements of a JSON array as they are read.
+
+    Parameters
+    ----------
+    chunks : Iterable[str]
+        The JSON text, in chunks of any size.
+
+    Yields
+    ------
+    dict
+        The elements of the array.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+
+    while True:
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] in "[,"):
+            position += 1
+
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        if position < len(buffer):
+            try:
+                element, position = decoder.raw_decode(buffer, position)
+                yield element
+                continue
+            except json.JSONDecodeError:
+                pass
+
+        chunk = next(chunks, None)
+
+        if chunk is None:
+            if position < len(buffer):
+                # raise the decoding error
+                decoder.raw_decode(buffer, position)
+
+            return
+
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def read_chunks(file: IO[bytes]) -> Iterator[str]:
+    """
+    Read a file in chunks, decoding it as UTF-8. The chunks grow as the file is read, so that an
+    element spanning many chunks is only parsed again a few times.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    size = READ_CHUNK_SIZE
+
+    while True:
+        data = file.read(size)
+
+        if not data:
+            yield decoder.decode(b"", final=True)
+            return
+
+        yield decoder.decode(data)
+        size = min(size * 2, 64 * 1024 * 1024)
+
+
+def iter_jsonl_records(
+    lines: Iterable[bytes | str],
+    log_file: LogFile | None = None,
+    lazy: bool = False,
+) -> Iterator[Tuple[dict, Tuple[int, int] | None]]:
+    """
+    Parse the records of a JSONL log.
+
+    Parameters
+    ----------
+    lines : Iterable[bytes | str]
+        The lines of the log.
+    log_file : LogFile | None
+        The log file the lines are read from, if their offsets should be tracked.
+    lazy : bool
+        Whether to leave attachment payloads in the log file, replacing them with loaders reading
+        them from it when they are needed.
+
+    Yields
+    ------
+    record : dict
+        The record.
+    span : Tuple[int, int] | None
+        The offset and length of the record in the log file, if it is read from one.
+    """
+    offset = 0
+
+    for line in lines:
+        span = (offset, len(line)) if log_file is not None else None
+        offset += len(line)
+
+        if line.strip() == "":
+            continue
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # a crash can leave a truncated final line behind
+            continue
+
+        if lazy and log_file is not None and "event" not in record:
+            for key, loader_key in PAYLOAD_LOADERS.items():
+                if record.pop(key, None) is not None:
+                    record[loader_key] = LogPayload(log_file, *span, key)
+
+        yield record, span
+
+
+def collect_messages(
+    records: Iterable[Tuple[dict, Tuple[int, int] | None]],
+    last_turns: int | None = None,
+) -> Tuple[list[Message], list[Tuple[int, int]], int]:
+    """
+    Turn log records into messages, keeping only the last turns of the conversation if requested.
+
+    A turn starts with a user message following an assistant message. System messages are always
+    kept: those before the kept turns are moved to the front.
+
+    Parameters
+    ----------
+    records : Iterable[Tuple[dict, Tuple[int, int] | None]]
+        The records, and their spans in the log file (see `iter_jsonl_records`).
+    last_turns : int | None
+        The number of turns to keep, or None to keep all messages.
+
+    Returns
+    -------
+    messages : list[Message]
+        The messages. A response that was still streaming when the log was last written is
+        included, with `extra["partial"]` set.
+    dropped : list[Tuple[int, int]]
+        The spans of the records of the messages that weren't kept, in log order. If any messages
+        were dropped, the spans of the system records before the kept turns are included.
+    copied : int
+        The number of leading messages whose records are included in `dropped`.
+    """
+    system = []
+    turns = deque()
+    dropped = []
+    last_role = None
+
+    def add(record, span):
+        nonlocal last_role
+        role = record.get("role")
+
+        if role == "system" and not turns:
+            system.append((record, span))
+            return
+
+        if not turns or (role == "user" and last_role == "assistant"):
+            turns.append([])
+
+            if last_turns is not None and len(turns) > last_turns:
+                for old_record, old_span in turns.popleft():
+                    if old_record.get("role") == "system":
+                        system.append((old_record, old_span))
+                    elif old_span is not None:
+                        dropped.append(old_span)
+
+        turns[-1].append((record, span))
+
+        if role != "system":
+            last_role = role
+
+    pending = None
+
+    for record, span in records:
+        event = record.get("event")
+
+        if event == STREAM_START:
+            pending = record.get("message", {})
+            pending["content"] = ""
+        elif event == STREAM_DELTA:
+            if pending is not None:
+                pending["content"] += record.get("content", "")
+        else:
+            pending = None
+            add(record, span)
+
+    if pending is not None:
+        pending["extra"] = {**(pending.get("extra") or {}), "partial": True}
+        add(pending, None)
+
+    copied = 0
+
+    if dropped:
+        # the system records stay in their place in the log
+        dropped = sorted(dropped + [span for _, span in system if span is not None])
+        copied = len(system)
+
+    records = [record for record, _ in system] + [record for turn in turns for record, _ in turn]
+    return [message_from_dict(record) for record in records], dropped, copied
+
+
+def load_conversation(content: str, last_turns: int | None = None) -> list[Message]:
+    """
+    Load a conversation from a JSON or JSONL log.
+
+    Parameters
+    ----------
+    content : str
+        The contents of the log.
+    last_turns : int | None
+        The number of turns to load (see `collect_messages`), or None to load all of them.
+
+    Returns
+    -------
+    list[Message]
+        The messages in the conversation. A response that was still streaming when the log was
+        last written is included, with `extra["partial"]` set.
+    """
+    if content.lstrip().startswith("["):
+        records = ((record, None) for record in iter_json_array([content]))
+    else:
+        records = iter_jsonl_records(content.splitlines())
+
+    return collect_messages(records, last_turns)[0]
+
+
+def load_conversation_file(
+    path: str,
+    last_turns: int | None = None,
+    lazy: bool = False,
+) -> Tuple[list[Message], PreservedRecords | None]:
+    """
+    Load a conversation from a JSON or JSONL log file, parsing it as it is read.
+
+    Parameters
+    ----------
+    path : str
+        The path to the log file.
+    last_turns : int | None
+        The number of turns to load (see `collect_messages`), or None to load all of them.
+    lazy : bool
+        Whether to leave the attachments of a JSONL log in the log, and only read them when they
+        are needed. The log file is kept open.
+
+    Returns
+    -------
+    messages : list[Message]
+        The messages in the conversation.
+    preserved : PreservedRecords | None
+        The records of a JSONL log that weren't loaded, or None if all of them were.
+    """
+    with open(path, "rb") as file:
+        is_array = file.read(READ_CHUNK_SIZE).lstrip().startswith(b"[")
+        file.seek(0)
+
+        if is_array:
+            records = ((record, None) for record in iter_json_array(read_chunks(file)))
+            return collect_messages(records, last_turns)[0], None
+
+        log_file = LogFile(path) if lazy or last_turns is not None else None
+        messages, dropped, copied = collect_messages(
+            iter_jsonl_records(file, log_file, lazy), last_turns
+        )
+
+    if log_file is not None and not lazy and not dropped:
+        log_file.close()
+
+    if not dropped:
+        return messages, None
+
+    return messages, PreservedRecords(log_file, dropped, messages[:copied])
+
+
+class JsonlLogWriter:
+    """
+    Writes a conversation to an append-only JSONL log.
+
+    The first write in a session rewrites the whole file, so the log always matches the
+    conversation in memory (e.g. after loading it with `-c`). Later writes only append the messages
+    added since the previous write. Rewrites replace the file, rather than overwriting it, so
+    attachments can still be read from the previous version (see `LogPayload`).
+
+    Parameters
+    ----------
+    path : str
+        The path to the log file.
+    checkpoint_interval : float
+        Maximum number of seconds between streaming checkpoints.
+    checkpoint_size : int
+        Maximum number of characters buffered between streaming checkpoints.
+    preserved : PreservedRecords | None
+        Records of the log that weren't loaded, written before the conversation on a rewrite.
+    """
+    def __init__(
+        self,
+        path: str,
+        checkpoint_interval: float = 0.5,
+        checkpoint_size: int = 4096,
+        preserved: PreservedRecords | None = None,
+    ) -> None:
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_size = checkpoint_size
+        self.preserved = preserved
+        self.written_count = None
+
+    @staticmethod
+    def encode_record(record: dict) -> str:
+        """
+        Encode a record as a single line of JSON.
+        """
+        return json.dumps(record) + "\n"
+
+    def write(self, messages: list[Message]) -> None:
+        """
+        Write any messages that are not yet in the log.
+
+        Parameters
+        ----------
+        messages : list[Message]
+            The full conversation.
+        """
+        if self.written_count is None or self.written_count > len(messages):
+            self.rewrite(messages)
+        else:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.writelines(
+                    self.encode_record(message.to_dict())
+                    for message in messages[self.written_count:]
+                )
+
+        self.written_count = len(messages)
+
+    def rewrite(self, messages: list[Message]) -> None:
+        """
+        Replace the log with the preserved records, if any, and the conversation (leaving out the
+        messages that are copies of preserved records).
+
+        Parameters
+        ----------
+        messages : list[Message]
+            The full conversation.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".")
+
+        try:
+            with os.fdopen(fd, "wb") as file:
+                copies = []
+
+                if self.preserved is not None:
+                    file.writelines(self.preserved.read())
+                    copies = [id(message) for message in self.preserved.copies]
+
+                file.writelines(
+                    self.encode_record(message.to_dict()).encode("utf-8")
+                    for message in messages if id(message) not in copies
+                )
+
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def checkpoint_stream(self, stream: Iterable[str], message: Message) -> Iterable[str]:
+        """
+        Pass a response stream through, checkpointing its content to the log as it arrives.
+
+        Parameters
+        ----------
+        stream : Iterable[str]
+            The response stream.
+        message : Message
+            The response message; its metadata is recorded at the start of the stream.
+
+        Yields
+        ------
+        str
+            Fragments from `stream`, unchanged.
+        """
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(
+                self.encode_record({"event": STREAM_START, "message": message.to_dict()})
+            )
+            file.flush()
+
+            buffer = []
+            buffered = 0
+            last_checkpoint = time.monotonic()
+
+            def checkpoint():
+                file.write(self.encode_record({"event": STREAM_DELTA, "content": "".join(buffer)}))
+                file.flush()
+                buffer.clear()
+
+            try:
+                for fragment in stream:
+                    buffer.append(fragment)
+                    buffered += len(fragment)
+                    now = time.monotonic()
+
+                    if (
+                        buffered >= self.checkpoint_size
+                        or now - last_checkpoint >= self.checkpoint_interval
+                    ):
+                        checkpoint()
+                        buffered = 0
+                        last_checkpoint = now
+
+                    yield fragment
+            finally:
+                if buffer:
+                    checkpoint()
@@ -0,0 +1,325 @@
+"""
+A resident llmcli process, and the client that forwards non-interactive requests to it.
+
+Every llmcli invocation imports the provider SDKs and opens new HTTP connections. `llmcli serve`
+keeps a process running behind a Unix socket, with the SDKs imported and adapters (and their
+connection pools) warm. When the socket exists, non-interactive invocations (`-n`) send their
+arguments, working directory and, if needed, stdin to the daemon, which runs them and streams
+their output back. If the daemon can't be reached, the request runs locally as usual.
+
+The protocol is newline-delimited JSON. The client sends a single request,
+`{"argv": [...], "cwd": "...", "stdin": "..." | null}`. The daemon replies with any number of
+`{"stdout": "..."}` and `{"stderr": "..."}` frames, followed by `{"exit": <status>}`.
+
+The daemon changes its working directory and standard streams for each request, so requests are
+run one at a time; other clients wait for their turn, so parallel clients don't complete any faster
+than they would in sequence (use `--batch` for concurrent completions). The daemon uses its own
+environment (e.g. API keys and base URLs), not the client's.
+
+This module is imported by the `llmcli` entry point on every invocation, so it must only import
+lightweight modules at the top level.
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from contextlib import redirect_stderr, redirect_stdout
+
+from llmcli.util import get_cache_dir
+
+
+def get_default_socket_path() -> str:
+    """
+    Get the path of the daemon's socket.
+
+    Returns
+    -------
+    str
+        The LLMCLI_SOCKET environment variable, or `daemon.sock` in the llmcli cache directory.
+    """
+    return os.environ.get("LLMCLI_SOCKET") or get_cache_dir("daemon.sock")
+
+
+def should_forward(argv: list[str]) -> bool:
+    """
+    Check whether an invocation can be forwarded to the daemon: only non-interactive ones can.
+    """
+    return "-n" in argv or "--non-interactive" in argv
+
+
+def reads_stdin(argv: list[str]) -> bool:
+    """
+    Check whether an invocation reads from stdin (`@-` or `--batch -`), which then has to be sent
+    to the daemon.
+    """
+    if "@-" in argv or "--batch=-" in argv:
+        return True
+
+    return any(arg == "--batch" and value == "-" for arg, value in zip(argv, argv[1:]))
+
+
+class DaemonStream:
+    """
+    A text stream sending everything written to it to a client, as frames of the given kind.
+
+    Parameters
+    ----------
+    kind : str
+        "stdout" or "stderr".
+    wfile : io.BufferedIOBase
+        The connection to the client.
+    """
+    def __init__(self, kind: str, wfile: io.BufferedIOBase) -> None:
+        self.kind = kind
+        self.wfile = wfile
+
+    def isatty(self) -> bool:
+        return False
+
+    def write(self, text: str) -> int:
+        if text:
+            self.wfile.write((json.dumps({self.kind: text}) + "\n").encode("utf-8"))
+
+        return len(text)
+
+    def flush(self) -> None:
+        self.wfile.flush()
+
+
+def run_request(request: dict, wfile: io.BufferedIOBase) -> int:
+    """
+    Run an llmcli invocation on behalf of a client, streaming its output to the client.
+
+    Parameters
+    ----------
+    request : dict
+        The client's request.
+    wfile : io.BufferedIOBase
+        The connection to the client.
+
+    Returns
+    -------
+    int
+        The exit status.
+    """
+    # pylint: disable=import-outside-toplevel
+    from llmcli.llmcli import main as cli_main
+
+    stdout = DaemonStream("stdout", wfile)
+    stderr = DaemonStream("stderr", wfile)
+    previous_stdin = sys.stdin
+    previous_cwd = os.getcwd()
+
+    try:
+        os.chdir(request["cwd"])
+        sys.stdin = io.StringIO(request.get("stdin") or "")
+
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                cli_main(request["argv"])
+            except SystemExit as ex:
+                return ex.code if isinstance(ex.code, int) else int(ex.code is not None)
+            except Exception as ex: # pylint: disable=broad-exception-caught
+                print(f"Error: {ex}", file=sys.stderr)
+                return 1
+            finally:
+                stdout.flush()
+    finally:
+        sys.stdin = previous_stdin
+        os.chdir(previous_cwd)
+
+    return 0
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Handles a client connection to the daemon.
+    """
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+
+        try:
+            with self.server.lock:
+                status = run_request(request, self.wfile)
+
+            self.wfile.write((json.dumps({"exit": status}) + "\n").encode("utf-8"))
+        except OSError:
+            # the client went away
+            pass
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """
+    The daemon's socket server. Connections are accepted concurrently, but requests are run one at
+    a time.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str) -> None:
+        self.lock = threading.Lock()
+        self.socket_path = socket_path
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        remove_stale_socket(socket_path)
+
+        # the daemon uses the user's API keys, so only the user may connect to it
+        umask = os.umask(0o177)
+
+        try:
+            super().__init__(socket_path, DaemonHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a socket left behind by a daemon that is no longer running.
+
+    Raises
+    ------
+    RuntimeError
+        If a daemon is already listening on the socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+
+    raise RuntimeError(f"A daemon is already running on {socket_path}")
+
+
+def warm_up() -> None:
+    """
+    Import llmcli and every adapter module, so requests don't have to.
+    """
+    # pylint: disable=import-outside-toplevel
+    import llmcli.llmcli # pylint: disable=unused-import
+    from llmcli.adapters import get_adapter_list
+
+    for spec in get_adapter_list():
+        try:
+            spec.load()
+        except ImportError as ex:
+            print(f"Unable to load the {spec.name} adapter: {ex}", file=sys.stderr)
+
+
+def serve(argv: list[str]) -> None:
+    """
+    Run the daemon until interrupted (`llmcli serve`).
+
+    Parameters
+    ----------
+    argv : list[str]
+        The arguments following `serve`.
+    """
+    parser = argparse.ArgumentParser(prog="llmcli serve")
+    parser.add_argument("--socket", default=get_default_socket_path())
+    args = parser.parse_args(argv)
+
+    warm_up()
+
+    # exit cleanly on SIGTERM too, so the socket is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    with DaemonServer(args.socket) as server:
+        print(f"Listening on {args.socket}", file=sys.stderr)
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def forward_request(argv: list[str], socket_path: str) -> int | None:
+    """
+    Send an invocation to the daemon, and write its output to stdout and stderr.
+
+    Parameters
+    ----------
+    argv : list[str]
+        The command line arguments.
+    socket_path : str
+        The path of the daemon's socket.
+
+    Returns
+    -------
+    int | None
+        The exit status, or None if the daemon couldn't be reached.
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock, sock.makefile("rwb") as connection:
+        request = {
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "stdin": sys.stdin.read() if reads_stdin(argv) else None,
+        }
+        connection.write((json.dumps(request) + "\n").encode("utf-8"))
+        connection.flush()
+
+        for line in connection:
+            frame = json.loads(line)
+
+            if "exit" in frame:
+                return frame["exit"]
+
+            stream = sys.stdout if "stdout" in frame else sys.stderr
+            stream.write(frame.get("stdout", frame.get("stderr")))
+            stream.flush()
+
+    print("Error: lost connection to the llmcli daemon", file=sys.stderr)
+    return 1
+
+
+def main() -> None:
+    """
+    The `llmcli` entry point: runs the daemon for `llmcli serve`, forwards non-interactive
+    invocations to a running daemon, and runs everything else locally.
+    """
+    argv = sys.argv[1:]
+
+    if argv[:1] == ["serve"]:
+        serve(argv[1:])
+        return
+
+    if should_forward(argv):
+        status = forward_request(argv, get_default_socket_path())
+
+        if status is not None:
+            sys.exit(status)
+
+    # pylint: disable=import-outside-toplevel
+    from llmcli.llmcli import main as cli_main
+
+    cli_main(argv)
@@ -30,9 +30,12 @@ Options:
   -s, --system <message>       Add a system prompt message. If not specified, a default system prompt is used.
   -a, --assistant <message>    Add an assistant response message.
   -u, --user <message>         Add a user prompt message.
-  -f, --file <path>            Add a user prompt message containing a file.
+  -f, --file <path>            Add a user prompt message containing a file, or one for each file in a directory or matching a glob pattern (e.g. 'src/**/*.py'), leaving out binary files and files ignored by .gitignore. Files with the same content are only added once. Append ':<N>-<M>' to only add lines N to M, ':head=<N>' or ':tail=<N>' for the first or last N lines, or ':bytes=<N>-<M>' for a byte range (e.g. 'app.log:tail=200'); the range applies to each file.
+  --file-max-size <KB>         Maximum size of a file (or range) to add; larger ones are truncated. 0 for no limit. (default: 1024)
   -i, --image <path>           Add a user prompt message containing an image.
-  -c, --conversation <json>    Load a previous conversation from a JSON blob. TIP: use '@/path/to/yourlog.json' (see --log-file-json)
+  -c, --conversation <json>    Load a previous conversation from a JSON or JSONL blob. TIP: use '@/path/to/yourlog.json' (see --log-file-json)
+  --conversation-turns <n>     Only load the last N turns (a user message and the responses to it) of conversations loaded with -c. System messages are always loaded. When resuming a JSONL log in place, the older turns are kept in the log.
+  --lazy-attachments           Leave file and image contents in JSONL logs loaded with -c, and read them from the log when they are sent.
   -d, --no-system-prompt       Don't add a default system prompt if none is present.
 
   Message arguments are added to the conversation in the order in which they are specified on the command line. Use '@<path>' to load argument content from a file, '@-' for stdin.
@@ -40,12 +43,42 @@ Options:
   API ARGUMENTS:
   -p, --api <identifier>       Identifier of the API adapter to use. (See ADAPTERS below.) (default: openai)
   -o, --api-options <options>  API option, in the format key=value. May be used multiple times.  (See ADAPTERS below.)
+  --compare <api[:options]>    Also send the conversation to another adapter, in the format api:key=value,key=value. May be used multiple times. Responses are fetched concurrently and shown in separate sections, followed by a summary of their metrics on stderr; the main adapter's response continues the conversation.
+  --hedge <api[:options]>      Backup adapter, in the same format as --compare. If the main adapter produces no text within the hedge delay (or fails), the request is also sent to the backup adapter, and whichever response produces text first is used.
+  --hedge-delay <seconds>      Number of seconds to wait for text from the main adapter before sending the request to the backup adapter. (default: 2.0)
 
   See ADAPTERS below for a list of API identifiers.
 
+  BATCH ARGUMENTS:
+  --batch <file>               Get a completion for each conversation in a JSONL file ('-' for stdin), and exit. Each line is {{"prompt": "..."}}, {{"messages": [...]}} or a JSON array of messages, optionally with an "id". Message arguments are prepended to each conversation.
+  --batch-output <file>        Write batch results as JSONL to a file instead of stdout.
+  --batch-concurrency <n>      Maximum number of concurrent completions in batch mode. (default: 4)
+  --batch-order <order>        Write batch results in 'input' or 'completion' order. (default: input)
+
+  CACHE ARGUMENTS:
+  --cache [<dir>]              Cache responses on disk, keyed by the adapter, its options and the conversation, and replay them instead of calling the API again. (default: ~/.cache/llmcli/responses)
+  --cache-ttl <seconds>        Number of seconds before a cached response expires. (default: 604800)
+  --cache-max-size <MB>        Maximum size of the response cache; least recently used responses are evicted first. (default: 100)
+
+  RETRIEVAL ARGUMENTS:
+  --retrieve <path>            Index a file, directory or glob pattern (like --file), and instead of adding whole files, add the excerpts most relevant to each user message, found with BM25 search. May be used multiple times.
+  --retrieve-k <n>             Number of excerpts to add for each user message. (default: 8)
+  --index-file <file>          Retrieval index file. Files are only indexed again when they change. (default: ~/.cache/llmcli/index.json)
+
+  METRICS ARGUMENTS:
+  --metrics                    Print a summary of each completion's latency metrics (time to first token, tokens per second, total time) to stderr.
+  --metrics-file <file>        Append each completion's latency metrics to a JSONL file.
+
+  Metrics are also saved in each response's "extra" field in the JSON log.
+
+  DAEMON:
+  {exec_path} serve [--socket <path>]
+                               Keep a resident llmcli process running, with the provider SDKs loaded and connections kept open. While it runs, non-interactive (-n) invocations are forwarded to it and their output is streamed back; otherwise they run as usual. Requests run one at a time, so parallel invocations queue behind each other (use --batch for concurrent completions); they run in the caller's working directory but with the daemon's environment (e.g. API keys). (default socket: $LLMCLI_SOCKET or ~/.cache/llmcli/daemon.sock)
+
   OTHER ARGUMENTS:
   -n, --non-interactive        Disable interactive mode, get a completion and exit. Use message arguments to specify the conversation.
-  -j, --log-file-json <file>   Output a JSON-formatted log to a specified file.
+  -j, --log-file-json <file>   Output a JSON-formatted log to a specified file. Use a .jsonl extension for an append-only log that also saves responses as they stream.
+  -b, --blob-store [<dir>]     Store image and file attachments once in a content-addressed directory, and only reference them from logs. (default: ~/.cache/llmcli/blobs)
   -g, --immediate              Get an assistant response immediately, before entering interactive mode.
   -x, --separator <separator>  Specify the separator to use between messages.
   -q, --no-intro               Don't print the system prompt, or messages specified on the command line.
@@ -60,10 +93,10 @@ Options:
     )
 
     for adapter in get_adapter_list():
-        print(f"    {adapter.HR_NAME} ({adapter.NAME})")
+        print(f"    {adapter.hr_name} ({adapter.name})")
         print("      OPTIONS:")
 
-        for option in adapter.OPTIONS:
+        for option in adapter.options:
             if option.default_help_override is not None:
                 print(
                     f"      - {option.name : <22} {option.description} (default: {option.default_help_override})"
@@ -77,6 +110,6 @@ Options:
 
         print("")
 
-        if adapter.EXTRA_HELP is not None:
-            print(f"      {adapter.EXTRA_HELP}")
+        if adapter.extra_help is not None:
+            print(f"      {adapter.extra_help}")
             print("")
@@ -0,0 +1,218 @@
+"""
+Downscaling and recompression of images before they are sent to a provider.
+
+Providers scale large images down to a maximum size anyway, so uploading a full-resolution
+screenshot or photo only costs upload time (and, for some providers, image tokens). Images are
+rotated upright according to their EXIF orientation (which re-encoding would drop), resized to fit
+the provider's maximum size, and re-encoded: as JPEG at the configured quality, or as PNG if they
+have transparency. The original image is kept if it is already upright, already fits and
+re-encoding wouldn't make it smaller.
+
+Processing needs Pillow, which is an optional dependency (`pip install llmcli[images]`). Without
+it, images are sent as-is.
+
+Results are cached in memory, keyed by the image file's path and modification time (or its blob
+digest) and the target size and quality, so each image is only processed once per configuration.
+"""
+import base64
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+DEFAULT_IMAGE_QUALITY = 85
+EXIF_ORIENTATION = 0x0112
+
+# processed images by source and target, least recently used first
+IMAGE_CACHE = OrderedDict()
+IMAGE_CACHE_SIZE = 32
+IMAGE_CACHE_LOCK = threading.Lock()
+
+_warned_missing_pillow = False
+
+
+def get_target_size(
+    width: int,
+    height: int,
+    max_size: Tuple[int, int],
+) -> Tuple[int, int]:
+    """
+    Get the size of an image scaled down to fit a maximum size, keeping its aspect ratio.
+
+    Parameters
+    ----------
+    width : int
+        The width of the image.
+    height : int
+        The height of the image.
+    max_size : Tuple[int, int]
+        The maximum length of the long side and of the short side.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The scaled width and height, or the original size if the image already fits.
+    """
+    max_long, max_short = max_size
+    scale = min(1.0, max_long / max(width, height), max_short / min(width, height))
+
+    if scale >= 1.0:
+        return width, height
+
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def downscale_image(
+    image_bytes: bytes,
+    image_type: str,
+    max_size: Tuple[int, int],
+    quality: int,
+) -> Tuple[bytes, str]:
+    """
+    Resize an image to fit a maximum size, and re-encode it.
+
+    Parameters
+    ----------
+    image_bytes : bytes
+        The encoded image.
+    image_type : str
+        The MIME type of the image.
+    max_size : Tuple[int, int]
+        The maximum length of the long side and of the short side.
+    quality : int
+        The JPEG quality, from 1 to 95.
+
+    Returns
+    -------
+    image_bytes : bytes
+        The processed image, or the original image if processing wouldn't make it smaller.
+    image_type : str
+        The MIME type of the returned image.
+
+    Raises
+    ------
+    ImportError
+        If Pillow isn't installed.
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # leave animations alone
+        if getattr(image, "n_frames", 1) > 1:
+            return image_bytes, image_type
+
+        # e.g. portrait phone photos are stored sideways, with an orientation tag
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        image = ImageOps.exif_transpose(image)
+        size = get_target_size(image.width, image.height, max_size)
+        resized = size != (image.width, image.height)
+        transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if transparent else "RGB")
+
+        if resized:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+
+        if transparent:
+            image.save(output, format="PNG", optimize=True)
+            processed = output.getvalue(), "image/png"
+        else:
+            image.save(output, format="JPEG", quality=quality, optimize=True)
+            processed = output.getvalue(), "image/jpeg"
+
+    if not resized and not rotated and len(processed[0]) >= len(image_bytes):
+        return image_bytes, image_type
+
+    return processed
+
+
+def get_image_key(image_message) -> tuple | None:
+    """
+    Get the cache key identifying the source of an image: its path and modification time if the
+    file exists, or its blob digest.
+
+    Parameters
+    ----------
+    image_message : ImageMessage
+        The image message.
+
+    Returns
+    -------
+    tuple | None
+        The key, or None if the image can't be identified without reading it.
+    """
+    if image_message.image_path is not None:
+        try:
+            return ("path", os.path.abspath(image_message.image_path),
+                    os.stat(image_message.image_path).st_mtime_ns)
+        except OSError:
+            pass
+
+    if image_message.image_blob is not None:
+        return ("blob", image_message.image_blob)
+
+    return None
+
+
+def prepare_image(image_message, max_size: Tuple[int, int], quality: int) -> Tuple[str, str]:
+    """
+    Get an image message's image, downscaled and recompressed for upload.
+
+    Parameters
+    ----------
+    image_message : ImageMessage
+        The image message.
+    max_size : Tuple[int, int]
+        The maximum length of the long side and of the short side.
+    quality : int
+        The JPEG quality, from 1 to 95.
+
+    Returns
+    -------
+    image_type : str
+        The MIME type of the image.
+    image_content : str
+        The base64-encoded image.
+    """
+    global _warned_missing_pillow # pylint: disable=global-statement
+
+    key = get_image_key(image_message)
+
+    if key is not None:
+        key = (*key, tuple(max_size), quality)
+
+        with IMAGE_CACHE_LOCK:
+            cached = IMAGE_CACHE.get(key)
+
+            if cached is not None:
+                IMAGE_CACHE.move_to_end(key)
+                return cached
+
+    try:
+        image_bytes, image_type = downscale_image(
+            image_message.get_image_bytes(), image_message.image_type, max_size, quality
+        )
+    except ImportError:
+        if not _warned_missing_pillow:
+            _warned_missing_pillow = True
+            print("Note: install Pillow to downscale images before upload.", file=sys.stderr)
+
+        return image_message.image_type, image_message.image_content
+    except (OSError, ValueError):
+        # not an image Pillow can read; send it as-is and let the provider decide
+        return image_message.image_type, image_message.image_content
+
+    result = (image_type, base64.b64encode(image_bytes).decode("utf-8"))
+
+    if key is not None:
+        with IMAGE_CACHE_LOCK:
+            IMAGE_CACHE[key] = result
+
+            while len(IMAGE_CACHE) > IMAGE_CACHE_SIZE:
+                IMAGE_CACHE.popitem(last=False)
+
+    return result
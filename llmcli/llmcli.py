@@ -1,7 +1,9 @@
 import os
 import sys
 import json
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from shutil import get_terminal_size
 from typing import Any, Iterable, Tuple, Union
 
@@ -9,13 +11,45 @@ from prompt_toolkit import prompt
 from prompt_toolkit.key_binding import KeyBindings
 
 from llmcli.args import get_args
-from llmcli.util import normalize_path
+from llmcli.attachments import (
+    DEFAULT_READ_WORKERS,
+    GitIgnore,
+    resolve_file_messages,
+    submit_file_messages,
+)
+from llmcli.batch import get_batch_metadata, parse_batch_line, run_batch
+from llmcli.blobs import BlobStore, set_blob_store
+from llmcli.cache import ResponseCache
+from llmcli.compare import ComparisonStream, format_comparison, render_comparison
+from llmcli.conversation import (
+    JsonlLogWriter,
+    PreservedRecords,
+    is_jsonl_path,
+    load_conversation,
+    load_conversation_file,
+)
+from llmcli.util import normalize_path, write_file_atomic
 from llmcli.help import print_help, INTERACTIVE_KEYS
-from llmcli.adapters import get_api_adapter, get_adapter_list, parse_api_params
+from llmcli.metrics import format_metrics, write_metrics
+from llmcli.render import render_stream
+from llmcli.retrieval import (
+    DEFAULT_TOP_K,
+    RetrievalIndex,
+    get_context_message,
+    get_default_index_path,
+)
+from llmcli.tokens import trim_messages
+from llmcli.adapters import (
+    get_api_adapter,
+    get_adapter_list,
+    parse_adapter_spec,
+    parse_api_params,
+)
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.adapters.hedged import HedgedApiAdapter
 from llmcli.messages.message import Message
-from llmcli.messages.file_message import FileMessage
+from llmcli.messages.file_message import DEFAULT_FILE_MAX_SIZE, FileMessage
 from llmcli.messages.image_message import ImageMessage
-from llmcli.messages import message_from_dict
 
 DEFAULT_SYSTEM_PROMPT = """
 Carefully heed the user's instructions.
@@ -37,22 +71,75 @@ class LlmCli:
         no_system_prompt=False,
         api_adapter_name=None,
         api_adapter_options=None,
+        blob_store_dir=None,
+        response_cache=None,
+        metrics_file=None,
+        print_metrics=False,
+        compare=None,
+        hedge=None,
+        hedge_delay=2.0,
+        file_max_size=DEFAULT_FILE_MAX_SIZE,
+        retrieve=None,
+        retrieve_k=DEFAULT_TOP_K,
+        index_file=None,
+        conversation_turns=None,
+        lazy_attachments=False,
     ):
+        set_blob_store(BlobStore(normalize_path(blob_store_dir)) if blob_store_dir else None)
+        self.response_cache = response_cache
+        self.metrics_file = normalize_path(metrics_file) if metrics_file is not None else None
+        self.print_metrics = print_metrics
+
         self.json_log_file = normalize_path(log_file_json) if log_file_json is not None else None
+        self.json_log_writer = self.get_json_log_writer(self.json_log_file)
+        if conversation_turns is not None and conversation_turns < 1:
+            raise ValueError("--conversation-turns must be at least 1")
+
+        self.conversation_turns = conversation_turns
+        self.lazy_attachments = lazy_attachments
+        # records of logs loaded with -c that weren't loaded, by log path
+        self.preserved_records = {}
         self.interactive = interactive
         self.immediate = immediate
         self.separator = separator
         self.intro = intro
         self.no_system_prompt = no_system_prompt
+        self.file_max_size = file_max_size
+        self.retrieve_specs = retrieve or []
+        self.retrieve_k = retrieve_k
+        self.retrieval_index = RetrievalIndex(
+            normalize_path(index_file or get_default_index_path())
+        ) if self.retrieve_specs else None
+        self.retrieval_lock = threading.Lock()
+        self.retrieved_context = None
 
         self.api_adapter_name = api_adapter_name
         self.api_adapter_options = api_adapter_options or []
-        self.api_adapter = get_api_adapter(
-            self.api_adapter_name, parse_api_params(self.api_adapter_options)
-        )
+        self.hedge_target = parse_adapter_spec(hedge) if hedge is not None else None
+        self.hedge_delay = hedge_delay
+        self.api_adapter = self.get_main_api_adapter()
+        self.compare_targets = [parse_adapter_spec(spec) for spec in compare or []]
 
         self.messages = []
 
+    def get_main_api_adapter(self) -> BaseApiAdapter:
+        """
+        Get the adapter for the selected API and options, hedged with the backup adapter if one is
+        set (see `HedgedApiAdapter`).
+        """
+        adapter = get_api_adapter(self.api_adapter_name, parse_api_params(self.api_adapter_options))
+
+        if self.hedge_target is None:
+            return adapter
+
+        hedge_name, hedge_options = self.hedge_target
+
+        return HedgedApiAdapter(
+            adapter,
+            get_api_adapter(hedge_name, parse_api_params(hedge_options)),
+            self.hedge_delay,
+        )
+
     @staticmethod
     def encode(obj: Any) -> dict[str, Any] | list[Any] | None:
         if hasattr(obj, "__iter__"):
@@ -63,13 +150,155 @@ class LlmCli:
             return obj.__dict__
         return None
 
+    @staticmethod
+    def get_json_log_writer(
+        json_log_file: str | None,
+        preserved: PreservedRecords | None = None,
+    ) -> JsonlLogWriter | None:
+        if is_jsonl_path(json_log_file):
+            return JsonlLogWriter(json_log_file, preserved=preserved)
+
+        return None
+
     def log_json(self):
-        if self.json_log_file:
-            with open(self.json_log_file, "w", encoding="utf-8") as file:
-                json.dump(self.messages, file, indent=2, default=self.encode)
+        if self.json_log_writer:
+            self.json_log_writer.write(self.messages)
+        elif self.json_log_file:
+            # replace the log, so a failed write never leaves it truncated
+            content = json.dumps(self.messages, indent=2, default=self.encode)
+            write_file_atomic(self.json_log_file, content.encode("utf-8"))
+
+    def get_adapter_completion(
+        self,
+        messages: list[Message],
+        adapter: BaseApiAdapter | None = None,
+    ) -> Tuple[Union[Iterable[str], None], Message]:
+        adapter = adapter or self.api_adapter
+
+        if self.response_cache is not None:
+            return self.response_cache.get_completion(adapter, messages)
+
+        return adapter.get_completion(messages)
+
+    def get_request_messages(self, adapter: BaseApiAdapter | None = None) -> list[Message]:
+        """
+        Get the messages to send, leaving out old messages that don't fit in the adapter's context
+        window.
+        """
+        adapter = adapter or self.api_adapter
+        all_messages = self.add_retrieved_context(self.messages)
+        messages = trim_messages(all_messages, adapter.get_context_budget())
+
+        if len(messages) < len(all_messages):
+            print(
+                f"Note: left out {len(all_messages) - len(messages)} old message(s) to fit the "
+                "context window.",
+                file=sys.stderr,
+            )
+
+        return messages
+
+    def add_retrieved_context(self, messages: list[Message]) -> list[Message]:
+        """
+        Insert the excerpts of the retrieval files that are most relevant to the user's latest
+        message just before it (see `llmcli.retrieval`). The excerpts are only looked up once per
+        message, and aren't added to the conversation.
+        """
+        if self.retrieval_index is None or not messages or messages[-1].role != "user":
+            return messages
+
+        last = messages[-1]
+
+        with self.retrieval_lock:
+            if self.retrieved_context is None or self.retrieved_context[0] is not last \
+                    or self.retrieved_context[1] is not last.content:
+                context = get_context_message(
+                    self.retrieval_index, self.retrieve_specs, last.content, self.retrieve_k
+                )
+                self.retrieved_context = (last, last.content, context)
+
+            context = self.retrieved_context[2]
+
+        if context is None:
+            return messages
+
+        return messages[:-1] + [context, last]
+
+    def get_completion(
+        self,
+        adapter: BaseApiAdapter | None = None,
+    ) -> Tuple[Union[Iterable[str], None], Message]:
+        adapter = adapter or self.api_adapter
+        response_stream, response_message = self.get_adapter_completion(
+            self.get_request_messages(adapter), adapter
+        )
+
+        if response_stream is None:
+            return response_stream, response_message
+
+        # only the main adapter's response is added to the conversation
+        if self.json_log_writer is not None and adapter is self.api_adapter:
+            # make sure the log is up to date, so the checkpoints follow the right messages
+            self.log_json()
+            response_stream = self.json_log_writer.checkpoint_stream(
+                response_stream, response_message
+            )
+
+        if self.metrics_file is not None or self.print_metrics:
+            response_stream = self.record_metrics(response_stream, response_message)
+
+        return response_stream, response_message
+
+    def get_comparison(self) -> Message:
+        """
+        Send the conversation to the main adapter and each comparison adapter concurrently, and
+        show each response in its own section as it arrives, followed by a summary of their
+        metrics on stderr. The main adapter's response is returned, to continue the conversation.
+        """
+        adapters = [self.api_adapter] + [
+            get_api_adapter(name, parse_api_params(options))
+            for name, options in self.compare_targets
+        ]
+        streams = [
+            ComparisonStream(
+                adapter.get_display_name(),
+                lambda adapter=adapter: self.get_completion(adapter),
+            )
+            for adapter in adapters
+        ]
+
+        render_comparison(streams, separator=self.get_separator())
+        print(format_comparison(streams), file=sys.stderr)
 
-    def get_completion(self) -> Tuple[Union[Iterable[str], None], Message]:
-        return self.api_adapter.get_completion(self.messages)
+        if streams[0].error is not None:
+            raise streams[0].error
+
+        return streams[0].message
+
+    def record_metrics(self, stream: Iterable[str], message: Message) -> Iterable[str]:
+        """
+        Pass a response stream through, then write its metrics to the metrics file and/or print a
+        summary to stderr.
+        """
+        yield from stream
+
+        metrics = (message.extra or {}).get("metrics")
+
+        if metrics is None:
+            return
+
+        if self.metrics_file is not None:
+            write_metrics(
+                self.metrics_file,
+                {
+                    "adapter": message.adapter,
+                    "model": (message.adapter_options or {}).get("model"),
+                    **metrics,
+                },
+            )
+
+        if self.print_metrics:
+            print(format_metrics(metrics), file=sys.stderr)
 
     def get_separator(self) -> str:
         if self.separator is not None:
@@ -89,8 +318,7 @@ class LlmCli:
             # if there is a stream, we have to sink the entire thing before we can be
             # sure the Message is complete
             if stream is not None:
-                for chunk in stream:
-                    print(chunk, end="", flush=True)
+                render_stream(stream)
             else:
                 print(message.content)
 
@@ -98,6 +326,46 @@ class LlmCli:
 
         self.messages.append(message)
 
+    def get_file_messages(self, spec: str) -> list[FileMessage]:
+        """
+        Create messages containing the files selected by a file argument: a file, directory or
+        glob pattern, optionally followed by a range (see `llmcli.attachments`).
+        """
+        with ThreadPoolExecutor(max_workers=DEFAULT_READ_WORKERS) as executor:
+            futures = submit_file_messages(executor, spec, self.file_max_size)
+
+        return resolve_file_messages(futures)
+
+    def load_conversation_file(self, path: str) -> list[Message]:
+        """
+        Load a conversation from a log file given to `-c`, streaming it and keeping only the last
+        turns and leaving attachments in the log if requested (see `llmcli.conversation`). If only
+        the last turns of the JSONL log also used for `-j` are loaded, the other turns are kept
+        when the log is rewritten.
+        """
+        if not os.path.exists(path):
+            # so you can combine -c and -j on a file that doesn't exist yet
+            if path == self.json_log_file:
+                return []
+
+            raise ValueError(f"File {path} does not exist")
+
+        if self.conversation_turns is not None and path == self.json_log_file \
+                and not is_jsonl_path(path):
+            raise ValueError("Only a JSONL log can be resumed with --conversation-turns")
+
+        messages, preserved = load_conversation_file(
+            path, self.conversation_turns, self.lazy_attachments
+        )
+
+        if preserved is not None:
+            self.preserved_records[path] = preserved
+
+            if self.json_log_writer is not None and self.json_log_writer.path == path:
+                self.json_log_writer.preserved = preserved
+
+        return messages
+
     @staticmethod
     def get_message_arg_content(arg_value: str) -> Tuple[str, str | None]:
         if not arg_value.startswith("@"):
@@ -131,44 +399,50 @@ class LlmCli:
 
         args_iter = iter(args)
         args_messages = []
+        gitignore = GitIgnore()
+
+        # files are read on a thread pool, and collected in order once all arguments are parsed
+        with ThreadPoolExecutor(max_workers=DEFAULT_READ_WORKERS) as executor:
+            for arg in args_iter:
+                if arg not in (
+                    "-s", "--system",
+                    "-a", "--assistant",
+                    "-u", "--user",
+                    "-f", "--file",
+                    "-i", "--image",
+                    "-c", "--conversation",
+                ):
+                    continue
 
-        for arg in args_iter:
-            if arg not in (
-                "-s", "--system",
-                "-a", "--assistant",
-                "-u", "--user",
-                "-f", "--file",
-                "-i", "--image",
-                "-c", "--conversation",
-            ):
-                continue
+                arg_value = next(args_iter, None)
 
-            arg_value = next(args_iter, None)
-            (arg_value_parsed, arg_value_parsed_filename) = self.get_message_arg_content(arg_value)
+                if arg in ("-c", "--conversation") and arg_value.startswith("@") \
+                        and arg_value != "@-":
+                    args_messages += self.load_conversation_file(normalize_path(arg_value[1:]))
+                    continue
 
-            if arg in ("-c", "--conversation"):
-                # so you can combine -c and -j on a file that doesn't exist yet
-                if arg_value_parsed is None:
-                    if arg_value_parsed_filename == self.json_log_file:
-                        continue
+                (arg_value_parsed, arg_value_parsed_filename) = self.get_message_arg_content(
+                    arg_value
+                )
 
+                if arg in ("-c", "--conversation"):
+                    args_messages += load_conversation(arg_value_parsed, self.conversation_turns)
+                elif arg_value_parsed is None and arg_value_parsed_filename is not None:
                     raise ValueError(f"File {arg_value_parsed_filename} does not exist")
-
-                conversation = json.loads(arg_value_parsed)
-                for message in conversation:
-                    args_messages.append(message_from_dict(message))
-            elif arg_value_parsed is None and arg_value_parsed_filename is not None:
-                raise ValueError(f"File {arg_value_parsed_filename} does not exist")
-            elif arg in ("-s", "--system"):
-                args_messages.append(Message(role="system", content=arg_value_parsed))
-            elif arg in ("-a", "--assistant"):
-                args_messages.append(Message(role="assistant", content=arg_value_parsed))
-            elif arg in ("-u", "--user"):
-                args_messages.append(Message(role="user", content=arg_value_parsed))
-            elif arg in ("-f", "--file"):
-                args_messages.append(FileMessage(role="user", file_path=arg_value_parsed))
-            elif arg in ("-i", "--image"):
-                args_messages.append(ImageMessage(role="user", image_path=arg_value_parsed))
+                elif arg in ("-s", "--system"):
+                    args_messages.append(Message(role="system", content=arg_value_parsed))
+                elif arg in ("-a", "--assistant"):
+                    args_messages.append(Message(role="assistant", content=arg_value_parsed))
+                elif arg in ("-u", "--user"):
+                    args_messages.append(Message(role="user", content=arg_value_parsed))
+                elif arg in ("-f", "--file"):
+                    args_messages += submit_file_messages(
+                        executor, arg_value_parsed, self.file_max_size, gitignore
+                    )
+                elif arg in ("-i", "--image"):
+                    args_messages.append(ImageMessage(role="user", image_path=arg_value_parsed))
+
+        args_messages = resolve_file_messages(args_messages)
 
         if not self.no_system_prompt and not any(
             message.role == "system" for message in args_messages
@@ -178,9 +452,79 @@ class LlmCli:
         for message in args_messages:
             self.add_chat_message(message=message, silent=silent)
 
+    def get_batch_items(
+        self,
+        lines: Iterable[str],
+    ) -> Iterable[Tuple[list[Message] | Exception, dict]]:
+        """
+        Parse batch input lines into conversations, prefixed with the messages from the command
+        line. The default system prompt is left out of conversations that have their own.
+        """
+        for line in lines:
+            if line.strip() == "":
+                continue
+
+            try:
+                messages, metadata = parse_batch_line(line)
+            except Exception as ex: # pylint: disable=broad-exception-caught
+                # a bad line only fails its own item, not the whole batch
+                yield ex, get_batch_metadata(line)
+                continue
+
+            prefix = self.messages
+
+            if any(message.role == "system" for message in messages):
+                prefix = [
+                    message for message in prefix
+                    if message.role != "system" or message.content != DEFAULT_SYSTEM_PROMPT
+                ]
+
+            yield prefix + messages, metadata
+
+    def batch(
+        self,
+        batch_file: str,
+        output_file: str | None = None,
+        concurrency: int = 4,
+        ordered: bool = True,
+    ) -> None:
+        """
+        Run completions for each conversation in a JSONL batch file, and write the results as JSONL.
+
+        Args:
+          batch_file: The path to the batch input, or '-' for stdin.
+          output_file: The path to write results to, or None for stdout.
+          concurrency: The maximum number of concurrent completions.
+          ordered: Whether to write results in input order, rather than completion order.
+
+        Returns:
+          None
+        """
+        # pylint: disable=consider-using-with
+        input_handle = sys.stdin if batch_file == "-" else open(batch_file, "r", encoding="utf-8")
+        output_handle = (
+            sys.stdout if output_file is None else open(output_file, "w", encoding="utf-8")
+        )
+
+        try:
+            for record in run_batch(
+                self.get_adapter_completion,
+                self.get_batch_items(input_handle),
+                concurrency=concurrency,
+                ordered=ordered,
+            ):
+                output_handle.write(json.dumps(record) + "\n")
+                output_handle.flush()
+        finally:
+            if input_handle is not sys.stdin:
+                input_handle.close()
+            if output_handle is not sys.stdout:
+                output_handle.close()
+
     def add_file(self) -> None:
         user_input = prompt("Enter file path: ")
-        self.add_chat_message(message=FileMessage(role="user", file_path=normalize_path(user_input)))
+        for message in self.get_file_messages(user_input):
+            self.add_chat_message(message=message)
 
     def add_image(self) -> None:
         user_input = prompt("Enter image path: ")
@@ -192,7 +536,7 @@ class LlmCli:
         adapter_list = get_adapter_list()
 
         for i, option in enumerate(adapter_list):
-            print(f"[{i}] {option.HR_NAME or option.NAME}")
+            print(f"[{i}] {option.hr_name or option.name}")
         user_input = prompt("\nEnter selection: ")
 
         try:
@@ -205,10 +549,8 @@ class LlmCli:
             print(f"Invalid selection: {choice}")
             return
 
-        self.api_adapter_name = adapter_list[choice].NAME
-        self.api_adapter = get_api_adapter(
-            self.api_adapter_name, parse_api_params(self.api_adapter_options)
-        )
+        self.api_adapter_name = adapter_list[choice].name
+        self.api_adapter = self.get_main_api_adapter()
 
     def change_api_adapter_options(self) -> None:
         while True:
@@ -237,9 +579,40 @@ class LlmCli:
             else:
                 self.api_adapter_options.pop(choice - 2)
 
-        self.api_adapter = get_api_adapter(
-            self.api_adapter_name, parse_api_params(self.api_adapter_options)
+        self.api_adapter = self.get_main_api_adapter()
+
+    def toggle_pinned_message(self) -> None:
+        """
+        Prompt the user to pin or unpin a message. Pinned messages are never left out to fit the
+        context window.
+        """
+        print("\nMessages:")
+
+        for i, message in enumerate(self.messages):
+            preview = " ".join((message.content or "").split())[:60]
+            pinned = "(pinned) " if message.pinned else ""
+            print(f"[{i+1}] {pinned}{message.display_name}: {preview}")
+
+        user_input = prompt("\nEnter selection: ")
+
+        try:
+            choice = int(user_input) - 1
+        except ValueError:
+            print(f"Invalid selection: {user_input}")
+            return
+
+        if choice < 0 or choice >= len(self.messages):
+            print(f"Invalid selection: {user_input}")
+            return
+
+        message = self.messages[choice]
+        message.pinned = None if message.pinned else True
+
+        # the message may already be in the log, so rewrite it
+        self.json_log_writer = self.get_json_log_writer(
+            self.json_log_file, self.preserved_records.get(self.json_log_file)
         )
+        self.log_json()
 
     def change_json_log_file(self) -> None:
         """
@@ -255,6 +628,9 @@ class LlmCli:
         else:
             self.json_log_file = normalize_path(json_log_file)
 
+        self.json_log_writer = self.get_json_log_writer(
+            self.json_log_file, self.preserved_records.get(self.json_log_file)
+        )
         self.log_json()
 
     def menu(self) -> None:
@@ -264,6 +640,7 @@ class LlmCli:
                 ("Add an image", self.add_image),
                 ("Change API", self.change_api_adapter_name),
                 ("Change API options", self.change_api_adapter_options),
+                ("Pin or unpin a message", self.toggle_pinned_message),
                 ("Change JSON log file", self.change_json_log_file),
             ]
 
@@ -326,8 +703,11 @@ class LlmCli:
                 print(self.get_separator())
 
                 try:
-                    response_stream, response_message = self.get_completion()
-                    self.add_chat_message(stream=response_stream, message=response_message)
+                    if self.compare_targets:
+                        self.add_chat_message(message=self.get_comparison(), silent=True)
+                    else:
+                        response_stream, response_message = self.get_completion()
+                        self.add_chat_message(stream=response_stream, message=response_message)
                 except Exception as ex:
                     print(f"Unable to get completion: {str(ex)}\n")
                     continue
@@ -341,16 +721,24 @@ class LlmCli:
         self.add_messages_from_args(args)
 
         if not self.interactive:
-            response_stream, response_message = self.get_completion()
-            for fragment in response_stream:
-                print(fragment, end="", flush=True)
-            self.add_chat_message(stream=response_stream, message=response_message, silent=True)
+            if self.compare_targets:
+                self.add_chat_message(message=self.get_comparison(), silent=True)
+            else:
+                response_stream, response_message = self.get_completion()
+                render_stream(response_stream)
+                self.add_chat_message(
+                    stream=response_stream, message=response_message, silent=True
+                )
+
             self.log_json()
             return
 
         if self.immediate:
-            response_stream, response_message = self.get_completion()
-            self.add_chat_message(stream=response_stream, message=response_message)
+            if self.compare_targets:
+                self.add_chat_message(message=self.get_comparison(), silent=True)
+            else:
+                response_stream, response_message = self.get_completion()
+                self.add_chat_message(stream=response_stream, message=response_message)
 
         self.log_json()
 
@@ -373,8 +761,9 @@ class LlmCli:
 ###############
 
 
-def main():
-    args = get_args()
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = get_args(argv)
 
     if args.help:
         print_help()
@@ -382,13 +771,40 @@ def main():
 
     cli = LlmCli(
         log_file_json=args.log_file_json,
-        interactive=not args.non_interactive,
+        interactive=not args.non_interactive and args.batch is None,
         immediate=args.immediate,
         separator=args.separator,
         intro=not args.no_intro,
         no_system_prompt=args.no_system_prompt,
         api_adapter_name=args.api,
         api_adapter_options=args.api_options,
+        blob_store_dir=args.blob_store,
+        response_cache=ResponseCache(
+            normalize_path(args.cache),
+            ttl=args.cache_ttl,
+            max_size=int(args.cache_max_size * 1024 * 1024),
+        ) if args.cache else None,
+        metrics_file=args.metrics_file,
+        print_metrics=args.metrics,
+        compare=args.compare,
+        hedge=args.hedge,
+        hedge_delay=args.hedge_delay,
+        file_max_size=int(args.file_max_size * 1024),
+        retrieve=args.retrieve,
+        retrieve_k=args.retrieve_k,
+        index_file=args.index_file,
+        conversation_turns=args.conversation_turns,
+        lazy_attachments=args.lazy_attachments,
     )
 
-    cli.main(sys.argv[1:])
+    if args.batch is not None:
+        cli.add_messages_from_args(argv)
+        cli.batch(
+            args.batch,
+            output_file=args.batch_output,
+            concurrency=args.batch_concurrency,
+            ordered=args.batch_order == "input",
+        )
+        return
+
+    cli.main(argv)
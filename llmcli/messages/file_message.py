@@ -4,11 +4,185 @@ Module for handling file-based messages in a conversation.
 This module defines the `FileMessage` class, which represents a message containing
 file content. It provides functionality to load file content and manage metadata
 related to the file.
+
+Only part of a file can be attached, by appending a range to its path (see `parse_file_spec`), and
+attachments can be capped at a maximum size. Files are memory-mapped, so only the selected part is
+read, however large the file is.
 """
+import mmap
+import os
+import re
+from typing import Callable, Tuple
 
+from llmcli.blobs import get_blob_store, read_blob
 from llmcli.messages.message import Message
+from llmcli.tokens import estimate_tokens
 from llmcli.util import normalize_path
 
+DEFAULT_FILE_MAX_SIZE = 1024 * 1024
+# files with a NUL byte in this many leading bytes are considered binary
+BINARY_CHECK_SIZE = 8192
+FILE_RANGE_PATTERN = re.compile(r"^(?:\d+-\d*|(?:head|tail)=\d+|bytes=\d+-\d*)$")
+
+
+def parse_file_spec(spec: str) -> Tuple[str, str | None]:
+    """
+    Split a file argument into a path and an optional range, in the format `path[:range]`. The
+    range is one of:
+
+    - `N-M` or `N-`: lines N to M (or to the end), counting from 1
+    - `head=N` or `tail=N`: the first or last N lines
+    - `bytes=N-M` or `bytes=N-`: bytes N to M (or to the end), counting from 0
+
+    Parameters
+    ----------
+    spec : str
+        The file argument.
+
+    Returns
+    -------
+    path : str
+        The file path. This is the whole argument if a file with that name exists.
+    file_range : str | None
+        The range, or None to attach the whole file.
+    """
+    path, _, file_range = spec.rpartition(":")
+
+    if not path or os.path.exists(spec) or not FILE_RANGE_PATTERN.match(file_range):
+        return spec, None
+
+    return path, file_range
+
+
+def find_line(data, line: int, start: int = 0) -> int:
+    """
+    Get the offset of the start of a line, counting from the line starting at `start`.
+
+    Parameters
+    ----------
+    data : bytes | mmap.mmap
+        The file content.
+    line : int
+        The line number, counting from 1.
+    start : int
+        The offset of line 1.
+
+    Returns
+    -------
+    int
+        The offset of the line, or the length of the data if there are fewer lines.
+    """
+    for _ in range(line - 1):
+        start = data.find(b"\n", start) + 1
+
+        if start == 0:
+            return len(data)
+
+    return start
+
+
+def get_range_offsets(data, file_range: str | None) -> Tuple[int, int]:
+    """
+    Get the start and end offsets of a file range (see `parse_file_spec`).
+
+    Parameters
+    ----------
+    data : bytes | mmap.mmap
+        The file content.
+    file_range : str | None
+        The range, or None for the whole file.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The start offset (inclusive) and end offset (exclusive).
+    """
+    if file_range is None:
+        return 0, len(data)
+
+    if file_range.startswith("bytes="):
+        first, last = file_range[len("bytes="):].split("-")
+        end = len(data) if last == "" else min(len(data), int(last) + 1)
+        return min(int(first), end), end
+
+    if file_range.startswith("head="):
+        return 0, find_line(data, int(file_range[len("head="):]) + 1)
+
+    if file_range.startswith("tail="):
+        position = len(data) - 1 if data[-1:] == b"\n" else len(data)
+
+        for _ in range(int(file_range[len("tail="):])):
+            position = data.rfind(b"\n", 0, position)
+
+            if position < 0:
+                break
+
+        return position + 1, len(data)
+
+    first, last = file_range.split("-")
+    start = find_line(data, max(1, int(first)))
+
+    if last == "":
+        return start, len(data)
+
+    return start, max(start, find_line(data, int(last) - max(1, int(first)) + 2, start))
+
+
+def read_file(path: str, file_range: str | None = None, max_size: int | None = None) -> str:
+    """
+    Read a text file, or part of it, truncating it to a maximum size.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+    file_range : str | None
+        The part of the file to read (see `parse_file_spec`), or None for the whole file.
+    max_size : int | None
+        The maximum number of bytes to read, or None for no limit. A longer selection is cut at a
+        line break, keeping its start (or its end, for `tail=N`), and marked as truncated.
+
+    Returns
+    -------
+    str
+        The file content.
+
+    Raises
+    ------
+    ValueError
+        If the file is a binary file.
+    """
+    with open(path, "rb") as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # empty files, pipes and the like can't be mapped
+            data = file.read()
+
+    try:
+        if data.find(b"\0", 0, BINARY_CHECK_SIZE) >= 0:
+            raise ValueError(f"{path} is a binary file")
+
+        start, end = get_range_offsets(data, file_range)
+
+        if not max_size or end - start <= max_size:
+            return data[start:end].decode("utf-8", errors="replace")
+
+        if file_range is not None and file_range.startswith("tail="):
+            cut = data.find(b"\n", end - max_size, end) + 1
+            cut = cut if 0 < cut < end else end - max_size
+            content = data[cut:end].decode("utf-8", errors="replace")
+            return f"[... {cut - start} bytes truncated ...]\n{content}"
+
+        cut = data.rfind(b"\n", start, start + max_size) + 1
+        cut = cut if cut > start else start + max_size
+        content = data[start:cut].decode("utf-8", errors="replace")
+        return f"{content}\n[... {end - cut} bytes truncated ...]"
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
 class FileMessage(Message):
     """
     Represents a message containing file content.
@@ -19,40 +193,140 @@ class FileMessage(Message):
         The content of the file.
     file_path : str | None
         The path to the file.
+    file_blob : str | None
+        The blob store digest of the file, used instead of `file_content` when the blob store is
+        enabled.
+    file_range : str | None
+        The part of the file to attach (see `parse_file_spec`), or None for the whole file.
+    max_size : int | None
+        The maximum number of bytes of the file to attach, or None for no limit.
+    file_loader : Callable[[], str] | None
+        A function returning the content of the file, called whenever it is needed instead of
+        keeping it in memory (e.g. to read it from a log).
     """
 
+    # pylint: disable=too-many-arguments
     def __init__(
         self,
         file_content: str = None,
         file_path: str = None,
+        file_blob: str = None,
+        file_range: str = None,
+        max_size: int = None,
+        file_loader: Callable[[], str] = None,
         **kwargs,
     ) -> None:
         super().__init__(**kwargs)
         self.message_type = "FileMessage"
-        self.file_content = file_content
+        self._file_content = file_content
         self.file_path = file_path
+        self.file_blob = file_blob
+        self.file_range = file_range
+        self._max_size = max_size
+        self._file_loader = file_loader
         self.load_files()
 
+    @property
+    def file_label(self) -> str | None:
+        """
+        The file path, followed by the attached range if only part of the file is attached.
+        """
+        if self.file_range is None:
+            return self.file_path
+
+        return f"{self.file_path}:{self.file_range}"
+
+    @property
+    def file_content(self) -> str | None:
+        """
+        The content of the file. If the file is in the blob store or loaded by `file_loader`, it is
+        read on each access.
+        """
+        if self._file_content is None and self.file_blob is not None:
+            return read_blob(self.file_blob).decode("utf-8")
+
+        if self._file_content is None and self._file_loader is not None:
+            return self._file_loader()
+
+        return self._file_content
+
+    @file_content.setter
+    def file_content(self, file_content: str | None) -> None:
+        self._file_content = file_content
+
     def load_files(self) -> None:
         """
         Loads the file content if a file path is provided.
 
-        If `file_path` is specified, the file is read, and its content is stored
+        If `file_path` is specified, the file (or the part of it selected by
+        `file_range`, up to `max_size` bytes) is read, and its content is stored
         in `file_content`. The `content` attribute is updated to indicate that
         the file content is hidden.
 
+        If the blob store is enabled, the file content is moved into the store,
+        and only its digest is kept in `file_blob`.
+
         Raises
         ------
         FileNotFoundError
             If the file at `file_path` does not exist.
+        ValueError
+            If the file is a binary file.
         """
         if self.file_path is None:
             return
 
         self.file_path = normalize_path(self.file_path)
 
-        if self.file_content is None:
-            with open(self.file_path, "r", encoding="utf-8") as file:
-                self.file_content = file.read()
+        if self._file_content is None and self.file_blob is None and self._file_loader is None:
+            self._file_content = read_file(self.file_path, self.file_range, self._max_size)
+
+        blob_store = get_blob_store()
+
+        if self._file_content is not None and blob_store is not None:
+            self.file_blob = blob_store.put(self._file_content.encode("utf-8"))
+            self._file_content = None
+
+        self.content = f"### File: {self.file_label} (contents hidden)"
+
+    def count_tokens(self) -> int:
+        """
+        Estimate the number of tokens in the file name and content.
+
+        Returns
+        -------
+        int
+            The estimated number of tokens.
+        """
+        return estimate_tokens(self.file_label or "") + estimate_tokens(self.file_content or "")
+
+    def get_state(self) -> dict:
+        """
+        Get the attributes of the message, excluding caches and the size limit it was loaded with.
+
+        Returns
+        -------
+        dict
+            The attributes of the message.
+        """
+        state = super().get_state()
+        state.pop("_max_size", None)
+        return state
+
+    def to_dict(self) -> dict:
+        """
+        Converts the message to a dictionary.
+
+        Returns
+        -------
+        dict
+            A dictionary representation of the message.
+        """
+        data = super().to_dict()
+
+        if self._file_content is not None:
+            data["file_content"] = self._file_content
+        elif self._file_loader is not None:
+            data["file_content"] = self.file_content
 
-        self.content = f"### File: {self.file_path} (contents hidden)"
+        return data
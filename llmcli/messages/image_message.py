@@ -4,11 +4,30 @@ Module for handling image-based messages in a conversation.
 This module defines the `ImageMessage` class, which represents a message containing
 image content. It provides functionality to load image content, encode it in base64,
 and manage metadata such as the MIME type of the image.
+
+Images attached from a file are not kept in memory: the file is memory-mapped and encoded each
+time the image is sent, and the encoded copy is released with the request. If the file is modified
+or removed after it is attached, reading it raises an error rather than sending a different image.
 """
 import base64
+import mmap
+import os
+from typing import IO, Callable, Tuple
+
+from llmcli.blobs import get_blob_store, read_blob
 from llmcli.messages.message import Message
+from llmcli.tokens import IMAGE_TOKENS
 from llmcli.util import get_mime_type, normalize_path
 
+
+def get_file_signature(path: str) -> Tuple[int, int]:
+    """
+    Get the modification time and size of a file, used to detect changes to it.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
 class ImageMessage(Message):
     """
     Represents a message containing image content.
@@ -21,30 +40,130 @@ class ImageMessage(Message):
         The base64-encoded content of the image.
     image_type : str | None
         The MIME type of the image.
+    image_blob : str | None
+        The blob store digest of the image, used instead of `image_content` when the blob store is
+        enabled.
+    image_loader : Callable[[], str] | None
+        A function returning the base64-encoded content of the image, called whenever it is
+        needed instead of keeping it in memory (e.g. to read it from a log).
+    image_signature : list[int] | None
+        The modification time and size of the file at `image_path` when it was attached, if its
+        content couldn't be logged because the file has changed since (see `to_dict`).
+
+    Notes
+    -----
+    An image attached from a file, without the blob store, is read from the file whenever its
+    content is needed. Reading it raises a ValueError if the file was modified or removed since it
+    was attached.
     """
 
+    # pylint: disable=too-many-arguments
     def __init__(
         self,
         image_path: str = None,
         image_content: str = None,
         image_type: str = None,
+        image_blob: str = None,
+        image_loader: Callable[[], str] = None,
+        image_signature: list[int] = None,
         **kwargs,
     ) -> None:
         super().__init__(**kwargs)
         self.message_type = "ImageMessage"
         self.image_path = image_path
-        self.image_content = image_content
+        self._image_content = image_content
         self.image_type = image_type
+        self.image_blob = image_blob
+        self._image_file = None
+        self._image_signature = tuple(image_signature) if image_signature else None
+        self._image_loader = image_loader
         self.load_files()
 
+    @property
+    def image_content(self) -> str | None:
+        """
+        The base64-encoded content of the image. If the image is in the blob store, attached
+        from a file or loaded by `image_loader`, it is read on each access.
+        """
+        if self._image_content is None and self._image_loader is not None:
+            return self._image_loader()
+
+        if self._image_content is None and self.image_blob is not None:
+            return base64.b64encode(read_blob(self.image_blob)).decode("utf-8")
+
+        if self._image_content is None and self._image_file is not None:
+            with self.open_image_file() as file:
+                try:
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        return base64.b64encode(mapped).decode("utf-8")
+                except ValueError:
+                    # empty files can't be mapped
+                    return base64.b64encode(file.read()).decode("utf-8")
+
+        return self._image_content
+
+    @image_content.setter
+    def image_content(self, image_content: str | None) -> None:
+        self._image_content = image_content
+
+    def get_image_bytes(self) -> bytes | None:
+        """
+        Get the decoded content of the image.
+
+        Returns
+        -------
+        bytes | None
+            The image, or None if the message has no image content.
+        """
+        if self._image_content is not None or self._image_loader is not None:
+            return base64.b64decode(self.image_content)
+
+        if self.image_blob is not None:
+            return read_blob(self.image_blob)
+
+        if self._image_file is not None:
+            with self.open_image_file() as file:
+                return file.read()
+
+        return None
+
+    def open_image_file(self) -> IO[bytes]:
+        """
+        Open the file the image was attached from.
+
+        Returns
+        -------
+        IO[bytes]
+            The file, opened for reading.
+
+        Raises
+        ------
+        ValueError
+            If the file was modified or removed since the image was attached.
+        """
+        try:
+            if get_file_signature(self._image_file) == self._image_signature:
+                return open(self._image_file, "rb") # pylint: disable=consider-using-with
+        except OSError:
+            pass
+
+        raise ValueError(
+            f"Image {self.image_path} was modified or removed after it was attached; "
+            "attach it again to send the new version"
+        )
+
     def load_files(self) -> None:
         """
         Loads the image content and MIME type if an image path is provided.
 
-        If `image_path` is specified, the image is read, and its content is
-        base64-encoded and stored in `image_content`. The MIME type is
-        determined and stored in `image_type`. The `content` attribute is
-        updated to indicate that the image content is hidden.
+        If `image_path` is specified, the image is opened to check that it can
+        be read, but its content is only read when it is needed (see
+        `image_content`). The MIME type is determined and stored in
+        `image_type`. The `content` attribute is updated to indicate that the
+        image content is hidden.
+
+        If the blob store is enabled, the image is moved into the store, and
+        only its digest is kept in `image_blob`.
 
         Raises
         ------
@@ -55,12 +174,63 @@ class ImageMessage(Message):
             return
 
         self.image_path = normalize_path(self.image_path)
+        blob_store = get_blob_store()
 
-        if self.image_content is None:
+        if self._image_signature is not None:
+            # restored from a log: the attached version of the file can only be sent if the file
+            # is unchanged
+            self._image_file = os.path.abspath(self.image_path)
+        elif self._image_content is None and self.image_blob is None and \
+                self._image_loader is None:
             with open(self.image_path, "rb") as file:
-                self.image_content = base64.b64encode(file.read()).decode("utf-8")
+                if blob_store is not None:
+                    self.image_blob = blob_store.put(file.read())
+
+            if blob_store is None:
+                # keep the absolute path, in case the working directory changes
+                self._image_file = os.path.abspath(self.image_path)
+                self._image_signature = get_file_signature(self._image_file)
+        elif self._image_content is not None and blob_store is not None:
+            self.image_blob = blob_store.put(base64.b64decode(self._image_content))
+            self._image_content = None
 
         if self.image_type is None:
             self.image_type = get_mime_type(self.image_path) or "image/jpeg"
 
         self.content = f"### Image: {self.image_path} ({self.image_type}) (contents hidden)"
+
+    def count_tokens(self) -> int:
+        """
+        Estimate the number of tokens in the image. Providers scale images down to a maximum size,
+        so this is a fixed upper bound.
+
+        Returns
+        -------
+        int
+            The estimated number of tokens.
+        """
+        return IMAGE_TOKENS
+
+    def to_dict(self) -> dict:
+        """
+        Converts the message to a dictionary.
+
+        Returns
+        -------
+        dict
+            A dictionary representation of the message.
+        """
+        data = super().to_dict()
+
+        if self._image_content is not None:
+            data["image_content"] = self._image_content
+        elif self._image_loader is not None:
+            data["image_content"] = self.image_content
+        elif self._image_file is not None:
+            try:
+                data["image_content"] = self.image_content
+            except ValueError:
+                # the file has changed since it was attached, so only record which version was
+                data["image_signature"] = list(self._image_signature)
+
+        return data
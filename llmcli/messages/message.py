@@ -8,6 +8,8 @@ It provides methods for serialization, deserialization, and comparison of messag
 import json
 from typing import Any
 
+from llmcli.tokens import MESSAGE_TOKEN_OVERHEAD, estimate_tokens
+
 class Message:
     """
     Represents a message in a conversation.
@@ -28,6 +30,8 @@ class Message:
         Options for the adapter.
     extra : dict[str, Any] | None
         Additional metadata for the message.
+    pinned : bool | None
+        Whether the message should be kept when old messages are dropped to fit the context window.
     """
 
     # pylint: disable=too-many-arguments
@@ -39,6 +43,7 @@ class Message:
         adapter: str | None = None,
         adapter_options: dict[str, str] | None = None,
         extra: dict[str, Any] | None = None,
+        pinned: bool | None = None,
         **_,
     ) -> None:
         self.message_type = "Message"
@@ -48,6 +53,8 @@ class Message:
         self.adapter_options = adapter_options
         self.display_name = display_name or role.capitalize()
         self.extra = extra
+        self.pinned = pinned or None
+        self._token_estimate = None
 
     def load_files(self) -> None:
         """
@@ -60,16 +67,47 @@ class Message:
         """
         raise NotImplementedError(f"load_files not implemented for {self.__class__.__name__}")
 
+    def count_tokens(self) -> int:
+        """
+        Estimate the number of tokens in the content of the message.
+
+        Returns
+        -------
+        int
+            The estimated number of tokens.
+        """
+        return estimate_tokens(self.content or "")
+
+    def estimate_tokens(self) -> int:
+        """
+        Estimate the number of tokens the message takes up in a request. The estimate is cached,
+        and only recomputed if `content` changes.
+
+        Returns
+        -------
+        int
+            The estimated number of tokens.
+        """
+        if self._token_estimate is not None and self._token_estimate[0] is self.content:
+            return self._token_estimate[1]
+
+        estimate = MESSAGE_TOKEN_OVERHEAD + self.count_tokens()
+        self._token_estimate = (self.content, estimate)
+        return estimate
+
     def to_dict(self) -> dict:
         """
-        Converts the message to a dictionary.
+        Converts the message to a dictionary. Private (underscore-prefixed) attributes are left
+        out; subclasses are responsible for serializing them.
 
         Returns
         -------
         dict
             A dictionary representation of the message.
         """
-        return {k: v for k, v in self.__dict__.items() if v is not None}
+        return {
+            k: v for k, v in self.__dict__.items() if v is not None and not k.startswith("_")
+        }
 
     def to_json(self) -> str:
         """
@@ -134,7 +172,18 @@ class Message:
         if not isinstance(other, Message):
             return False
 
-        return self.__dict__ == other.__dict__
+        return self.get_state() == other.get_state()
+
+    def get_state(self) -> dict:
+        """
+        Get the attributes of the message, excluding caches.
+
+        Returns
+        -------
+        dict
+            The attributes of the message.
+        """
+        return {k: v for k, v in self.__dict__.items() if k != "_token_estimate"}
     
     def __repr__(self) -> str:
         """
@@ -147,7 +196,7 @@ class Message:
         """
         args = ', '.join(
             f'{k}={repr(v)}'
-            for k, v in self.__dict__.items()
+            for k, v in self.get_state().items()
             if v is not None and k != 'message_type'
         )
         return f"{self.__class__.__name__}({args})"
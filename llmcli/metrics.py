@@ -0,0 +1,161 @@
+"""
+Latency metrics for streaming completions.
+
+`StreamMetrics` is updated by `BaseApiAdapter.output_stream()` as chunks arrive, and its results
+are stored in `Message.extra["metrics"]`. Time spent waiting for the provider's stream and time
+spent by the consumer of the stream (rendering, logging, ...) are tracked separately, to tell
+provider or network slowness apart from slowness in llmcli itself.
+"""
+import json
+import time
+
+
+class StreamMetrics:
+    """
+    Timing of a single streaming completion.
+
+    Parameters
+    ----------
+    request_start : float | None
+        The `time.monotonic()` timestamp at which the request was sent. Defaults to now.
+    """
+    def __init__(self, request_start: float | None = None) -> None:
+        now = time.monotonic()
+        self.started_at = time.time() - (now - request_start if request_start is not None else 0)
+        self.request_start = request_start if request_start is not None else now
+        self.stream_start = now
+        self.first_fragment = None
+        self.first_chunk = None
+        self.last_chunk = None
+        self.resumed = now
+        self.chunks = 0
+        self.output_chars = 0
+        self.max_gap = 0.0
+        self.wait_time = 0.0
+        self.consumer_time = 0.0
+
+    def chunk_received(self) -> None:
+        """
+        Record the arrival of a chunk from the provider.
+        """
+        now = time.monotonic()
+        self.wait_time += now - self.resumed
+        # chunks without text don't reach the consumer, so the next wait starts now
+        self.resumed = now
+
+        if self.last_chunk is not None:
+            self.max_gap = max(self.max_gap, now - self.last_chunk)
+        else:
+            self.first_chunk = now
+
+        self.last_chunk = now
+        self.chunks += 1
+
+    def fragment_received(self, fragment: str) -> None:
+        """
+        Record a text fragment extracted from the last chunk.
+        """
+        if self.first_fragment is None:
+            self.first_fragment = self.last_chunk or time.monotonic()
+
+        self.output_chars += len(fragment)
+
+    def consumer_resumed(self) -> None:
+        """
+        Record that the consumer of the stream asked for the next fragment.
+        """
+        self.resumed = time.monotonic()
+
+        if self.last_chunk is not None:
+            self.consumer_time += self.resumed - self.last_chunk
+
+    def to_dict(self, output_tokens: int | None = None) -> dict:
+        """
+        Get the metrics, as of now.
+
+        Parameters
+        ----------
+        output_tokens : int | None
+            The number of output tokens, if known.
+
+        Returns
+        -------
+        dict
+            The metrics. All times are in seconds.
+        """
+        end = time.monotonic()
+        metrics = {
+            "started_at": self.started_at,
+            "response_time": self.stream_start - self.request_start,
+            "ttft": None,
+            "total_time": end - self.request_start,
+            "chunks": self.chunks,
+            "output_chars": self.output_chars,
+            "output_tokens": output_tokens,
+            "tokens_per_second": None,
+            "mean_gap": None,
+            "max_gap": self.max_gap if self.chunks > 1 else None,
+            "wait_time": self.wait_time,
+            "consumer_time": self.consumer_time,
+        }
+
+        if self.first_fragment is not None:
+            metrics["ttft"] = self.first_fragment - self.request_start
+            generation_time = (self.last_chunk or end) - self.first_fragment
+
+            if generation_time > 0 and output_tokens is not None:
+                metrics["tokens_per_second"] = output_tokens / generation_time
+
+        if self.chunks > 1:
+            metrics["mean_gap"] = (self.last_chunk - self.first_chunk) / (self.chunks - 1)
+
+        return metrics
+
+
+def format_metrics(metrics: dict) -> str:
+    """
+    Format metrics as a one-line summary.
+
+    Parameters
+    ----------
+    metrics : dict
+        Metrics, as returned by `StreamMetrics.to_dict()`.
+
+    Returns
+    -------
+    str
+        The summary.
+    """
+    parts = []
+
+    if metrics.get("ttft") is not None:
+        parts.append(f"TTFT {metrics['ttft']:.2f}s")
+
+    if metrics.get("tokens_per_second") is not None:
+        parts.append(f"{metrics['tokens_per_second']:.1f} tokens/s")
+
+    if metrics.get("output_tokens") is not None:
+        parts.append(f"{metrics['output_tokens']} tokens")
+
+    provider_time = metrics.get("response_time", 0) + metrics.get("wait_time", 0)
+    parts.append(
+        f"{metrics.get('total_time', 0):.2f}s total "
+        f"(provider {provider_time:.2f}s, llmcli {metrics.get('consumer_time', 0):.2f}s)"
+    )
+
+    return ", ".join(parts)
+
+
+def write_metrics(path: str, record: dict) -> None:
+    """
+    Append a metrics record to a JSONL file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the metrics file.
+    record : dict
+        The record to append.
+    """
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(record) + "\n")
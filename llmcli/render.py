@@ -0,0 +1,136 @@
+"""
+Rendering of streaming responses to the terminal.
+
+Printing every fragment of a response with `flush=True` costs a write syscall per token. The
+`StreamRenderer` class coalesces fragments, and writes them out once enough time has passed or
+enough text has been buffered. When writing to a terminal, a timer makes sure buffered text is never
+held back for longer than the flush interval. Otherwise (e.g. when output is piped into another
+program), text is written directly to the underlying binary buffer.
+"""
+import sys
+import threading
+import time
+from typing import Iterable, TextIO
+
+DEFAULT_FLUSH_INTERVAL = 0.016
+DEFAULT_FLUSH_SIZE = 4096
+
+
+class StreamRenderer:
+    """
+    Writes fragments of a streaming response to an output stream, coalescing small writes.
+
+    Parameters
+    ----------
+    output : TextIO | None
+        The stream to write to. Defaults to `sys.stdout`.
+    interval : float
+        Maximum number of seconds to buffer text before writing it out.
+    size : int
+        Number of buffered characters after which text is written out immediately.
+    """
+    def __init__(
+        self,
+        output: TextIO | None = None,
+        interval: float = DEFAULT_FLUSH_INTERVAL,
+        size: int = DEFAULT_FLUSH_SIZE,
+    ) -> None:
+        self.output = output or sys.stdout
+        self.interval = interval
+        self.size = size
+
+        try:
+            self.tty = self.output.isatty()
+        except (AttributeError, ValueError):
+            self.tty = False
+
+        self.binary = None if self.tty else getattr(self.output, "buffer", None)
+        self.encoding = getattr(self.output, "encoding", None) or "utf-8"
+        self.errors = getattr(self.output, "errors", None) or "strict"
+
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.timer = None
+
+        # anything already written to the text layer has to come out before our own writes
+        if self.binary is not None:
+            self.output.flush()
+
+    def write(self, fragment: str) -> None:
+        """
+        Buffer a fragment, writing out the buffer if a threshold has been reached.
+
+        Parameters
+        ----------
+        fragment : str
+            The text to write.
+        """
+        with self.lock:
+            self.buffer.append(fragment)
+            self.buffered += len(fragment)
+            elapsed = time.monotonic() - self.last_flush
+
+            if self.buffered >= self.size or elapsed >= self.interval:
+                self._flush()
+            elif self.tty and self.timer is None:
+                self.timer = threading.Timer(self.interval - elapsed, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self) -> None:
+        """
+        Write out any buffered text.
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        self.last_flush = time.monotonic()
+
+        if not self.buffer:
+            return
+
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        self.buffered = 0
+
+        if self.binary is not None:
+            self.binary.write(text.encode(self.encoding, self.errors))
+            self.binary.flush()
+        else:
+            self.output.write(text)
+            self.output.flush()
+
+    def close(self) -> None:
+        """
+        Write out any buffered text, and stop the flush timer.
+        """
+        self.flush()
+
+    def __enter__(self) -> "StreamRenderer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def render_stream(stream: Iterable[str], output: TextIO | None = None) -> None:
+    """
+    Write a whole response stream to an output stream.
+
+    Parameters
+    ----------
+    stream : Iterable[str]
+        The response stream.
+    output : TextIO | None
+        The stream to write to. Defaults to `sys.stdout`.
+    """
+    with StreamRenderer(output) as renderer:
+        for fragment in stream:
+            renderer.write(fragment)
@@ -0,0 +1,273 @@
+"""
+A local BM25 index over files, used to send only the parts of a codebase that are relevant to the
+conversation instead of whole files.
+
+Files are split into chunks of consecutive lines, and the terms of each chunk are counted. The
+index is persisted as a JSON file, and updated incrementally: a file is only read again when its
+size or modification time changes. For each user turn, the chunks that best match the user's message
+(by BM25 score) are looked up in the files selected for retrieval, and sent as a context message
+just before it.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Iterable, Tuple
+
+from llmcli.attachments import GitIgnore, expand_path
+from llmcli.messages.file_message import read_file
+from llmcli.messages.message import Message
+from llmcli.util import get_cache_dir, normalize_path, write_file_atomic
+
+INDEX_VERSION = 1
+CHUNK_LINES = 40
+DEFAULT_TOP_K = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+# splits identifiers like get_completion, HTTPServer and parseJson into words
+TERM_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def get_default_index_path() -> str:
+    """
+    Get the default path of the retrieval index.
+
+    Returns
+    -------
+    str
+        `index.json` in the llmcli cache directory.
+    """
+    return get_cache_dir("index.json")
+
+
+def get_terms(text: str) -> list[str]:
+    """
+    Split text into lowercase search terms, dropping the plural "s" of longer words.
+
+    Parameters
+    ----------
+    text : str
+        The text to split.
+
+    Returns
+    -------
+    list[str]
+        The terms, in order.
+    """
+    terms = [term.lower() for term in TERM_PATTERN.findall(text)]
+
+    # a crude stemmer, so "invoices" matches "invoice"
+    return [
+        term[:-1] if len(term) > 3 and term.endswith("s") and not term.endswith("ss") else term
+        for term in terms
+    ]
+
+
+class RetrievalIndex:
+    """
+    A persistent index of the chunks of files and their term counts.
+
+    Parameters
+    ----------
+    path : str
+        The path of the index file. Created on first save.
+    chunk_lines : int
+        The number of lines in each chunk.
+    """
+    def __init__(self, path: str, chunk_lines: int = CHUNK_LINES) -> None:
+        self.path = path
+        self.chunk_lines = chunk_lines
+        self.files = {}
+        self.dirty = False
+
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == INDEX_VERSION and data.get("chunk_lines") == chunk_lines:
+            self.files = data.get("files", {})
+
+    def index_file(self, path: str) -> bool:
+        """
+        Add a file to the index, or update it if it was modified since it was indexed.
+
+        Parameters
+        ----------
+        path : str
+            The absolute path of the file.
+
+        Returns
+        -------
+        bool
+            True if the file is in the index, False if it couldn't be read or is a binary file.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.dirty = self.files.pop(path, None) is not None or self.dirty
+            return False
+
+        entry = self.files.get(path)
+
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and \
+                entry["size"] == stat.st_size:
+            return True
+
+        try:
+            lines = read_file(path).splitlines()
+        except (OSError, ValueError):
+            self.dirty = self.files.pop(path, None) is not None or self.dirty
+            return False
+
+        chunks = []
+
+        for start in range(0, len(lines), self.chunk_lines):
+            terms = get_terms("\n".join(lines[start:start + self.chunk_lines]))
+            # the first and last line of the chunk, counting from 1
+            chunks.append([start + 1, min(len(lines), start + self.chunk_lines), len(terms),
+                           dict(Counter(terms))])
+
+        self.files[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "chunks": chunks}
+        self.dirty = True
+        return True
+
+    def update(self, paths: Iterable[str]) -> list[str]:
+        """
+        Bring the index up to date for a set of files.
+
+        Parameters
+        ----------
+        paths : Iterable[str]
+            The file paths.
+
+        Returns
+        -------
+        list[str]
+            The absolute paths of the files in the index.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        return [path for path in paths if self.index_file(path)]
+
+    def save(self) -> None:
+        """
+        Write the index to its file, if it was changed.
+        """
+        if not self.dirty:
+            return
+
+        data = {"version": INDEX_VERSION, "chunk_lines": self.chunk_lines, "files": self.files}
+        write_file_atomic(self.path, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        self.dirty = False
+
+    def search(
+        self,
+        query: str,
+        paths: list[str],
+        top_k: int = DEFAULT_TOP_K,
+    ) -> list[Tuple[str, int, int, float]]:
+        """
+        Find the chunks of a set of indexed files that best match a query, by BM25 score.
+
+        Parameters
+        ----------
+        query : str
+            The query.
+        paths : list[str]
+            The absolute paths of the files to search (see `update`).
+        top_k : int
+            The maximum number of chunks to return.
+
+        Returns
+        -------
+        list[Tuple[str, int, int, float]]
+            The (path, first line, last line, score) of the matching chunks, best first.
+        """
+        query_terms = set(get_terms(query))
+        chunks = [
+            (path, chunk) for path in paths if path in self.files
+            for chunk in self.files[path]["chunks"]
+        ]
+
+        if not query_terms or not chunks:
+            return []
+
+        average_length = sum(chunk[2] for _, chunk in chunks) / len(chunks) or 1
+        frequencies = Counter(term for _, chunk in chunks for term in query_terms & chunk[3].keys())
+        weights = {
+            term: math.log(1 + (len(chunks) - count + 0.5) / (count + 0.5))
+            for term, count in frequencies.items()
+        }
+        results = []
+
+        for path, (first, last, length, counts) in chunks:
+            score = 0.0
+
+            for term, weight in weights.items():
+                count = counts.get(term)
+
+                if count:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    score += weight * count * (BM25_K1 + 1) / (count + norm)
+
+            if score > 0:
+                results.append((path, first, last, score))
+
+        results.sort(key=lambda result: result[3], reverse=True)
+        return results[:top_k]
+
+
+def get_chunk_text(path: str, first: int, last: int) -> str:
+    """
+    Read lines `first` to `last` of a file, counting from 1.
+    """
+    return "\n".join(read_file(path).splitlines()[first - 1:last])
+
+
+def get_context_message(
+    index: RetrievalIndex,
+    specs: list[str],
+    query: str,
+    top_k: int = DEFAULT_TOP_K,
+) -> Message | None:
+    """
+    Build a message containing the chunks of a set of files that are most relevant to a query.
+    The index is brought up to date (and saved) first.
+
+    Parameters
+    ----------
+    index : RetrievalIndex
+        The index.
+    specs : list[str]
+        The files, directories and glob patterns to search (see `llmcli.attachments`).
+    query : str
+        The query, usually the user's latest message.
+    top_k : int
+        The maximum number of chunks to include.
+
+    Returns
+    -------
+    Message | None
+        The context message, or None if nothing matches.
+    """
+    gitignore = GitIgnore()
+    paths = index.update(path for spec in specs for path in expand_path(spec, gitignore))
+    index.save()
+    results = index.search(query, paths, top_k)
+
+    if not results:
+        return None
+
+    sections = [
+        f"#### {normalize_path(path)}:{first}-{last}\n\n```\n"
+        f"{get_chunk_text(path, first, last)}\n```"
+        for path, first, last, _ in results
+    ]
+
+    return Message(
+        role="user",
+        content="### CONTEXT: excerpts of files relevant to the next message\n\n"
+        + "\n\n".join(sections),
+    )
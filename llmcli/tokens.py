@@ -0,0 +1,89 @@
+"""
+Local token estimation and context-window trimming.
+
+Token counts are estimated without a tokenizer: ASCII text averages about four characters per
+token, while other characters (accented letters, CJK, emoji, ...) are counted as one token each.
+This overestimates more often than not, which is the safe direction when deciding what fits in a
+context window.
+"""
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from llmcli.messages.message import Message
+
+CHARS_PER_TOKEN = 4
+MESSAGE_TOKEN_OVERHEAD = 4
+IMAGE_TOKENS = 1600
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Parameters
+    ----------
+    text : str
+        The text to estimate.
+
+    Returns
+    -------
+    int
+        The estimated number of tokens.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return -(-ascii_chars // CHARS_PER_TOKEN) + len(text) - ascii_chars
+
+
+def trim_messages(messages: list["Message"], budget: int | None) -> list["Message"]:
+    """
+    Drop the oldest messages from a conversation until its estimated size fits in a token budget.
+
+    System messages, pinned messages and the last message are never dropped. If the conversation
+    doesn't fit even without all other messages, it is returned without them.
+
+    Parameters
+    ----------
+    messages : list[Message]
+        The conversation.
+    budget : int | None
+        The maximum number of tokens, or None for no limit.
+
+    Returns
+    -------
+    list[Message]
+        The trimmed conversation. If nothing was dropped, this is `messages` itself.
+    """
+    if budget is None or not messages:
+        return messages
+
+    estimates = [message.estimate_tokens() for message in messages]
+    total = sum(estimates)
+
+    if total <= budget:
+        return messages
+
+    last = len(messages) - 1
+    keep = [True] * len(messages)
+
+    def droppable(i: int) -> bool:
+        return i != last and messages[i].role != "system" and not messages[i].pinned
+
+    for i, estimate in enumerate(estimates):
+        if total <= budget:
+            break
+
+        if droppable(i):
+            keep[i] = False
+            total -= estimate
+
+    # don't leave the conversation starting with an assistant response to a dropped message
+    for i, message in enumerate(messages):
+        if not keep[i] or message.role == "system":
+            continue
+
+        if message.role != "assistant" or not droppable(i):
+            break
+
+        keep[i] = False
+
+    return [message for i, message in enumerate(messages) if keep[i]]
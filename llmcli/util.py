@@ -1,9 +1,10 @@
 """
-Utility functions for handling file paths, MIME types, and API parameter parsing.
+Utility functions for handling file paths, cache directories, and MIME types.
 """
 
 import mimetypes
 import os
+import tempfile
 
 
 def get_mime_type(image_path: str) -> str:
@@ -23,6 +24,36 @@ def get_mime_type(image_path: str) -> str:
     mime_type, _ = mimetypes.guess_type(image_path)
     return mime_type
 
+def parse_bool(value: str | bool) -> bool:
+    """
+    Parse a boolean option value, such as "on", "true", "yes" or "1".
+
+    Parameters
+    ----------
+    value : str | bool
+        The option value.
+
+    Returns
+    -------
+    bool
+        The parsed value.
+
+    Raises
+    ------
+    ValueError
+        If the value is not a recognized boolean.
+    """
+    if isinstance(value, bool):
+        return value
+
+    if value.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+
+    if value.strip().lower() in ("0", "false", "no", "off"):
+        return False
+
+    raise ValueError(f"Invalid boolean value: {value}")
+
 def normalize_path(path: str) -> str:
     """
     Normalize a file path to a relative path from the current working directory.
@@ -41,3 +72,44 @@ def normalize_path(path: str) -> str:
         os.path.normpath(os.path.abspath(os.path.realpath(os.path.expanduser(path)))),
         os.getcwd(),
     )
+
+def get_cache_dir(name: str) -> str:
+    """
+    Get the path of an llmcli cache directory.
+
+    Parameters
+    ----------
+    name : str
+        The name of the cache directory.
+
+    Returns
+    -------
+    str
+        `$XDG_CACHE_HOME/llmcli/<name>`, or `~/.cache/llmcli/<name>` if XDG_CACHE_HOME is not set.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "llmcli", name)
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    """
+    Write a file by writing to a temporary file and renaming it into place, so other processes
+    never see a partially-written file. Creates the parent directory if necessary.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to write.
+    data : bytes
+        The file contents.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
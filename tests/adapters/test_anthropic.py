@@ -1,10 +1,15 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
+import asyncio
 import re
 
 from llmcli.adapters.anthropic import AnthropicApiAdapter
+from llmcli.messages.file_message import FileMessage
+from llmcli.messages.message import Message
 from tests.fixtures.messages import get_test_messages
 
+EPHEMERAL = {"type": "ephemeral"}
+
 
 def mock_response_stream(response_str):
     for token in re.split(r"(\s+)", response_str):
@@ -37,7 +42,9 @@ def get_sanity_checked_adapter(messages):
     assert "".join(stream) == test_message
     assert message.content == test_message
 
-    mock_Anthropic.assert_called_with(api_key=test_params["api_key"])
+    mock_Anthropic.assert_called_with(
+        api_key=test_params["api_key"], max_retries=0, http_client=ANY
+    )
 
     return adapter
 
@@ -51,7 +58,9 @@ def test_anthropic_api_adapter_text_only():
         model="claude-3-7-sonnet-latest",
         temperature=1.7,
         top_p=0.9,
-        system="You are an assistant.",
+        system=[
+            {"type": "text", "text": "You are an assistant.", "cache_control": EPHEMERAL},
+        ],
         messages=[
             {
                 "role": "assistant",
@@ -66,7 +75,9 @@ def test_anthropic_api_adapter_text_only():
             },
             {
                 "role": "assistant",
-                "content": [{"type": "text", "text": "I am fine, thank you!"}],
+                "content": [
+                    {"type": "text", "text": "I am fine, thank you!", "cache_control": EPHEMERAL},
+                ],
             },
         ],
         stream=True,
@@ -82,7 +93,9 @@ def test_anthropic_api_adapter_image():
         model="claude-3-7-sonnet-latest",
         temperature=1.7,
         top_p=0.9,
-        system="You are an assistant.",
+        system=[
+            {"type": "text", "text": "You are an assistant.", "cache_control": EPHEMERAL},
+        ],
         messages=[
             {
                 "role": "user",
@@ -101,7 +114,9 @@ def test_anthropic_api_adapter_image():
             },
             {
                 "role": "assistant",
-                "content": [{"type": "text", "text": "What a lovely image!"}],
+                "content": [
+                    {"type": "text", "text": "What a lovely image!", "cache_control": EPHEMERAL},
+                ],
             },
         ],
         stream=True,
@@ -117,7 +132,9 @@ def test_anthropic_api_adapter_file():
         model="claude-3-7-sonnet-latest",
         temperature=1.7,
         top_p=0.9,
-        system="You are an assistant.",
+        system=[
+            {"type": "text", "text": "You are an assistant.", "cache_control": EPHEMERAL},
+        ],
         messages=[
             {
                 "role": "user",
@@ -131,8 +148,169 @@ def test_anthropic_api_adapter_file():
             },
             {
                 "role": "assistant",
-                "content": [{"type": "text", "text": "What a lovely file!"}],
+                "content": [
+                    {"type": "text", "text": "What a lovely file!", "cache_control": EPHEMERAL},
+                ],
             },
         ],
         stream=True,
     )
+
+
+async def mock_response_stream_async(response_str):
+    yield MagicMock(type="message_start")
+
+    for chunk in mock_response_stream(response_str):
+        yield chunk
+
+
+def test_anthropic_api_adapter_async():
+    test_message = "this is a test"
+    messages = get_test_messages()
+
+    with patch("llmcli.adapters.anthropic.anthropic.Anthropic"), patch(
+        "llmcli.adapters.anthropic.anthropic.AsyncAnthropic"
+    ) as mock_AsyncAnthropic:
+        adapter = AnthropicApiAdapter({"api_key": "sk-ant-test"})
+        create = mock_AsyncAnthropic.return_value.messages.create = AsyncMock(
+            side_effect=lambda *args, **kwargs: mock_response_stream_async(test_message)
+        )
+
+        async def run():
+            stream, message = await adapter.get_completion_async(messages)
+            assert message.content != test_message
+            return "".join([fragment async for fragment in stream]), message
+
+        output, message = asyncio.run(run())
+
+    assert output == test_message
+    assert message.content == test_message
+    mock_AsyncAnthropic.assert_called_once_with(
+        api_key="sk-ant-test", max_retries=0, http_client=ANY
+    )
+    assert create.call_args.kwargs == adapter.get_request(messages)
+
+
+def test_anthropic_prompt_caching_breakpoints():
+    with patch("llmcli.adapters.anthropic.anthropic.Anthropic"):
+        adapter = AnthropicApiAdapter({"prompt_cache_min_chars": "100"})
+
+    big_files = [
+        FileMessage(role="user", file_path=f"big{i}.txt", file_content="x" * 100) for i in range(3)
+    ]
+    messages = get_test_messages() + [
+        FileMessage(role="user", file_path="small.txt", file_content="x"),
+        *big_files,
+        Message(role="user", content="Review these files."),
+    ]
+
+    request = adapter.get_request(messages)
+    blocks = [block for message in request["messages"] for block in message["content"]]
+    cached = [block for block in blocks if "cache_control" in block]
+
+    assert request["system"][0]["cache_control"] == EPHEMERAL
+    # only the last two large files, plus the end of the conversation
+    assert [block["text"].splitlines()[0] for block in cached] == [
+        "### FILE: big1.txt", "### FILE: big2.txt", "Review these files."
+    ]
+
+
+def test_anthropic_prompt_caching_off():
+    with patch("llmcli.adapters.anthropic.anthropic.Anthropic"):
+        adapter = AnthropicApiAdapter({"prompt_caching": "off"})
+
+    request = adapter.get_request(get_test_messages(file=True))
+
+    assert request["system"] == "You are an assistant."
+    assert not any(
+        "cache_control" in block
+        for message in request["messages"]
+        for block in message["content"]
+    )
+
+
+def test_anthropic_usage_recorded():
+    test_message = "this is a test"
+    adapter, _ = get_adapter_with_mock_client({}, test_message)
+
+    def stream_with_usage(*args, **kwargs):
+        yield MagicMock(
+            type="message_start",
+            message=MagicMock(
+                usage=MagicMock(
+                    input_tokens=10,
+                    output_tokens=1,
+                    cache_creation_input_tokens=0,
+                    cache_read_input_tokens=2048,
+                ),
+            ),
+        )
+        yield from mock_response_stream(test_message)
+        yield MagicMock(type="message_delta", usage=MagicMock(output_tokens=4))
+
+    adapter.client.messages.create.side_effect = stream_with_usage
+    stream, message = adapter.get_completion(get_test_messages())
+
+    assert "".join(stream) == test_message
+    assert message.extra["usage"] == {
+        "input_tokens": 10,
+        "output_tokens": 4,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 2048,
+    }
+
+
+def test_anthropic_incremental_merge():
+    with patch("llmcli.adapters.anthropic.anthropic.Anthropic"):
+        adapter = AnthropicApiAdapter({"prompt_cache_min_chars": "1"})
+
+    conversation = get_test_messages(file=True, image=True)
+    calls = [
+        conversation[:3],
+        conversation[:5],
+        conversation,
+        conversation[:4],  # a shorter prefix, e.g. after trimming
+        conversation[:2] + conversation[6:],  # a different conversation sharing a prefix
+        conversation,
+    ]
+
+    for messages in calls:
+        with patch("llmcli.adapters.anthropic.anthropic.Anthropic"):
+            fresh = AnthropicApiAdapter({"prompt_cache_min_chars": "1"})
+
+        assert adapter.get_request(messages) == fresh.get_request(messages)
+
+
+def test_anthropic_request_does_not_modify_converted_messages():
+    with patch("llmcli.adapters.anthropic.anthropic.Anthropic"):
+        adapter = AnthropicApiAdapter({"prompt_cache_min_chars": "1"})
+
+    messages = get_test_messages(file=True)
+    adapter.get_request(messages)
+
+    for message in messages[1:]:
+        for block in adapter.get_converted_message(message)["content"]:
+            assert "cache_control" not in block
+
+    # the previous end of the conversation no longer has a breakpoint
+    messages = messages + [Message(role="user", content="Anything else?")]
+    request = adapter.get_request(messages)
+    cached = [
+        block["text"] for message in request["messages"] for block in message["content"]
+        if "cache_control" in block
+    ]
+
+    assert cached == ["### FILE: test.txt\n\n```\ni'm a file =3\n```", "Anything else?"]
+
+
+def test_anthropic_merge_state_does_not_keep_images():
+    with patch("llmcli.adapters.anthropic.anthropic.Anthropic"):
+        adapter = AnthropicApiAdapter({})
+
+    messages = get_test_messages(system=False, text=False, image=True)
+    adapter.get_request(messages)
+    request = adapter.get_request(messages + [Message(role="user", content="Anything else?")])
+
+    assert request["messages"][0]["content"][1]["source"]["data"] == messages[0].image_content
+    assert adapter._merge_state["merged"][0]["content"][1] is None
+    assert id(messages[0]) not in adapter._converted_messages
@@ -1,6 +1,275 @@
-from llmcli.adapters import parse_api_params
+import asyncio
+import gc
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from llmcli.adapters import parse_adapter_spec, parse_api_params
+from llmcli.adapters.base import ApiAdapterOption, BaseApiAdapter
+from llmcli.messages.message import Message
+from tests.fixtures.messages import get_test_messages
 
 def test_parse_api_params():
     params = ["param1=value1", "param2=value2", "param3=val=ue=3"]
     expected_result = {"param1": "value1", "param2": "value2", "param3": "val=ue=3"}
-    assert parse_api_params(params) == expected_result
\ No newline at end of file
+    assert parse_api_params(params) == expected_result
+
+def test_parse_adapter_spec():
+    assert parse_adapter_spec("ollama") == ("ollama", [])
+    assert parse_adapter_spec("anthropic:model=claude,temperature=0.2") == (
+        "anthropic",
+        ["model=claude", "temperature=0.2"],
+    )
+
+    with pytest.raises(ValueError):
+        parse_adapter_spec("nope:model=x")
+
+    with pytest.raises(ValueError):
+        parse_adapter_spec("openai:model")
+
+
+class ConvertingAdapter(BaseApiAdapter):
+    def __init__(self, params):
+        super().__init__(params)
+        self.converted = []
+
+    def convert_message(self, message):
+        self.converted.append(message)
+        return {"role": message.role, "content": message.content}
+
+
+def test_get_converted_message_memoized():
+    adapter = ConvertingAdapter({})
+    messages = get_test_messages()
+
+    first = [adapter.get_converted_message(m) for m in messages]
+    messages.append(Message(role="user", content="And now?"))
+    second = [adapter.get_converted_message(m) for m in messages]
+
+    assert adapter.converted == messages
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_get_converted_message_content_changed():
+    adapter = ConvertingAdapter({})
+    message = Message(role="assistant", content="")
+
+    assert adapter.get_converted_message(message)["content"] == ""
+    message.content += "streamed"
+    assert adapter.get_converted_message(message)["content"] == "streamed"
+
+
+def test_get_converted_message_released():
+    adapter = ConvertingAdapter({})
+    adapter.get_converted_message(Message(content="temporary"))
+    adapter.converted.clear()
+    gc.collect()
+
+    assert adapter._converted_messages == {}
+
+
+class StreamingAdapter(BaseApiAdapter):
+    @staticmethod
+    def get_fragment(chunk):
+        return chunk
+
+
+def test_output_stream():
+    message = Message(role="assistant", content="")
+    stream = StreamingAdapter.output_stream(iter(["a", None, "b", "c"]), message)
+
+    assert list(stream) == ["a", "b", "c"]
+    assert message.content == "abc"
+
+
+def test_output_stream_closed():
+    message = Message(role="assistant", content="")
+    stream = StreamingAdapter.output_stream(iter(["a", "b", "c"]), message)
+
+    assert next(stream) == "a"
+    assert next(stream) == "b"
+    stream.close()
+
+    assert message.content == "ab"
+
+
+def test_output_stream_async():
+    async def chunks():
+        for chunk in ["a", None, "b"]:
+            yield chunk
+
+    async def consume():
+        message = Message(role="assistant", content="")
+        stream = StreamingAdapter.output_stream_async(chunks(), message)
+        return [fragment async for fragment in stream], message
+
+    fragments, message = asyncio.run(consume())
+
+    assert fragments == ["a", "b"]
+    assert message.content == "ab"
+
+
+class HttpError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class RetryingAdapter(StreamingAdapter):
+    OPTIONS = [
+        ApiAdapterOption(name="max_retries", hr_name="Max Retries", description="", default=3)
+    ]
+
+    def __init__(self, params, attempts):
+        super().__init__(params)
+        self.attempts = list(attempts)
+        self.opened = 0
+
+    def next_attempt(self):
+        self.opened += 1
+        attempt = self.attempts.pop(0)
+
+        if isinstance(attempt, Exception):
+            raise attempt
+
+        return attempt
+
+    def open_stream(self, input_messages):
+        attempt = self.next_attempt()
+
+        def stream():
+            for chunk in attempt:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+
+        return stream()
+
+    async def open_stream_async(self, input_messages):
+        attempt = self.next_attempt()
+
+        async def stream():
+            for chunk in attempt:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+
+        return stream()
+
+
+def test_retry_open_errors():
+    adapter = RetryingAdapter({}, [
+        HttpError(429, {"retry-after": "7"}),
+        HttpError(503, {"retry-after-ms": "250"}),
+        ConnectionError(),
+        ["a", "b"],
+    ])
+
+    with patch("llmcli.adapters.base.time.sleep") as sleep:
+        stream, message = adapter.get_completion([])
+        assert list(stream) == ["a", "b"]
+
+    delays = [c.args[0] for c in sleep.call_args_list]
+
+    assert delays[:2] == [7, 0.25]
+    assert 2 <= delays[2] <= 4
+    assert message.content == "ab"
+    assert adapter.opened == 4
+
+
+def test_retry_stream_before_text():
+    adapter = RetryingAdapter({}, [
+        [None, ConnectionError()],
+        [None, "a", "b"],
+    ])
+
+    with patch("llmcli.adapters.base.time.sleep"):
+        stream, message = adapter.get_completion([])
+        assert list(stream) == ["a", "b"]
+
+    assert message.content == "ab"
+    assert adapter.opened == 2
+
+
+def test_no_retry_after_text():
+    adapter = RetryingAdapter({}, [["a", ConnectionError()], ["a", "b"]])
+    stream, message = adapter.get_completion([])
+
+    with patch("llmcli.adapters.base.time.sleep"), pytest.raises(ConnectionError):
+        list(stream)
+
+    assert message.content == "a"
+    assert adapter.opened == 1
+
+
+def test_no_retry_errors():
+    adapter = RetryingAdapter({}, [HttpError(400), ["a"]])
+
+    with pytest.raises(HttpError):
+        adapter.get_completion([])
+
+    adapter = RetryingAdapter({"max_retries": "1"}, [HttpError(500), HttpError(500), ["a"]])
+
+    with patch("llmcli.adapters.base.time.sleep"), pytest.raises(HttpError):
+        adapter.get_completion([])
+
+    assert adapter.opened == 2
+
+
+def test_get_retry_after():
+    def get_retry_after(headers):
+        return BaseApiAdapter.get_retry_after(HttpError(429, headers))
+
+    assert get_retry_after({}) is None
+    assert get_retry_after({"retry-after": "2.5"}) == 2.5
+    assert get_retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert get_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert get_retry_after({"retry-after": "soon"}) is None
+    assert BaseApiAdapter.get_retry_after(ConnectionError()) is None
+
+
+def test_retry_async():
+    adapter = RetryingAdapter({}, [HttpError(529), [None, TimeoutError()], ["a", "b"]])
+
+    async def complete():
+        stream, message = await adapter.get_completion_async([])
+        return [fragment async for fragment in stream], message
+
+    with patch("llmcli.adapters.base.asyncio.sleep", AsyncMock()) as sleep:
+        fragments, message = asyncio.run(complete())
+
+    assert fragments == ["a", "b"]
+    assert message.content == "ab"
+    assert sleep.await_count == 2
+
+
+class ImageAdapter(BaseApiAdapter):
+    OPTIONS = [
+        ApiAdapterOption(name="image_resize", hr_name="", description="", default="off"),
+        ApiAdapterOption(name="image_max_size", hr_name="", description=""),
+        ApiAdapterOption(name="image_quality", hr_name="", description=""),
+    ]
+    IMAGE_MAX_SIZE = (2048, 768)
+
+
+def test_get_image():
+    message = get_test_messages(text=False, image=True)[1]
+    original = (message.image_type, message.image_content)
+
+    with patch("llmcli.adapters.base.prepare_image", return_value=("image/jpeg", "x")) as prepare:
+        assert ImageAdapter({}).get_image(message) == original
+        prepare.assert_not_called()
+
+        assert ImageAdapter({"image_resize": "on"}).get_image(message) == ("image/jpeg", "x")
+        prepare.assert_called_with(message, (2048, 768), 85)
+
+        ImageAdapter({"image_resize": "on", "image_max_size": "512", "image_quality": "70"}) \
+            .get_image(message)
+        prepare.assert_called_with(message, (512, 512), 70)
+
+        # without a known maximum size, images are left alone
+        unknown_size = type("UnknownSizeAdapter", (ImageAdapter,), {"IMAGE_MAX_SIZE": None})
+        assert unknown_size({"image_resize": "on"}).get_image(message) == original
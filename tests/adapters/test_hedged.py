@@ -0,0 +1,229 @@
+import asyncio
+import threading
+
+import pytest
+
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.adapters.hedged import HedgedApiAdapter
+from llmcli.messages.message import Message
+from tests.fixtures.messages import get_test_messages
+
+
+class FakeAdapter(BaseApiAdapter):
+    NAME = "fake"
+
+    def __init__(self, fragments, stall=None, error=None):
+        super().__init__({})
+        self.fragments = fragments
+        self.stall = stall
+        self.error = error
+        self.calls = 0
+        self.closed = threading.Event()
+
+    def get_display_name(self):
+        return self.fragments[0]
+
+    def get_completion(self, input_messages):
+        self.calls += 1
+
+        if self.error is not None:
+            raise self.error
+
+        message = Message(role="assistant", content="")
+
+        def stream():
+            try:
+                yield ""
+
+                if self.stall is not None:
+                    self.stall.wait()
+
+                for fragment in self.fragments:
+                    message.content += fragment
+                    yield fragment
+            finally:
+                self.closed.set()
+
+        return stream(), message
+
+    async def get_completion_async(self, input_messages):
+        self.calls += 1
+
+        if self.error is not None:
+            raise self.error
+
+        message = Message(role="assistant", content="")
+
+        async def stream():
+            if self.stall is not None:
+                await asyncio.sleep(10)
+
+            for fragment in self.fragments:
+                message.content += fragment
+                yield fragment
+
+        return stream(), message
+
+
+class ProviderStream:
+    """
+    A provider stream that can stall until it is closed, like an SDK stream over HTTP.
+    """
+    def __init__(self, chunks, stall=False):
+        self.chunks = iter(chunks)
+        self.stall = stall
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.stall:
+            self.closed.wait()
+
+        if self.closed.is_set():
+            raise RuntimeError("stream closed")
+
+        return next(self.chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.stall:
+            await asyncio.sleep(10)
+
+        try:
+            return next(self.chunks)
+        except StopIteration as ex:
+            raise StopAsyncIteration from ex
+
+    def close(self):
+        self.closed.set()
+
+
+class StreamingAdapter(BaseApiAdapter):
+    NAME = "streaming"
+
+    def __init__(self, stream):
+        super().__init__({})
+        self.stream = stream
+
+    @staticmethod
+    def get_fragment(chunk):
+        return chunk
+
+    def open_stream(self, input_messages):
+        return self.stream
+
+    async def open_stream_async(self, input_messages):
+        return self.stream
+
+
+def test_hedged_primary_fast():
+    primary = FakeAdapter(["primary"])
+    backup = FakeAdapter(["backup"])
+    adapter = HedgedApiAdapter(primary, backup, delay=5)
+
+    stream, message = adapter.get_completion(get_test_messages())
+
+    assert "".join(stream) == "primary"
+    assert message.content == "primary"
+    assert message.extra["hedge"]["winner"] == "primary"
+    assert not message.extra["hedge"]["hedged"]
+    assert backup.calls == 0
+
+
+def test_hedged_primary_stalled():
+    stall = threading.Event()
+    primary = FakeAdapter(["primary"], stall=stall)
+    backup = FakeAdapter(["backup"])
+    adapter = HedgedApiAdapter(primary, backup, delay=0.01)
+
+    stream, message = adapter.get_completion(get_test_messages())
+
+    assert "".join(stream) == "backup"
+    assert message.extra["hedge"]["winner"] == "backup"
+    assert message.extra["hedge"]["hedged"]
+
+    # the stalled request is closed once it returns
+    stall.set()
+    assert primary.closed.wait(5)
+
+
+def test_hedged_stalled_stream_closed():
+    primary_stream = ProviderStream(["primary"], stall=True)
+    adapter = HedgedApiAdapter(
+        StreamingAdapter(primary_stream), StreamingAdapter(ProviderStream(["backup"])), delay=0.01
+    )
+
+    stream, _ = adapter.get_completion(get_test_messages())
+
+    # the stalled provider stream is closed without waiting for it to return
+    assert primary_stream.closed.wait(5)
+    assert "".join(stream) == "backup"
+
+
+def test_hedged_async_stalled_stream_closed():
+    primary_stream = ProviderStream(["primary"], stall=True)
+    adapter = HedgedApiAdapter(
+        StreamingAdapter(primary_stream), StreamingAdapter(ProviderStream(["backup"])), delay=0.01
+    )
+
+    async def run():
+        stream, _ = await adapter.get_completion_async(get_test_messages())
+        assert primary_stream.closed.is_set()
+        return "".join([fragment async for fragment in stream])
+
+    assert asyncio.run(run()) == "backup"
+
+
+def test_hedged_primary_failed():
+    primary = FakeAdapter(["primary"], error=RuntimeError("primary"))
+    backup = FakeAdapter(["backup"])
+    adapter = HedgedApiAdapter(primary, backup, delay=5)
+
+    stream, message = adapter.get_completion(get_test_messages())
+
+    assert "".join(stream) == "backup"
+    assert message.extra["hedge"]["winner"] == "backup"
+
+    backup.error = RuntimeError("backup")
+
+    with pytest.raises(RuntimeError, match="primary"):
+        adapter.get_completion(get_test_messages())
+
+
+def test_hedged_async():
+    primary = FakeAdapter(["primary"], stall=True)
+    backup = FakeAdapter(["backup"])
+    adapter = HedgedApiAdapter(primary, backup, delay=0.01)
+
+    async def run():
+        stream, message = await adapter.get_completion_async(get_test_messages())
+        return "".join([fragment async for fragment in stream]), message
+
+    output, message = asyncio.run(run())
+
+    assert output == "backup"
+    assert message.extra["hedge"]["winner"] == "backup"
+
+    primary.stall = None
+    output, message = asyncio.run(run())
+
+    assert output == "primary"
+    assert message.extra["hedge"]["winner"] == "primary"
+
+
+def test_hedged_config():
+    primary = FakeAdapter(["primary"])
+    backup = FakeAdapter(["backup"])
+    adapter = HedgedApiAdapter(primary, backup, delay=1.5)
+
+    assert adapter.get_display_name() == "primary (hedged with backup)"
+    assert adapter.get_masked_config() == {
+        "primary": {"adapter": "fake"},
+        "backup": {"adapter": "fake"},
+        "delay": 1.5,
+    }
+    assert adapter.get_context_budget() is None
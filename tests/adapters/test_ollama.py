@@ -1,12 +1,23 @@
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
+import asyncio
 import re
+import weakref
+
+import pytest
 
 from llmcli.adapters.ollama import OllamaApiAdapter
 from tests.fixtures.messages import get_test_messages
 from ollama import Options
 
 
+@pytest.fixture(autouse=True)
+def shared_clients(monkeypatch):
+    # keep mock clients out of the shared client pool
+    monkeypatch.setattr("llmcli.adapters.pool.SHARED_CLIENTS", {})
+    monkeypatch.setattr("llmcli.adapters.pool.SHARED_ASYNC_CLIENTS", weakref.WeakKeyDictionary())
+
+
 def mock_response_stream(response_str):
     for token in re.split(r"(\s+)", response_str):
         yield {"message": {"content": token}}
@@ -40,9 +51,10 @@ def sanity_check_adapter(messages, test_message):
     return adapter
 
 
-@patch("llmcli.adapters.ollama.ollama.chat")
-def test_ollama_api_adapter_text_only(mock_chat):
+@patch("llmcli.adapters.ollama.ollama.Client")
+def test_ollama_api_adapter_text_only(mock_Client):
     test_message = "this is a test"
+    mock_chat = mock_Client.return_value.chat
     mock_chat.side_effect = lambda *args, **kwargs: mock_response_stream(test_message)
     messages = get_test_messages()
     sanity_check_adapter(messages, test_message)
@@ -69,13 +81,15 @@ def test_ollama_api_adapter_text_only(mock_chat):
             mirostat_tau=0.8,
             mirostat_eta=0.6,
         ),
+        keep_alive=None,
         stream=True,
     )
 
 
-@patch("llmcli.adapters.ollama.ollama.chat")
-def test_ollama_api_adapter_image(mock_chat):
+@patch("llmcli.adapters.ollama.ollama.Client")
+def test_ollama_api_adapter_image(mock_Client):
     test_message = "this is a test"
+    mock_chat = mock_Client.return_value.chat
     mock_chat.side_effect = lambda *args, **kwargs: mock_response_stream(test_message)
     messages = get_test_messages(text=False, image=True)
     sanity_check_adapter(messages, test_message)
@@ -107,13 +121,15 @@ def test_ollama_api_adapter_image(mock_chat):
             mirostat_tau=0.8,
             mirostat_eta=0.6,
         ),
+        keep_alive=None,
         stream=True,
     )
 
 
-@patch("llmcli.adapters.ollama.ollama.chat")
-def test_ollama_api_adapter_file(mock_chat):
+@patch("llmcli.adapters.ollama.ollama.Client")
+def test_ollama_api_adapter_file(mock_Client):
     test_message = "this is a test"
+    mock_chat = mock_Client.return_value.chat
     mock_chat.side_effect = lambda *args, **kwargs: mock_response_stream(test_message)
     messages = get_test_messages(text=False, file=True)
     sanity_check_adapter(messages, test_message)
@@ -142,5 +158,68 @@ def test_ollama_api_adapter_file(mock_chat):
             mirostat_tau=0.8,
             mirostat_eta=0.6,
         ),
+        keep_alive=None,
         stream=True,
     )
+
+
+@patch("llmcli.adapters.ollama.ollama.Client")
+def test_ollama_api_adapter_host_and_keep_alive(mock_Client):
+    mock_chat = mock_Client.return_value.chat
+    mock_chat.side_effect = lambda *args, **kwargs: mock_response_stream("ok")
+    adapter = OllamaApiAdapter(
+        {"model": "gemma3", "host": "http://gpu-box:11434", "keep_alive": "-1"}
+    )
+    stream, _ = adapter.get_completion(get_test_messages())
+    assert "".join(stream) == "ok"
+
+    mock_Client.assert_called_once_with(host="http://gpu-box:11434")
+    assert mock_chat.call_args.kwargs["keep_alive"] == -1
+
+    # adapters for the same host share a client
+    OllamaApiAdapter({"model": "llama3", "host": "http://gpu-box:11434", "keep_alive": "30m"})
+    assert mock_Client.call_count == 1
+    assert OllamaApiAdapter({"model": "gemma3", "keep_alive": "30m"}).get_keep_alive() == "30m"
+
+
+@patch("llmcli.adapters.ollama.ollama.Client")
+def test_ollama_api_adapter_preload(mock_Client):
+    mock_chat = mock_Client.return_value.chat
+
+    adapter = OllamaApiAdapter({"model": "gemma3"})
+    assert adapter.preload_thread is None
+
+    adapter = OllamaApiAdapter({"model": "gemma3", "preload": "on", "keep_alive": "10m"})
+    adapter.preload_thread.join()
+    mock_chat.assert_called_once_with(model="gemma3", messages=[], keep_alive="10m")
+
+    # a failed preload is left for the first request to report
+    mock_chat.side_effect = ConnectionError()
+    adapter = OllamaApiAdapter({"model": "gemma3", "preload": "on"})
+    adapter.preload_thread.join()
+
+
+async def mock_response_stream_async(response_str):
+    for chunk in mock_response_stream(response_str):
+        yield chunk
+
+
+@patch("llmcli.adapters.ollama.ollama.AsyncClient")
+def test_ollama_api_adapter_async(mock_AsyncClient):
+    test_message = "this is a test"
+    messages = get_test_messages()
+    adapter = OllamaApiAdapter({"model": "gemma3"})
+    chat = mock_AsyncClient.return_value.chat = AsyncMock(
+        side_effect=lambda *args, **kwargs: mock_response_stream_async(test_message)
+    )
+
+    async def run():
+        stream, message = await adapter.get_completion_async(messages)
+        assert message.content != test_message
+        return "".join([fragment async for fragment in stream]), message
+
+    output, message = asyncio.run(run())
+
+    assert output == test_message
+    assert message.content == test_message
+    assert chat.call_args.kwargs == adapter.get_request(messages)
@@ -1,5 +1,6 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
+import asyncio
 import re
 
 from llmcli.adapters.openai import OpenAiApiAdapter
@@ -41,7 +42,9 @@ def get_sanity_checked_adapter(messages):
     assert "".join(stream) == test_message
     assert message.content == test_message
 
-    mock_OpenAI.call_args.assert_called_with(api_key=test_params["api_key"])
+    mock_OpenAI.assert_called_with(
+        api_key=test_params["api_key"], max_retries=0, http_client=ANY
+    )
 
     return adapter
 
@@ -122,3 +125,35 @@ def test_openai_api_adapter_file():
         frequency_penalty=-1.1,
         presence_penalty=-0.998,
     )
+
+
+async def mock_response_stream_async(response_str):
+    for chunk in mock_response_stream(response_str):
+        yield chunk
+
+
+def test_openai_api_adapter_async():
+    test_message = "this is a test"
+    messages = get_test_messages()
+
+    with patch("llmcli.adapters.openai.OpenAI"), patch(
+        "llmcli.adapters.openai.AsyncOpenAI"
+    ) as mock_AsyncOpenAI:
+        adapter = OpenAiApiAdapter({"api_key": "sk-test", "model": "chatgpt-4o-latest"})
+        create = mock_AsyncOpenAI.return_value.chat.completions.create = AsyncMock(
+            side_effect=lambda *args, **kwargs: mock_response_stream_async(test_message)
+        )
+
+        async def run():
+            stream, message = await adapter.get_completion_async(messages)
+            assert message.content != test_message
+            return "".join([fragment async for fragment in stream]), message
+
+        output, message = asyncio.run(run())
+
+    assert output == test_message
+    assert message.content == test_message
+    mock_AsyncOpenAI.assert_called_once_with(
+        api_key="sk-test", max_retries=0, http_client=ANY
+    )
+    assert create.call_args.kwargs == adapter.get_request(messages)
@@ -0,0 +1,68 @@
+import asyncio
+
+from unittest.mock import patch
+
+import httpx
+
+from llmcli.adapters.anthropic import AnthropicApiAdapter
+from llmcli.adapters.openai import OpenAiApiAdapter
+from llmcli.adapters.pool import get_limits, get_shared_async_client, get_shared_client
+
+
+def get_http_client(adapter_class, mock_path, params):
+    with patch(mock_path) as mock_client:
+        adapter_class(params)
+
+    return mock_client.call_args.kwargs["http_client"]
+
+
+def test_adapters_share_http_client():
+    client = get_http_client(
+        OpenAiApiAdapter, "llmcli.adapters.openai.OpenAI", {"model": "a", "api_key": "1"}
+    )
+
+    assert client is get_http_client(
+        OpenAiApiAdapter, "llmcli.adapters.openai.OpenAI", {"model": "b", "api_key": "2"}
+    )
+    assert client is not get_http_client(
+        OpenAiApiAdapter, "llmcli.adapters.openai.OpenAI", {"keepalive": "5"}
+    )
+    assert client is not get_http_client(
+        AnthropicApiAdapter, "llmcli.adapters.anthropic.anthropic.Anthropic", {"api_key": "1"}
+    )
+
+
+def test_adapters_http_client_per_host(monkeypatch):
+    client = get_http_client(OpenAiApiAdapter, "llmcli.adapters.openai.OpenAI", {})
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://localhost:1234/v1")
+
+    assert client is not get_http_client(OpenAiApiAdapter, "llmcli.adapters.openai.OpenAI", {})
+
+
+def test_get_shared_client():
+    assert get_shared_client("test-key", object) is get_shared_client("test-key", object)
+    assert get_shared_client("test-key", object) is not get_shared_client("other-key", object)
+
+
+def test_get_shared_async_client():
+    async def get_client():
+        loop = asyncio.get_running_loop()
+        return (
+            get_shared_async_client("test-key", loop, object),
+            get_shared_async_client("test-key", loop, object),
+        )
+
+    first, second = asyncio.run(get_client())
+    other, _ = asyncio.run(get_client())
+
+    assert first is second
+    assert first is not other
+
+
+def test_get_limits():
+    default = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=5)
+
+    assert get_limits(default, None, None) == default
+    assert get_limits(default, 4, 60) == httpx.Limits(
+        max_connections=4, max_keepalive_connections=4, keepalive_expiry=60
+    )
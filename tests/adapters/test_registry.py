@@ -0,0 +1,75 @@
+import json
+import subprocess
+import sys
+
+from collections import OrderedDict
+
+from unittest.mock import patch
+
+import llmcli.adapters
+from llmcli.adapters import get_adapter_list, get_api_adapter
+from llmcli.adapters.registry import ADAPTER_SPECS
+
+# generous, the SDKs alone take several seconds to import
+IMPORT_TIME_BUDGET = 1.0
+
+IMPORT_CHECK = """
+import json, sys, time
+start = time.perf_counter()
+import llmcli.llmcli
+from llmcli.help import print_help
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "sdks": [m for m in ("openai", "anthropic", "ollama") if m in sys.modules],
+}))
+"""
+
+
+def test_startup_does_not_import_sdks():
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_CHECK], capture_output=True, check=True, text=True
+    )
+    stats = json.loads(result.stdout)
+
+    assert stats["sdks"] == []
+    assert stats["elapsed"] < IMPORT_TIME_BUDGET
+
+
+def test_get_adapter_list():
+    assert [spec.name for spec in get_adapter_list()] == ["openai", "anthropic", "ollama"]
+
+
+def test_specs_match_adapter_classes():
+    for spec in ADAPTER_SPECS:
+        adapter = spec.load()
+
+        assert adapter.__name__ == spec.class_name
+        assert adapter.NAME == spec.name
+        assert adapter.OPTIONS is spec.options
+        assert getattr(llmcli.adapters, spec.class_name) is adapter
+
+
+def test_get_api_adapter_by_name():
+    with patch("llmcli.adapters.ADAPTER_INSTANCE_CACHE", OrderedDict()), patch(
+        "llmcli.adapters.openai.OpenAI"
+    ):
+        adapter = get_api_adapter("openai", {"model": "gpt-test"})
+
+        assert adapter.NAME == "openai"
+        assert adapter.get_config("model") == "gpt-test"
+        assert get_api_adapter("OpenAI", {"model": "gpt-test"}) is not adapter
+        assert get_api_adapter("openai", {"model": "gpt-test"}) is adapter
+
+
+def test_adapter_instance_cache_bounded():
+    with patch("llmcli.adapters.ADAPTER_INSTANCE_CACHE", OrderedDict()) as cache, patch(
+        "llmcli.adapters.ADAPTER_INSTANCE_CACHE_SIZE", 2
+    ), patch("llmcli.adapters.openai.OpenAI"):
+        first = get_api_adapter("openai", {"model": "1"})
+        get_api_adapter("openai", {"model": "2"})
+        assert get_api_adapter("openai", {"model": "1"}) is first
+
+        get_api_adapter("openai", {"model": "3"})
+
+        assert [json.loads(params)["model"] for _, params in cache] == ["1", "3"]
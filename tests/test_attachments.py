@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from llmcli.attachments import (
+    GitIgnore,
+    expand_path,
+    resolve_file_messages,
+    submit_file_messages,
+)
+from llmcli.messages.message import Message
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "config").write_text("[core]\n")
+    (tmp_path / ".gitignore").write_text("# build output\nbuild/\n*.pyc\n/notes.txt\n!keep.pyc\n")
+    (tmp_path / "src" / "pkg").mkdir(parents=True)
+    (tmp_path / "src" / "pkg" / "__init__.py").write_text("")
+    (tmp_path / "src" / "pkg" / "main.py").write_text("print('main')\n")
+    (tmp_path / "src" / "pkg" / "copy.py").write_text("print('main')\n")
+    (tmp_path / "src" / "pkg" / "main.pyc").write_bytes(b"\x00\x01")
+    (tmp_path / "src" / "pkg" / "keep.pyc").write_text("kept\n")
+    (tmp_path / "src" / "pkg" / "logo.png").write_bytes(b"\x89PNG\r\n\x00\x00")
+    (tmp_path / "src" / "build").mkdir()
+    (tmp_path / "src" / "build" / "out.py").write_text("built\n")
+    (tmp_path / "src" / ".gitignore").write_text("local.py\n")
+    (tmp_path / "src" / "local.py").write_text("local\n")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "notes.txt").write_text("more notes\n")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_gitignore(project):
+    gitignore = GitIgnore()
+
+    assert gitignore.is_ignored("src/pkg/main.pyc")
+    assert not gitignore.is_ignored("src/pkg/keep.pyc")
+    assert gitignore.is_ignored("src/build", is_dir=True)
+    assert gitignore.is_ignored("src/build/out.py")
+    assert not gitignore.is_ignored("src/build")
+    assert gitignore.is_ignored("src/local.py")
+    assert gitignore.is_ignored("notes.txt")
+    assert not gitignore.is_ignored("docs/notes.txt")
+    assert gitignore.is_ignored(".git/config")
+
+
+def test_expand_path(project):
+    assert expand_path("src") == [
+        "src/.gitignore",
+        "src/pkg/__init__.py",
+        "src/pkg/copy.py",
+        "src/pkg/keep.pyc",
+        "src/pkg/logo.png",
+        "src/pkg/main.py",
+    ]
+    assert expand_path("src/**/*.py") == [
+        "src/pkg/__init__.py", "src/pkg/copy.py", "src/pkg/main.py"
+    ]
+    # explicitly named files are never ignored
+    assert expand_path("notes.txt") == ["notes.txt"]
+
+    with pytest.raises(ValueError, match="No files match"):
+        expand_path("src/**/*.rs")
+
+
+def test_expand_path_literal_brackets(project):
+    (project / "app" / "[slug]").mkdir(parents=True)
+    (project / "app" / "[slug]" / "page.tsx").write_text("export default 1\n")
+
+    assert expand_path("app/[slug]/page.tsx") == ["app/[slug]/page.tsx"]
+
+
+def test_submit_file_messages(project):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        items = [Message(role="user", content="Review these:")]
+        items += submit_file_messages(executor, "src/pkg/", None)
+        items += submit_file_messages(executor, "src/pkg/main.py:head=1", None)
+
+    messages = resolve_file_messages(items)
+
+    # the binary file is skipped, and files with the same content as an earlier one are noted
+    assert messages[0].content == "Review these:"
+    assert [message.file_label for message in messages[1:4]] == [
+        "src/pkg/__init__.py",
+        "src/pkg/copy.py",
+        "src/pkg/keep.pyc",
+    ]
+    assert messages[4].content == "### FILE: src/pkg/main.py (same content as src/pkg/copy.py)"
+    assert messages[5].content == (
+        "### FILE: src/pkg/main.py:head=1 (same content as src/pkg/copy.py)"
+    )
+    assert len(messages) == 6
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = submit_file_messages(executor, "src/pkg/logo.png", None)
+
+    with pytest.raises(ValueError, match="binary"):
+        resolve_file_messages(futures)
+
+
+def test_resolve_file_messages_by_path(project):
+    (project / "pkg" / "a").mkdir(parents=True)
+    (project / "pkg" / "b").mkdir()
+
+    for name in ("a", "b"):
+        (project / "pkg" / name / "__init__.py").write_text("")
+        (project / "pkg" / name / "m.py").write_text("x = 1\n")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        items = submit_file_messages(executor, "pkg/", None)
+        items += submit_file_messages(executor, "./pkg/a/m.py", None)
+
+    messages = resolve_file_messages(items)
+
+    # empty files are all attached, and a file selected twice is only attached once
+    assert [getattr(message, "file_label", message.content) for message in messages] == [
+        "pkg/a/__init__.py",
+        "pkg/a/m.py",
+        "pkg/b/__init__.py",
+        "### FILE: pkg/b/m.py (same content as pkg/a/m.py)",
+    ]
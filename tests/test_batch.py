@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+
+from unittest.mock import patch
+
+import pytest
+
+from llmcli.batch import parse_batch_line, run_batch
+from llmcli.llmcli import LlmCli, DEFAULT_SYSTEM_PROMPT
+from llmcli.messages.message import Message
+
+from tests.fixtures.messages import get_test_messages
+
+
+def fake_completion(delays=None):
+    state = {"running": 0, "max_running": 0}
+    lock = threading.Lock()
+
+    def get_completion(messages):
+        prompt = messages[-1].content
+
+        with lock:
+            state["running"] += 1
+            state["max_running"] = max(state["max_running"], state["running"])
+
+        try:
+            time.sleep((delays or {}).get(prompt, 0))
+
+            if prompt == "fail":
+                raise RuntimeError("boom")
+        finally:
+            with lock:
+                state["running"] -= 1
+
+        response = Message(role="assistant", content="")
+
+        def stream():
+            for fragment in ["echo: ", prompt]:
+                response.content += fragment
+                yield fragment
+
+        return stream(), response
+
+    return get_completion, state
+
+
+def test_parse_batch_line():
+    messages = get_test_messages()
+
+    assert parse_batch_line('{"prompt": "hi", "id": 7}') == (
+        [Message(role="user", content="hi")], {"id": 7}
+    )
+    assert parse_batch_line(json.dumps({"messages": [m.to_dict() for m in messages]})) == (
+        messages, {}
+    )
+    assert parse_batch_line(json.dumps([m.to_dict() for m in messages])) == (messages, {})
+
+    with pytest.raises(ValueError):
+        parse_batch_line('{"nope": 1}')
+
+
+def test_run_batch_input_order():
+    get_completion, state = fake_completion({"0": 0.2, "1": 0.1})
+    items = [([Message(content=str(i))], {"id": i}) for i in range(6)]
+
+    records = list(run_batch(get_completion, items, concurrency=3))
+
+    assert [record["id"] for record in records] == list(range(6))
+    assert [record["index"] for record in records] == list(range(6))
+    assert [record["message"]["content"] for record in records] == [
+        f"echo: {i}" for i in range(6)
+    ]
+    assert state["max_running"] <= 3
+
+
+def test_run_batch_completion_order():
+    get_completion, _ = fake_completion({"0": 0.3})
+    items = [([Message(content=str(i))], {}) for i in range(3)]
+
+    records = list(run_batch(get_completion, items, concurrency=3, ordered=False))
+
+    assert records[-1]["index"] == 0
+    assert sorted(record["index"] for record in records) == [0, 1, 2]
+
+
+def test_run_batch_errors():
+    get_completion, _ = fake_completion()
+    items = [
+        ([Message(content="fail")], {}),
+        (ValueError("bad line"), {}),
+        ([Message(content="ok")], {}),
+    ]
+
+    records = list(run_batch(get_completion, items, concurrency=2))
+
+    assert records[0] == {"index": 0, "error": "boom"}
+    assert records[1] == {"index": 1, "error": "bad line"}
+    assert records[2]["message"]["content"] == "echo: ok"
+
+
+def test_cli_batch(tmp_path):
+    batch_file = tmp_path / "batch.jsonl"
+    output_file = tmp_path / "output.jsonl"
+    batch_file.write_text(
+        '{"prompt": "one"}\n'
+        '\n'
+        '{"messages": [{"role": "system", "content": "sys"}, {"content": "two"}]}\n',
+        encoding="utf-8",
+    )
+
+    with patch("llmcli.llmcli.get_api_adapter"):
+        cli = LlmCli(interactive=False)
+
+    get_completion, _ = fake_completion()
+    conversations = []
+
+    def record_completion(messages):
+        conversations.append(messages)
+        return get_completion(messages)
+
+    cli.api_adapter.get_completion.side_effect = record_completion
+    cli.add_messages_from_args([])
+    cli.batch(str(batch_file), output_file=str(output_file), concurrency=1)
+
+    records = [json.loads(line) for line in output_file.read_text().splitlines()]
+
+    assert [record["message"]["content"] for record in records] == ["echo: one", "echo: two"]
+    assert [m.content for m in conversations[0]] == [DEFAULT_SYSTEM_PROMPT, "one"]
+    assert [m.content for m in conversations[1]] == ["sys", "two"]
+
+
+def test_cli_batch_invalid_lines(tmp_path):
+    batch_file = tmp_path / "batch.jsonl"
+    output_file = tmp_path / "output.jsonl"
+    batch_file.write_text(
+        '{"messages": 5, "id": "a"}\n'
+        '[1]\n'
+        '{"messages": [{"message_type": "FileMessage", "file_path": "missing.txt"}], "id": "c"}\n'
+        '{"prompt": "ok", "id": "d"}\n'
+        'nope\n',
+        encoding="utf-8",
+    )
+
+    with patch("llmcli.llmcli.get_api_adapter"):
+        cli = LlmCli(interactive=False)
+
+    cli.api_adapter.get_completion.side_effect = fake_completion()[0]
+    cli.add_messages_from_args([])
+    cli.batch(str(batch_file), output_file=str(output_file), concurrency=1)
+
+    records = [json.loads(line) for line in output_file.read_text().splitlines()]
+
+    # every line gets a record, and invalid lines keep their id
+    assert [(record["index"], record.get("id"), "error" in record) for record in records] == [
+        (0, "a", True), (1, None, True), (2, "c", True), (3, "d", False), (4, None, True)
+    ]
+    assert records[3]["message"]["content"] == "echo: ok"
@@ -0,0 +1,60 @@
+import hashlib
+
+import pytest
+
+from llmcli.blobs import BlobStore, set_blob_store
+from llmcli.messages import message_from_dict
+from llmcli.messages.file_message import FileMessage
+from llmcli.messages.image_message import ImageMessage
+
+from tests.fixtures.messages import TEST_IMAGE
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    set_blob_store(store)
+    yield store
+    set_blob_store(None)
+
+
+def test_put_get(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digest = store.put(b"hello")
+
+    assert digest == hashlib.sha256(b"hello").hexdigest()
+    assert store.path(digest) == str(tmp_path / digest[:2] / digest[2:])
+    assert store.get(digest) == b"hello"
+    assert store.put(b"hello") == digest
+
+    with pytest.raises(ValueError):
+        store.path("../../etc/passwd")
+
+
+def test_image_message_blob(blob_store):
+    message = ImageMessage(image_path="test.png", image_content=TEST_IMAGE, image_type="image/png")
+
+    assert message.image_blob is not None
+    assert message.image_content == TEST_IMAGE
+    assert "image_content" not in message.to_dict()
+    assert message_from_dict(message.to_dict()).image_content == TEST_IMAGE
+
+
+def test_file_message_blob(blob_store, tmp_path):
+    path = tmp_path / "test.txt"
+    path.write_text("i'm a file =3", encoding="utf-8")
+
+    first = FileMessage(file_path=str(path))
+    second = FileMessage(file_path=str(path))
+
+    assert first.file_blob == second.file_blob
+    assert first.file_content == "i'm a file =3"
+    assert "file_content" not in first.to_dict()
+    assert message_from_dict(first.to_dict()) == first
+
+
+def test_inline_without_blob_store():
+    message = FileMessage(file_path="test.txt", file_content="i'm a file =3")
+
+    assert message.file_blob is None
+    assert message.to_dict()["file_content"] == "i'm a file =3"
@@ -0,0 +1,127 @@
+import os
+import time
+
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.cache import ResponseCache
+from llmcli.messages.message import Message
+
+from tests.fixtures.messages import get_test_messages
+
+
+class FakeAdapter(BaseApiAdapter):
+    NAME = "fake"
+
+    def __init__(self, params, response="this is a test"):
+        super().__init__(params)
+        self.config = dict(params)
+        self.response = response
+        self.calls = 0
+
+    def get_completion(self, input_messages):
+        self.calls += 1
+        response_message = self.get_response_message()
+        fragments = self.response.split(" ")
+        stream = (fragment for fragment in [fragments[0]] + [" " + f for f in fragments[1:]])
+        return self.output_stream(stream, response_message), response_message
+
+    @staticmethod
+    def get_fragment(chunk):
+        return chunk
+
+
+def test_cache_hit(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    adapter = FakeAdapter({"model": "m"})
+    messages = get_test_messages()
+
+    stream, message = cache.get_completion(adapter, messages)
+    assert "".join(stream) == "this is a test"
+    assert message.content == "this is a test"
+
+    stream, message = cache.get_completion(adapter, messages)
+    assert message.content == ""
+    assert "".join(stream) == "this is a test"
+    assert message.content == "this is a test"
+    assert message.extra == {"cache_hit": True}
+    assert message.adapter == "fake"
+    assert adapter.calls == 1
+
+
+def test_cache_key():
+    messages = get_test_messages()
+    key = ResponseCache.get_key(FakeAdapter({"model": "m"}), messages)
+
+    assert key == ResponseCache.get_key(FakeAdapter({"model": "m"}), get_test_messages())
+    assert key != ResponseCache.get_key(FakeAdapter({"model": "n"}), messages)
+    assert key != ResponseCache.get_key(FakeAdapter({"model": "m"}), messages[:-1])
+
+
+def test_cache_key_multi_turn(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+
+    def run(response_extra):
+        adapter = FakeAdapter({"model": "m"})
+        messages = [Message(role="user", content="hello")]
+        stream, message = cache.get_completion(adapter, messages)
+        "".join(stream)
+        # response metadata differs between runs, e.g. timing metrics and cache hits
+        message.extra = response_extra
+        messages += [message, Message(role="user", content="and again")]
+        return ResponseCache.get_key(adapter, messages)
+
+    assert run({"metrics": {"start": 1.0}}) == run({"cache_hit": True})
+
+
+def test_cache_masked_options():
+    adapter = FakeAdapter({"model": "m", "api_key": "a"})
+    adapter.MASKED_OPTIONS = {"api_key"}
+    other = FakeAdapter({"model": "m", "api_key": "b"})
+    other.MASKED_OPTIONS = {"api_key"}
+
+    assert ResponseCache.get_key(adapter, []) == ResponseCache.get_key(other, [])
+
+
+def test_incomplete_stream_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    adapter = FakeAdapter({})
+    messages = get_test_messages()
+
+    stream, _ = cache.get_completion(adapter, messages)
+    next(stream)
+    stream.close()
+
+    cache.get_completion(adapter, messages)
+    assert adapter.calls == 2
+
+
+def test_cache_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    adapter = FakeAdapter({})
+    messages = get_test_messages()
+    key = cache.get_key(adapter, messages)
+
+    cache.store(key, ["hi"], Message(role="assistant", content="hi"))
+    assert cache.load(key) is not None
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.load(key) is None
+    assert not os.path.exists(cache.path(key))
+
+
+def test_cache_size_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    response = Message(role="assistant", content="x" * 1000)
+
+    for i in range(3):
+        cache.store(f"{i}", ["x" * 1000], response)
+        os.utime(cache.path(f"{i}"), (i, i))
+
+    # use the oldest entry, so it becomes the most recently used
+    assert cache.load("0") is not None
+
+    # entry sizes vary slightly with their creation timestamp
+    cache.max_size = os.path.getsize(cache.path("0")) + os.path.getsize(cache.path("2"))
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == ["0.json", "2.json"]
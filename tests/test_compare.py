@@ -0,0 +1,74 @@
+import io
+import threading
+
+from llmcli.compare import ComparisonStream, format_comparison, render_comparison
+from llmcli.messages.message import Message
+
+
+def get_stream(label, fragments, release=None, error=None):
+    def get_completion():
+        message = Message(role="assistant", extra={"metrics": {"ttft": 0.5, "total_time": 1.0}})
+
+        def stream():
+            if release is not None:
+                release.wait()
+
+            for fragment in fragments:
+                message.content = (message.content or "") + fragment
+                yield fragment
+
+            if error is not None:
+                raise error
+
+        return stream(), message
+
+    return ComparisonStream(label, get_completion)
+
+
+class ReleasingOutput(io.StringIO):
+    def __init__(self, release):
+        super().__init__()
+        self.release = release
+
+    def write(self, text):
+        # let the slow stream finish once the fast one is being shown
+        if text.startswith("fast:"):
+            self.release.set()
+
+        return super().write(text)
+
+
+def test_render_comparison():
+    release = threading.Event()
+    slow = get_stream("slow", ["a", "b"], release)
+    fast = get_stream("fast", ["c", "d"])
+    output = ReleasingOutput(release)
+
+    # the fast stream is shown first, since it finishes first
+    fast.thread.start = lambda: (threading.Thread.start(fast.thread), fast.thread.join())
+
+    render_comparison([slow, fast], output, separator="--")
+
+    assert output.getvalue() == "fast:\n\ncd\n--\nslow:\n\nab\n--\n"
+    assert slow.message.content == "ab"
+    assert fast.message.content == "cd"
+
+
+def test_render_comparison_error():
+    failing = get_stream("failing", ["a"], error=RuntimeError("boom"))
+    output = io.StringIO()
+
+    render_comparison([failing], output, separator="--")
+
+    assert output.getvalue() == "failing:\n\na\nUnable to get completion: boom\n\n--\n"
+    assert str(failing.error) == "boom"
+
+    summary = format_comparison([failing, get_stream("ok", [])])
+    assert "failing  error: boom" in summary
+
+
+def test_format_comparison():
+    stream = get_stream("model", ["a"])
+    render_comparison([stream], io.StringIO())
+
+    assert format_comparison([stream]).startswith("model  TTFT 0.50s")
@@ -0,0 +1,186 @@
+import json
+
+from llmcli.conversation import (
+    JsonlLogWriter,
+    is_jsonl_path,
+    iter_json_array,
+    load_conversation,
+    load_conversation_file,
+)
+from llmcli.messages.message import Message
+
+from tests.fixtures.messages import get_test_messages, get_assistant_args
+
+
+def test_is_jsonl_path():
+    assert is_jsonl_path("log.jsonl")
+    assert is_jsonl_path("LOG.JSONL")
+    assert not is_jsonl_path("log.json")
+    assert not is_jsonl_path(None)
+
+
+def test_load_conversation_json():
+    messages = get_test_messages(image=True, file=True)
+    content = json.dumps([message.to_dict() for message in messages])
+
+    assert load_conversation(content) == messages
+
+
+def test_write_and_load_jsonl(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    messages = get_test_messages(image=True, file=True)
+    writer = JsonlLogWriter(path)
+
+    writer.write(messages[:3])
+    writer.write(messages)
+
+    with open(path, encoding="utf-8") as file:
+        content = file.read()
+
+    assert len(content.splitlines()) == len(messages)
+    assert load_conversation(content) == messages
+
+    # a new writer rewrites the log instead of appending duplicates
+    JsonlLogWriter(path).write(messages[:2])
+
+    with open(path, encoding="utf-8") as file:
+        assert load_conversation(file.read()) == messages[:2]
+
+
+def test_checkpoint_stream_partial(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    messages = get_test_messages()
+    response = Message(role="assistant", content="", **get_assistant_args())
+    writer = JsonlLogWriter(path, checkpoint_interval=0, checkpoint_size=1)
+    writer.write(messages)
+
+    stream = writer.checkpoint_stream(iter(["Hello", ", ", "world", "!"]), response)
+    assert next(stream) == "Hello"
+    assert next(stream) == ", "
+
+    # simulate a crash mid-stream: the partial response is recovered from the log
+    with open(path, encoding="utf-8") as file:
+        loaded = load_conversation(file.read())
+
+    assert loaded[:-1] == messages
+    assert loaded[-1].content == "Hello, "
+    assert loaded[-1].display_name == response.display_name
+    assert loaded[-1].extra == {"partial": True}
+
+
+def test_checkpoint_stream_superseded(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    messages = get_test_messages()
+    response = Message(role="assistant", content="", **get_assistant_args())
+    writer = JsonlLogWriter(path, checkpoint_interval=60)
+    writer.write(messages)
+
+    assert "".join(writer.checkpoint_stream(iter(["a", "b", "c"]), response)) == "abc"
+    response.content = "abc"
+    writer.write(messages + [response])
+
+    with open(path, encoding="utf-8") as file:
+        lines = file.read().splitlines()
+
+    assert [json.loads(line).get("event") for line in lines[-3:]] == [
+        "stream_start", "stream_delta", None
+    ]
+    assert load_conversation("\n".join(lines)) == messages + [response]
+
+
+def get_turns_messages():
+    return [
+        Message(role="system", content="You are an assistant."),
+        Message(role="user", content="first question"),
+        Message(role="assistant", content="first answer", **get_assistant_args()),
+        Message(role="user", content="second question"),
+        Message(role="system", content="Be brief."),
+        Message(role="assistant", content="second answer", **get_assistant_args()),
+        Message(role="user", content="third question"),
+        Message(role="user", content="more of the third question"),
+        Message(role="assistant", content="third answer", **get_assistant_args()),
+    ]
+
+
+def test_iter_json_array():
+    content = json.dumps([{"a": "x" * 10}, {"b": [1, 2, {"c": "]"}]}, {}])
+    chunks = [content[i:i + 3] for i in range(0, len(content), 3)]
+
+    assert list(iter_json_array(chunks)) == [{"a": "x" * 10}, {"b": [1, 2, {"c": "]"}]}, {}]
+    assert not list(iter_json_array(["[ ", " ]"]))
+
+
+def test_load_last_turns():
+    messages = get_turns_messages()
+    content = "\n".join(json.dumps(message.to_dict()) for message in messages)
+
+    # system messages of dropped turns are kept, ahead of the remaining turns
+    assert load_conversation(content, last_turns=2) == messages[:1] + messages[3:]
+    assert load_conversation(content, last_turns=1) == [messages[0], messages[4]] + messages[6:]
+    assert load_conversation(content, last_turns=5) == messages
+
+
+def test_load_conversation_file_json(tmp_path):
+    path = str(tmp_path / "log.json")
+    messages = get_test_messages(image=True, file=True)
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([message.to_dict() for message in messages], file)
+
+    assert load_conversation_file(path) == (messages, None)
+
+
+def test_load_conversation_file_lazy(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    messages = get_test_messages(image=True, file=True)
+    JsonlLogWriter(path).write(messages)
+
+    loaded, preserved = load_conversation_file(path, lazy=True)
+
+    # attachments are read from the log when they are needed
+    assert preserved is None
+    assert [message.to_dict() for message in loaded] == [message.to_dict() for message in messages]
+    assert any(getattr(message, "_file_loader", None) is not None for message in loaded)
+    assert any(getattr(message, "_image_loader", None) is not None for message in loaded)
+
+    # and can still be read after the log is rewritten
+    JsonlLogWriter(path).write(loaded[:1])
+    assert [message.to_dict() for message in loaded] == [message.to_dict() for message in messages]
+
+
+def test_resume_last_turns_in_place(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    messages = get_turns_messages()
+    JsonlLogWriter(path).write(messages)
+
+    loaded, preserved = load_conversation_file(path, last_turns=1)
+    assert loaded == [messages[0], messages[4]] + messages[6:]
+
+    # the dropped turns are written back in their place when the log is rewritten
+    reply = Message(role="user", content="fourth question")
+    writer = JsonlLogWriter(path, preserved=preserved)
+    writer.write(loaded)
+    writer.write(loaded + [reply])
+
+    with open(path, encoding="utf-8") as file:
+        assert load_conversation(file.read()) == messages + [reply]
+
+
+def test_resume_in_place_keeps_order(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    messages = [Message(role="system", content="You are an assistant.")]
+
+    for i in range(4):
+        messages.append(Message(role="user", content=f"u{i}"))
+        messages.append(Message(role="assistant", content=f"a{i}", **get_assistant_args()))
+
+    JsonlLogWriter(path).write(messages)
+
+    # resuming repeatedly doesn't move any records
+    for _ in range(2):
+        loaded, preserved = load_conversation_file(path, last_turns=1)
+        assert loaded == [messages[0]] + messages[-2:]
+        JsonlLogWriter(path, preserved=preserved).write(loaded)
+
+        with open(path, encoding="utf-8") as file:
+            assert load_conversation(file.read()) == messages
@@ -0,0 +1,107 @@
+import io
+import os
+import socket
+import sys
+import threading
+
+from unittest.mock import patch
+
+import pytest
+
+from llmcli.daemon import (
+    DaemonServer,
+    forward_request,
+    reads_stdin,
+    remove_stale_socket,
+    should_forward,
+)
+
+
+def fake_main(argv):
+    print(f"cwd={os.getcwd()}")
+    print(f"argv={argv}")
+    print(f"stdin={sys.stdin.read()}")
+    print("warning", file=sys.stderr)
+
+    if "fail" in argv:
+        raise ValueError("File fail does not exist")
+
+    if "exit" in argv:
+        sys.exit(3)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    server = DaemonServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+
+    with patch("llmcli.llmcli.main", fake_main):
+        yield socket_path
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_should_forward():
+    assert should_forward(["-n", "-u", "hi"])
+    assert should_forward(["--non-interactive"])
+    assert not should_forward(["-u", "hi"])
+
+
+def test_reads_stdin():
+    assert reads_stdin(["-n", "-u", "@-"])
+    assert reads_stdin(["-n", "--batch", "-"])
+    assert reads_stdin(["-n", "--batch=-"])
+    assert not reads_stdin(["-n", "--batch", "in.jsonl", "-u", "-"])
+
+
+def test_forward_request(daemon, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sys.stdin", io.StringIO("piped"))
+    cwd = os.getcwd()
+
+    assert forward_request(["-n", "-u", "@-"], daemon) == 0
+
+    output = capsys.readouterr()
+    assert output.out == f"cwd={cwd}\nargv=['-n', '-u', '@-']\nstdin=piped\n"
+    assert output.err == "warning\n"
+
+    # the daemon's own working directory and streams are restored
+    assert os.getcwd() == cwd
+    assert (os.stat(daemon).st_mode & 0o777) == 0o600
+
+
+def test_forward_request_batch_stdin(daemon, monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO('{"prompt": "hi"}\n'))
+
+    assert forward_request(["-n", "--batch", "-"], daemon) == 0
+    assert 'stdin={"prompt": "hi"}\n' in capsys.readouterr().out
+
+
+def test_forward_request_errors(daemon, capsys):
+    assert forward_request(["-n", "fail"], daemon) == 1
+    assert capsys.readouterr().err == "warning\nError: File fail does not exist\n"
+
+    assert forward_request(["-n", "exit"], daemon) == 3
+
+
+def test_forward_request_no_daemon(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    assert forward_request(["-n"], socket_path) is None
+
+    # a socket left behind by a daemon that is no longer running
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(socket_path)
+
+    assert forward_request(["-n"], socket_path) is None
+
+    remove_stale_socket(socket_path)
+    assert not os.path.exists(socket_path)
+
+
+def test_daemon_already_running(daemon):
+    with pytest.raises(RuntimeError):
+        DaemonServer(daemon)
@@ -0,0 +1,15 @@
+from llmcli.adapters import get_adapter_list
+from llmcli.help import print_help
+
+
+def test_print_help(capsys):
+    print_help()
+    output = capsys.readouterr().out
+
+    assert '{"prompt": "..."}' in output
+
+    for adapter in get_adapter_list():
+        assert f"{adapter.hr_name} ({adapter.name})" in output
+
+        for option in adapter.options:
+            assert f"- {option.name}" in output
@@ -0,0 +1,112 @@
+import base64
+import io
+import os
+from collections import OrderedDict
+from unittest.mock import patch
+
+import pytest
+
+from llmcli.images import downscale_image, get_target_size, prepare_image
+from llmcli.messages.image_message import ImageMessage
+from tests.fixtures.messages import TEST_IMAGE
+
+
+def get_image_bytes(size, mode="RGB"):
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.effect_noise(size, 64).convert(mode)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def test_get_target_size():
+    assert get_target_size(4000, 3000, (2048, 768)) == (1024, 768)
+    assert get_target_size(3000, 4000, (1568, 1568)) == (1176, 1568)
+    assert get_target_size(800, 600, (1568, 1568)) == (800, 600)
+
+
+def test_downscale_image():
+    Image = pytest.importorskip("PIL.Image")
+    image_bytes = get_image_bytes((1200, 800))
+
+    output, image_type = downscale_image(image_bytes, "image/png", (600, 600), 85)
+
+    assert image_type == "image/jpeg"
+    assert len(output) < len(image_bytes)
+
+    with Image.open(io.BytesIO(output)) as image:
+        assert image.size == (600, 400)
+
+
+def test_downscale_image_oriented():
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.effect_noise((400, 300), 64).convert("RGB")
+    exif = Image.Exif()
+    # stored sideways, to be rotated 90 degrees clockwise
+    exif[0x0112] = 6
+    output = io.BytesIO()
+    image.save(output, format="JPEG", exif=exif)
+
+    for max_size, expected_size in [((200, 200), (150, 200)), ((1000, 1000), (300, 400))]:
+        processed, image_type = downscale_image(output.getvalue(), "image/jpeg", max_size, 85)
+        assert image_type == "image/jpeg"
+
+        with Image.open(io.BytesIO(processed)) as result:
+            assert result.size == expected_size
+            assert result.getexif().get(0x0112, 1) == 1
+
+
+def test_downscale_image_transparent():
+    Image = pytest.importorskip("PIL.Image")
+    image_bytes = get_image_bytes((800, 400), mode="RGBA")
+
+    output, image_type = downscale_image(image_bytes, "image/png", (400, 400), 85)
+
+    assert image_type == "image/png"
+
+    with Image.open(io.BytesIO(output)) as image:
+        assert image.size == (400, 200)
+        assert image.mode == "RGBA"
+
+
+def test_downscale_image_small():
+    pytest.importorskip("PIL.Image")
+    image_bytes = base64.b64decode(TEST_IMAGE)
+
+    # already small, and re-encoding wouldn't make it smaller
+    assert downscale_image(image_bytes, "image/png", (1568, 1568), 85) == (
+        image_bytes, "image/png"
+    )
+
+
+def test_prepare_image_cached(tmp_path):
+    pytest.importorskip("PIL.Image")
+    path = tmp_path / "photo.png"
+    path.write_bytes(get_image_bytes((800, 800)))
+    message = ImageMessage(role="user", image_path=str(path))
+
+    with patch("llmcli.images.IMAGE_CACHE", OrderedDict()) as cache, \
+            patch("llmcli.images.downscale_image", wraps=downscale_image) as downscale:
+        image_type, image_content = prepare_image(message, (400, 400), 85)
+        assert prepare_image(message, (400, 400), 85) == (image_type, image_content)
+        assert downscale.call_count == 1
+
+        prepare_image(message, (200, 200), 85)
+        assert downscale.call_count == 2
+
+        # a modified file is processed again once it is attached again
+        os.utime(path, ns=(0, 0))
+        message = ImageMessage(role="user", image_path=str(path))
+        prepare_image(message, (400, 400), 85)
+        assert downscale.call_count == 3
+        assert len(cache) == 3
+
+    assert image_type == "image/jpeg"
+    assert len(image_content) < len(message.image_content)
+
+
+def test_prepare_image_without_pillow():
+    message = ImageMessage(role="user", image_content=TEST_IMAGE, image_type="image/png")
+
+    with patch("llmcli.images.downscale_image", side_effect=ImportError):
+        assert prepare_image(message, (1000, 1000), 85) == ("image/png", TEST_IMAGE)
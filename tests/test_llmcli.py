@@ -1,14 +1,19 @@
+import io
 import json
 
-from unittest.mock import call, mock_open, patch
+from unittest.mock import MagicMock, call, mock_open, patch
 from random import randrange
 from os import terminal_size
 from base64 import b64decode
 
+import pytest
+
+from llmcli.adapters.hedged import HedgedApiAdapter
 from llmcli.llmcli import LlmCli
 from llmcli.messages.message import Message
 from llmcli.messages.file_message import FileMessage
 from llmcli.messages.image_message import ImageMessage
+from llmcli.retrieval import get_context_message
 from llmcli.messages import message_from_dict
 
 from tests.fixtures.messages import get_test_messages, TEST_IMAGE
@@ -23,22 +28,48 @@ def test_log_json():
     for message in messages:
         cli.add_chat_message(message=message, silent=True)
 
-    with patch("builtins.open", mock_open()) as mock_file:
+    with patch("llmcli.llmcli.write_file_atomic") as write_file:
         cli.log_json()
 
-    handle = mock_file()
-    out_messages = [
-        message_from_dict(m)
-        for m in json.loads("".join([call.args[0] for call in handle.write.call_args_list]))
-    ]
+    path, content = write_file.call_args.args
+    out_messages = [message_from_dict(m) for m in json.loads(content.decode("utf-8"))]
 
+    assert path == cli.json_log_file
     assert messages == out_messages
 
 
+def test_log_json_changed_image(tmp_path):
+    image_path = tmp_path / "image.png"
+    image_path.write_bytes(b"image content")
+    log_path = tmp_path / "log.json"
+
+    with patch("llmcli.llmcli.get_api_adapter"):
+        cli = LlmCli(log_file_json=str(log_path))
+
+    cli.add_chat_message(
+        message=ImageMessage(role="user", image_path=str(image_path)), silent=True
+    )
+    cli.log_json()
+
+    # the log is still written when the image can no longer be sent
+    image_path.write_bytes(b"new image content")
+    cli.log_json()
+
+    with open(log_path, encoding="utf-8") as file:
+        (loaded,) = [message_from_dict(m) for m in json.load(file)]
+
+    assert "image_content" not in loaded.to_dict()
+
+    with pytest.raises(ValueError, match="modified or removed"):
+        loaded.get_image_bytes()
+
+
 def test_get_completion():
     with patch("llmcli.llmcli.get_api_adapter"):
         cli = LlmCli()
 
+    cli.api_adapter.get_context_budget.return_value = None
+    cli.api_adapter.get_completion.return_value = (None, Message(role="assistant"))
     messages = get_test_messages(image=True, file=True)
 
     for message in messages:
@@ -48,6 +79,106 @@ def test_get_completion():
     assert cli.api_adapter.get_completion.call_args == call(messages)
 
 
+def test_get_completion_trimmed():
+    with patch("llmcli.llmcli.get_api_adapter"):
+        cli = LlmCli()
+
+    messages = [
+        Message(role="system", content="system"),
+        Message(role="user", content="x" * 400),
+        Message(role="assistant", content="x" * 400),
+        Message(role="user", content="pinned " + "x" * 400, pinned=True),
+        Message(role="assistant", content="x" * 400),
+        Message(role="user", content="x" * 400),
+        Message(role="assistant", content="x" * 400),
+        Message(role="user", content="latest"),
+    ]
+
+    for message in messages:
+        cli.add_chat_message(message=message, silent=True)
+
+    cli.api_adapter.get_context_budget.return_value = 400
+    cli.api_adapter.get_completion.return_value = (None, Message(role="assistant"))
+    cli.get_completion()
+
+    assert cli.api_adapter.get_completion.call_args == call(
+        [messages[0], messages[3], messages[5], messages[6], messages[7]]
+    )
+    assert cli.messages == messages
+
+
+def test_get_comparison(capsys):
+    with patch("llmcli.llmcli.get_api_adapter"):
+        cli = LlmCli(separator="--", compare=["ollama:model=gemma3"])
+
+    main_adapter = cli.api_adapter
+    other_adapter = MagicMock()
+
+    for adapter, content in ((main_adapter, "main"), (other_adapter, "other")):
+        adapter.get_context_budget.return_value = None
+        adapter.get_display_name.return_value = content
+        adapter.get_completion.return_value = (
+            iter([content]),
+            Message(role="assistant", content=content),
+        )
+
+    cli.add_chat_message(message=Message(role="user", content="hi"), silent=True)
+
+    with patch("llmcli.llmcli.get_api_adapter", return_value=other_adapter) as get_adapter:
+        message = cli.get_comparison()
+
+    get_adapter.assert_called_once_with("ollama", {"model": "gemma3"})
+    assert message.content == "main"
+    assert other_adapter.get_completion.call_args == call(cli.messages)
+
+    output = capsys.readouterr()
+    assert "main:\n\nmain\n--\n" in output.out
+    assert "other:\n\nother\n--\n" in output.out
+    assert output.err == "main   no metrics\nother  no metrics\n"
+
+
+def test_hedge():
+    with patch("llmcli.llmcli.get_api_adapter") as get_adapter:
+        cli = LlmCli(
+            api_adapter_name="openai",
+            api_adapter_options=["model=gpt-4o"],
+            hedge="anthropic:model=claude",
+            hedge_delay=0.5,
+        )
+
+    assert get_adapter.call_args_list == [
+        call("openai", {"model": "gpt-4o"}),
+        call("anthropic", {"model": "claude"}),
+    ]
+    assert isinstance(cli.api_adapter, HedgedApiAdapter)
+    assert cli.api_adapter.delay == 0.5
+
+
+def test_retrieved_context(tmp_path):
+    (tmp_path / "billing.py").write_text("def invoice_total(invoice):\n    return 0\n")
+
+    with patch("llmcli.llmcli.get_api_adapter") as get_adapter:
+        get_adapter.return_value.get_context_budget.return_value = None
+        cli = LlmCli(
+            retrieve=[str(tmp_path / "billing.py")],
+            index_file=str(tmp_path / "index.json"),
+        )
+
+    question = Message(role="user", content="How is the invoice total computed?")
+    cli.messages = [Message(role="system", content="you are a jelly donut"), question]
+
+    with patch("llmcli.llmcli.get_context_message", wraps=get_context_message) as get_context:
+        messages = cli.get_request_messages()
+        assert cli.get_request_messages() == messages
+        assert get_context.call_count == 1
+
+    assert messages[0] == cli.messages[0]
+    assert messages[1].content.startswith("### CONTEXT")
+    assert "def invoice_total(invoice):" in messages[1].content
+    assert messages[2] is question
+    assert len(cli.messages) == 2
+
+
 def test_get_separator():
     separator = "%030x" % randrange(16**30)
 
@@ -82,9 +213,11 @@ def test_get_message_arg_content():
 actual_open = open
 
 
-def mock_open_side_effect(file, *args, **kwargs):
+def mock_open_side_effect(file, mode="r", *args, **kwargs):
     if file == "file.txt":
-        return mock_open(read_data="beep boop").return_value
+        m = mock_open(read_data=b"beep boop" if "b" in mode else "beep boop")
+        m.return_value.fileno.side_effect = io.UnsupportedOperation
+        return m.return_value
     
     if file == "image.png":
         m = mock_open()
@@ -92,15 +225,13 @@ def mock_open_side_effect(file, *args, **kwargs):
         return m.return_value
     
     if file == "log.json":
-        m = mock_open()
-        m.return_value.read.return_value = "[{\"message_type\":\"Message\",\"role\":\"assista" + \
-            "nt\",\"content\":\"this is a text message\"},{\"message_type\":\"FileMessage\"," + \
-            "\"role\":\"user\",\"content\":\"### File: file.txt\",\"file_path\":\"file.txt\"," +\
-            "\"file_content\":\"beep boop\"}]"
-
-        return m.return_value
+        return io.BytesIO(
+            b"[{\"message_type\":\"Message\",\"role\":\"assistant\",\"content\":\"this is a text " +
+            b"message\"},{\"message_type\":\"FileMessage\",\"role\":\"user\",\"content\":\"### " +
+            b"File: file.txt\",\"file_path\":\"file.txt\",\"file_content\":\"beep boop\"}]"
+        )
     
-    return actual_open(file, *args, **kwargs)
+    return actual_open(file, mode, *args, **kwargs)
 
 
 def test_add_messages_from_args():
@@ -111,7 +242,9 @@ def test_add_messages_from_args():
 
     with patch("llmcli.llmcli.os.path.exists", return_value=True), patch(
         "builtins.open"
-    ) as mocked_open:
+    ) as mocked_open, patch(
+        "llmcli.messages.image_message.get_file_signature", return_value=(0, 0)
+    ):
         mocked_open.side_effect = mock_open_side_effect
 
         cli.add_messages_from_args(
@@ -127,6 +260,9 @@ def test_add_messages_from_args():
             ]
         )
 
+        # images are read when they are sent, so this only opens the file
+        image_message = ImageMessage(role="user", image_path="image.png", image_type="image/png")
+
     assert cli.messages == [
         Message(role="system", content="you are a jelly donut"),
         Message(role="user", content="what are you?"),
@@ -134,12 +270,7 @@ def test_add_messages_from_args():
         Message(role="user", content="beep boop"),
         Message(role="assistant", content="beep boop"),
         FileMessage(role="user", file_path="file.txt", file_content="beep boop"),
-        ImageMessage(
-            role="user",
-            image_path="image.png",
-            image_content=TEST_IMAGE,
-            image_type="image/png",
-        ),
+        image_message,
         Message(role="assistant", content="this is a text message"),
         FileMessage(
             role="user",
@@ -1,13 +1,20 @@
+import io
 import json
 from unittest.mock import patch, mock_open
 from base64 import b64encode
+
+import pytest
+
 from llmcli.messages.message import Message
-from llmcli.messages.file_message import FileMessage
+from llmcli.messages.file_message import FileMessage, parse_file_spec, read_file
 from llmcli.messages.image_message import ImageMessage
 from llmcli.messages import message_from_dict
 
 def test_load_files():
-    with patch("builtins.open", mock_open(read_data="file content")), patch(
+    file_open = mock_open(read_data=b"file content")
+    file_open.return_value.fileno.side_effect = io.UnsupportedOperation
+
+    with patch("builtins.open", file_open), patch(
         "llmcli.util.os.getcwd", return_value="/home/user"
     ):
 
@@ -16,9 +23,14 @@ def test_load_files():
         assert file_message.file_path == "test.txt"
         assert file_message.content == "### File: test.txt (contents hidden)"
 
-    with patch("builtins.open", mock_open(read_data=b"image content")), patch(
+    image_open = mock_open(read_data=b"image content")
+    image_open.return_value.fileno.side_effect = io.UnsupportedOperation
+
+    with patch("builtins.open", image_open), patch(
         "llmcli.util.os.getcwd", return_value="/home/user"
-    ), patch("llmcli.messages.image_message.get_mime_type", return_value="image/png"):
+    ), patch("llmcli.messages.image_message.get_mime_type", return_value="image/png"), patch(
+        "llmcli.messages.image_message.get_file_signature", return_value=(0, 13)
+    ):
 
         image_message = ImageMessage(image_path="/path/to/image.png")
         assert image_message.image_type == "image/png"
@@ -30,6 +42,38 @@ def test_load_files():
         )
 
 
+def test_load_image_lazily(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"image content")
+    image_message = ImageMessage(role="user", image_path=str(path))
+
+    # nothing is kept in memory until the image is needed
+    assert image_message.to_dict().get("image_content") is not None
+    assert image_message._image_content is None
+
+    assert image_message.image_content == b64encode(b"image content").decode("utf-8")
+    assert image_message.get_image_bytes() == b"image content"
+    assert message_from_dict(image_message.to_dict()).image_content == image_message.image_content
+
+    # an image is never silently replaced by a different version of its file
+    path.write_bytes(b"new image content")
+
+    with pytest.raises(ValueError, match="modified or removed"):
+        image_message.get_image_bytes()
+
+    path.unlink()
+
+    # the message can still be logged, without its content
+    restored = message_from_dict(image_message.to_dict())
+    assert restored.to_dict().get("image_content") is None
+
+    with pytest.raises(ValueError, match="modified or removed"):
+        restored.get_image_bytes()
+
+    path.write_bytes(b"")
+    assert ImageMessage(role="user", image_path=str(path)).image_content == ""
+
+
 def test_from_to_dict():
     message_dict = {
         "message_type": "Message",
@@ -69,3 +113,59 @@ def test_message_from_dict():
     assert isinstance(message_from_dict({ 'message_type': "Message" }), Message)
     assert isinstance(message_from_dict({ 'message_type': "FileMessage" }), FileMessage)
     assert isinstance(message_from_dict({ 'message_type': "ImageMessage" }), ImageMessage)
+
+
+def test_parse_file_spec(tmp_path):
+    assert parse_file_spec("app.log") == ("app.log", None)
+    assert parse_file_spec("app.log:100-500") == ("app.log", "100-500")
+    assert parse_file_spec("app.log:tail=20") == ("app.log", "tail=20")
+    assert parse_file_spec("app.log:bytes=0-") == ("app.log", "bytes=0-")
+    assert parse_file_spec("app.log:nope") == ("app.log:nope", None)
+
+    # a file whose name looks like a range
+    path = tmp_path / "app.log:1-2"
+    path.write_text("")
+    assert parse_file_spec(str(path)) == (str(path), None)
+
+
+def test_read_file_ranges(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 11)))
+
+    assert read_file(str(path), "3-4") == "line 3\nline 4\n"
+    assert read_file(str(path), "9-") == "line 9\nline 10\n"
+    assert read_file(str(path), "9-20") == "line 9\nline 10\n"
+    assert read_file(str(path), "head=2") == "line 1\nline 2\n"
+    assert read_file(str(path), "tail=2") == "line 9\nline 10\n"
+    assert read_file(str(path), "tail=20") == path.read_text()
+    assert read_file(str(path), "bytes=0-5") == "line 1"
+    assert read_file(str(path), "bytes=68-") == "10\n"
+
+
+def test_read_file_max_size(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 11)))
+
+    # cut at a line break
+    assert read_file(str(path), max_size=16) == "line 1\nline 2\n\n[... 57 bytes truncated ...]"
+    assert read_file(str(path), "tail=5", max_size=16) == (
+        "[... 21 bytes truncated ...]\nline 9\nline 10\n"
+    )
+    assert read_file(str(path), "3-4", max_size=100) == "line 3\nline 4\n"
+
+    message = FileMessage(role="user", file_path=str(path), file_range="head=1")
+    assert message.file_content == "line 1\n"
+    assert message.content.endswith("app.log:head=1 (contents hidden)")
+    assert message.to_dict()["file_range"] == "head=1"
+
+
+def test_read_file_binary(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"\x89PNG\r\n\x00\x00")
+
+    with pytest.raises(ValueError, match="binary"):
+        FileMessage(role="user", file_path=str(path))
+
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert FileMessage(role="user", file_path=str(empty)).file_content == ""
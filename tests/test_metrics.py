@@ -0,0 +1,110 @@
+import json
+import time
+
+from unittest.mock import patch
+
+from llmcli.adapters.base import BaseApiAdapter
+from llmcli.llmcli import LlmCli
+from llmcli.messages.message import Message
+from llmcli.metrics import format_metrics
+
+
+class SlowAdapter(BaseApiAdapter):
+    NAME = "slow"
+
+    @staticmethod
+    def get_fragment(chunk):
+        return chunk
+
+    def get_completion(self, input_messages):
+        request_start = time.monotonic()
+        time.sleep(0.05)
+        response_message = self.get_response_message()
+
+        def chunks():
+            for chunk in [None, "a", "b", "c"]:
+                time.sleep(0.01)
+                yield chunk
+
+        return self.output_stream(chunks(), response_message, request_start), response_message
+
+
+def test_stream_metrics():
+    stream, message = SlowAdapter({}).get_completion([])
+
+    for _ in stream:
+        time.sleep(0.02)
+
+    metrics = message.extra["metrics"]
+
+    assert metrics["response_time"] >= 0.05
+    assert metrics["ttft"] >= 0.07
+    assert metrics["total_time"] >= metrics["ttft"] + 0.04
+    assert metrics["chunks"] == 4
+    assert metrics["output_chars"] == 3
+    assert metrics["output_tokens"] == 1
+    assert metrics["tokens_per_second"] > 0
+    assert metrics["max_gap"] >= 0.01
+    assert metrics["wait_time"] >= 0.04
+    assert metrics["consumer_time"] >= 0.04
+
+
+def test_stream_metrics_chunks_without_text():
+    adapter = SlowAdapter({})
+    response_message = adapter.get_response_message()
+
+    def chunks():
+        for chunk in [None, None, None, None, "a"]:
+            time.sleep(0.02)
+            yield chunk
+
+    list(adapter.output_stream(chunks(), response_message))
+    metrics = response_message.extra["metrics"]
+
+    assert metrics["chunks"] == 5
+    assert 0.1 <= metrics["wait_time"] <= metrics["total_time"]
+
+
+def test_stream_metrics_usage():
+    stream, message = SlowAdapter({}).get_completion([])
+    message.extra = {"usage": {"output_tokens": 42}}
+    list(stream)
+
+    assert message.extra["metrics"]["output_tokens"] == 42
+    assert message.extra["usage"] == {"output_tokens": 42}
+
+
+def test_format_metrics():
+    metrics = {
+        "response_time": 0.25,
+        "ttft": 0.5,
+        "total_time": 2,
+        "output_tokens": 100,
+        "tokens_per_second": 66.666,
+        "wait_time": 1.5,
+        "consumer_time": 0.125,
+    }
+
+    assert format_metrics(metrics) == (
+        "TTFT 0.50s, 66.7 tokens/s, 100 tokens, 2.00s total (provider 1.75s, llmcli 0.12s)"
+    )
+
+
+def test_cli_metrics(tmp_path, capsys):
+    metrics_file = tmp_path / "metrics.jsonl"
+
+    with patch("llmcli.llmcli.get_api_adapter", return_value=SlowAdapter({})):
+        cli = LlmCli(interactive=False, metrics_file=str(metrics_file), print_metrics=True)
+
+    cli.add_chat_message(Message(content="hi"), silent=True)
+
+    for _ in range(2):
+        stream, _ = cli.get_completion()
+        assert "".join(stream) == "abc"
+
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+
+    assert len(records) == 2
+    assert records[0]["adapter"] == "slow"
+    assert records[0]["chunks"] == 4
+    assert capsys.readouterr().err.count("TTFT") == 2
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_servers import MockProviderServer, get_fragments
+from llmcli.adapters.ollama import OllamaApiAdapter
+from llmcli.adapters.openai import OpenAiApiAdapter
+from llmcli.messages.message import Message
+
+
+@pytest.fixture(name="server")
+def fixture_server(monkeypatch):
+    with MockProviderServer(chunks=20, chunk_size=3) as server:
+        for key, value in server.environ().items():
+            monkeypatch.setenv(key, value)
+
+        yield server
+
+
+def test_get_fragments():
+    fragments = get_fragments(5, 3, "abcd")
+
+    assert fragments == ["abc", "dab", "cda", "bcd", "abc"]
+
+
+def test_openai_adapter(server):
+    adapter = OpenAiApiAdapter({"api_key": "test", "model": "mock"})
+    stream, message = adapter.get_completion([Message(content="hi")])
+
+    assert "".join(stream) == server.text
+    assert message.content == server.text
+    assert server.requests[0][0] == "/v1/chat/completions"
+    assert server.requests[0][1]["messages"] == [{"role": "user", "content": "hi"}]
+
+
+def test_ollama_adapter_async(server):
+    adapter = OllamaApiAdapter({})
+
+    async def complete():
+        stream, message = await adapter.get_completion_async([Message(content="hi")])
+        return "".join([fragment async for fragment in stream]), message
+
+    text, message = asyncio.run(complete())
+
+    assert text == server.text
+    assert message.content == server.text
+    assert server.requests[0][0] == "/api/chat"
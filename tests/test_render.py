@@ -0,0 +1,70 @@
+import io
+import time
+
+from llmcli.render import StreamRenderer, render_stream
+
+
+class CountingStream(io.StringIO):
+    def __init__(self, tty=False):
+        super().__init__()
+        self.tty = tty
+        self.writes = 0
+
+    def isatty(self):
+        return self.tty
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def test_coalesce_writes():
+    output = CountingStream()
+
+    with StreamRenderer(output, interval=60, size=10) as renderer:
+        for _ in range(8):
+            renderer.write("ab")
+
+        # the size threshold was reached once
+        assert output.writes == 1
+        assert output.getvalue() == "ab" * 5
+
+    assert output.writes == 2
+    assert output.getvalue() == "ab" * 8
+
+
+def test_flush_interval():
+    output = CountingStream()
+
+    with StreamRenderer(output, interval=0, size=4096) as renderer:
+        renderer.write("a")
+        renderer.write("b")
+
+        assert output.getvalue() == "ab"
+        assert output.writes == 2
+
+
+def test_tty_timer_flush():
+    output = CountingStream(tty=True)
+    renderer = StreamRenderer(output, interval=0.2, size=4096)
+    renderer.write("a")
+    renderer.write("b")
+
+    deadline = time.monotonic() + 2
+
+    while output.getvalue() != "ab" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert output.getvalue() == "ab"
+    assert output.writes == 1
+    assert renderer.timer is None
+    renderer.close()
+
+
+def test_binary_output():
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    output.write("before ")
+
+    render_stream(["caf", "é", " ", "=3"], output)
+
+    assert output.buffer.getvalue() == "before café =3".encode("utf-8")
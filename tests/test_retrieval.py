@@ -0,0 +1,78 @@
+import os
+from unittest.mock import patch
+
+from llmcli.messages.file_message import read_file
+from llmcli.retrieval import RetrievalIndex, get_context_message, get_terms
+
+
+def write_module(path, name, body_lines=60):
+    lines = [f"def {name}_handler(request):"] + ["    pass"] * body_lines
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_get_terms():
+    assert get_terms("get_completion(HTTPServer, parseJson) 42") == [
+        "get", "completion", "http", "server", "parse", "json", "42"
+    ]
+    assert get_terms("Invoices and classes") == ["invoice", "and", "classe"]
+
+
+def test_index_search(tmp_path):
+    write_module(tmp_path / "billing.py", "invoice")
+    write_module(tmp_path / "auth.py", "login")
+    (tmp_path / "notes.txt").write_text("the login page and the invoice page\n" * 3)
+
+    index = RetrievalIndex(str(tmp_path / "index.json"), chunk_lines=40)
+    paths = index.update(tmp_path / name for name in ("billing.py", "auth.py", "notes.txt"))
+    results = index.search("How is an invoice generated?", paths, top_k=2)
+
+    # the short chunk mentioning the term more often scores higher
+    assert [(os.path.basename(path), first, last) for path, first, last, _ in results] == [
+        ("notes.txt", 1, 3), ("billing.py", 1, 40)
+    ]
+    assert index.search("nothing relevant", paths) == []
+
+
+def test_index_incremental(tmp_path):
+    write_module(tmp_path / "billing.py", "invoice")
+    write_module(tmp_path / "auth.py", "login")
+    index_path = str(tmp_path / "index.json")
+
+    index = RetrievalIndex(index_path)
+    index.update([tmp_path / "billing.py", tmp_path / "auth.py"])
+    index.save()
+
+    # a new index loads the saved one, and only reads modified files again
+    index = RetrievalIndex(index_path)
+    write_module(tmp_path / "auth.py", "logout", body_lines=10)
+    os.utime(tmp_path / "auth.py", ns=(0, 0))
+
+    with patch("llmcli.retrieval.read_file", wraps=read_file) as read:
+        paths = index.update([tmp_path / "billing.py", tmp_path / "auth.py"])
+
+    assert read.call_count == 1
+    assert index.dirty
+    assert index.search("logout", paths)[0][:3] == (str(tmp_path / "auth.py"), 1, 11)
+
+    os.remove(tmp_path / "auth.py")
+    assert index.update([tmp_path / "billing.py", tmp_path / "auth.py"]) == [
+        str(tmp_path / "billing.py")
+    ]
+
+
+def test_get_context_message(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    write_module(tmp_path / "src" / "billing.py", "invoice", body_lines=2)
+    write_module(tmp_path / "src" / "auth.py", "login", body_lines=2)
+    index = RetrievalIndex(str(tmp_path / "index.json"))
+
+    message = get_context_message(index, ["src/"], "Where are invoices handled?")
+
+    assert message.role == "user"
+    assert message.content == (
+        "### CONTEXT: excerpts of files relevant to the next message\n\n"
+        "#### src/billing.py:1-3\n\n```\ndef invoice_handler(request):\n    pass\n    pass\n```"
+    )
+    assert os.path.exists(tmp_path / "index.json")
+    assert get_context_message(index, ["src/"], "unrelated") is None
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+from llmcli.adapters.ollama import OllamaApiAdapter
+from llmcli.adapters.openai import OpenAiApiAdapter
+from llmcli.messages.file_message import FileMessage
+from llmcli.messages.image_message import ImageMessage
+from llmcli.messages.message import Message
+from llmcli.tokens import IMAGE_TOKENS, MESSAGE_TOKEN_OVERHEAD, estimate_tokens, trim_messages
+
+from tests.fixtures.messages import TEST_IMAGE
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("日本語") == 3
+    assert estimate_tokens("café") == 2
+
+
+def test_message_estimate_cached():
+    message = Message(content="abcd")
+
+    with patch("llmcli.messages.message.estimate_tokens", return_value=1) as estimate:
+        assert message.estimate_tokens() == MESSAGE_TOKEN_OVERHEAD + 1
+        assert message.estimate_tokens() == MESSAGE_TOKEN_OVERHEAD + 1
+        assert estimate.call_count == 1
+
+        message.content += "efgh"
+        message.estimate_tokens()
+        assert estimate.call_count == 2
+
+    # the cached estimate doesn't affect equality
+    assert message == Message(content="abcdefgh")
+
+
+def test_attachment_estimates():
+    file_message = FileMessage(file_path="test.txt", file_content="x" * 400)
+    image_message = ImageMessage(image_path="test.png", image_content=TEST_IMAGE)
+
+    assert file_message.estimate_tokens() == MESSAGE_TOKEN_OVERHEAD + 2 + 100
+    assert image_message.estimate_tokens() == MESSAGE_TOKEN_OVERHEAD + IMAGE_TOKENS
+
+
+def test_trim_messages():
+    messages = [
+        Message(role="system", content="x" * 400),
+        Message(role="user", content="x" * 400),
+        Message(role="assistant", content="x"),
+        Message(role="user", content="x" * 400),
+    ]
+
+    assert trim_messages(messages, None) is messages
+    assert trim_messages(messages, 1000) is messages
+    # the short assistant message would fit, but it would start the conversation
+    assert trim_messages(messages, 300) == [messages[0], messages[3]]
+    # the system prompt and the last message are always kept
+    assert trim_messages(messages, 10) == [messages[0], messages[3]]
+
+
+def test_context_budget():
+    with patch("llmcli.adapters.openai.OpenAI"):
+        assert OpenAiApiAdapter({}).get_context_budget() == 128000 - 4096
+        assert OpenAiApiAdapter(
+            {"context_window": "8000", "max_tokens": "1000"}
+        ).get_context_budget() == 7000
+
+    assert OllamaApiAdapter({}).get_context_budget() is None
+    assert OllamaApiAdapter({"num_ctx": "8192"}).get_context_budget() == 6144
+    assert OllamaApiAdapter(
+        {"context_window": "4096", "num_predict": "96"}
+    ).get_context_budget() == 4000
@@ -1,6 +1,8 @@
-from llmcli.util import get_mime_type, normalize_path
+from llmcli.util import get_mime_type, normalize_path, parse_bool
 from unittest import mock
 
+import pytest
+
 
 def test_get_mime_type():
     assert get_mime_type("image.png") == "image/png"
@@ -15,3 +17,12 @@ def test_normalize_path():
         assert normalize_path("/file.txt") == "../../file.txt"
         assert normalize_path("./file.txt") == "file.txt"
         assert normalize_path("../file.txt") == "../file.txt"
+
+def test_parse_bool():
+    assert parse_bool("on") is True
+    assert parse_bool(" TRUE ") is True
+    assert parse_bool("0") is False
+    assert parse_bool(False) is False
+
+    with pytest.raises(ValueError):
+        parse_bool("maybe")